@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from typing import Iterator, NamedTuple, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.getenv("ACTION_LOG_DIR") or os.path.join(BASE_DIR, "action_log")  # One per worker process
+
+# Action codes are part of the on-disk format: only ever append to this tuple
+LOGGED_ACTIONS = ("bet", "raise", "call", "fold", "all-in", "next-round", "next-stage", "next-hand",
+                  "hole-cards", "board", "check")
+ACTION_CODES = {name: code for code, name in enumerate(LOGGED_ACTIONS)}
+
+# Each record is a crc32 of the body, then the body: seq, timestamp, action code, flags,
+# player_id, amount, game_id length, followed by the game_id bytes
+CRC = struct.Struct("<I")
+BODY = struct.Struct("<QdBBqqH")
+HEADER_SIZE = CRC.size + BODY.size
+HAS_PLAYER = 1
+HAS_AMOUNT = 2
+
+SEGMENT_PREFIX = "actions-"
+SEGMENT_SUFFIX = ".log"
+SNAPSHOT_FILE = "snapshot.json"
+ID_FILE = "log_id"  # Names this log in `games.log_id`, since sequence numbers are only unique within one log
+
+
+class ActionRecord(NamedTuple):
+    seq: int
+    timestamp: float
+    game_id: str
+    action: str
+    player_id: Optional[int]
+    amount: Optional[int]
+
+
+def pack_record(seq: int, game_id: str, action: str, player_id: Optional[int] = None,
+                amount: Optional[int] = None, timestamp: Optional[float] = None) -> bytes:
+    """Packs one action into its binary log form (fixed header plus the game id)."""
+    game_bytes = game_id.encode()
+    flags = (HAS_PLAYER if player_id is not None else 0) | (HAS_AMOUNT if amount is not None else 0)
+    body = BODY.pack(seq, time.time() if timestamp is None else timestamp, ACTION_CODES[action], flags,
+                     player_id or 0, amount or 0, len(game_bytes)) + game_bytes
+    return CRC.pack(zlib.crc32(body)) + body
+
+
+def unpack_records(data: bytes) -> Iterator[tuple]:
+    """Yields `(record, end_offset)` for each intact record, stopping at the first torn or corrupt one."""
+    offset = 0
+    while offset + HEADER_SIZE <= len(data):
+        (crc,) = CRC.unpack_from(data, offset)
+        seq, ts, code, flags, player_id, amount, length = BODY.unpack_from(data, offset + CRC.size)
+        end = offset + HEADER_SIZE + length
+        if end > len(data) or zlib.crc32(data[offset + CRC.size:end]) != crc:
+            return
+        yield ActionRecord(
+            seq, ts, data[offset + HEADER_SIZE:end].decode(), LOGGED_ACTIONS[code],
+            player_id if flags & HAS_PLAYER else None,
+            amount if flags & HAS_AMOUNT else None,
+        ), end
+        offset = end
+
+
+class ActionLog:
+    """Append-only, binary-packed log of every action applied to a table.
+
+    Appends only buffer the record; `wait()` makes it durable. Whichever waiter arrives first
+    writes and fsyncs everything buffered so far, so concurrent actions share one fsync
+    (group commit). The log is split into segments: `rotate()` starts a new one, and segments
+    fully covered by a snapshot can be dropped.
+    """
+
+    def __init__(self, path: str = LOG_DIR, sync: bool = True):
+        self.path = path
+        self.sync = sync
+        os.makedirs(path, exist_ok=True)
+        self.id = self._read_id()
+
+        self._cond = threading.Condition(threading.Lock())
+        self._buffer = []
+        self._writing = False
+        self._group = None  # In-flight async group commit
+        self.appended_since_rotate = 0
+
+        last_seq = self._repair_tail()
+        self._next_seq = last_seq + 1
+        self._durable_seq = last_seq
+        segments = self._segments()
+        self._file = open(self._segment_path(segments[-1] if segments else self._next_seq), "ab")
+
+    def _read_id(self) -> str:
+        path = os.path.join(self.path, ID_FILE)
+        if not os.path.exists(path):
+            with open(path + ".tmp", "w") as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(path + ".tmp", path)
+        with open(path) as f:
+            return f.read().strip()
+
+    def _segment_path(self, start_seq: int) -> str:
+        return os.path.join(self.path, f"{SEGMENT_PREFIX}{start_seq:020d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> list:
+        """Start sequence numbers of all segments, oldest first."""
+        return sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _repair_tail(self) -> int:
+        """Truncates a torn write at the end of the newest segment. Returns the last intact seq."""
+        segments = self._segments()
+        if not segments:
+            return 0
+
+        path = self._segment_path(segments[-1])
+        with open(path, "rb") as f:
+            data = f.read()
+
+        last_seq, valid = segments[-1] - 1, 0
+        for record, end in unpack_records(data):
+            last_seq, valid = record.seq, end
+        if valid < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+        return last_seq
+
+    @property
+    def last_seq(self) -> int:
+        with self._cond:
+            return self._next_seq - 1
+
+    def append(self, game_id: str, action: str, player_id: Optional[int] = None, amount: Optional[int] = None) -> int:
+        """Buffers one record and returns its sequence number. Call `wait()` to make it durable."""
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._buffer.append(pack_record(seq, game_id, action, player_id, amount))
+            self.appended_since_rotate += 1
+        return seq
+
+    def wait(self, seq: int) -> None:
+        """Blocks until `seq` is on disk, writing the pending group if no one else is."""
+        with self._cond:
+            while self._durable_seq < seq:
+                if self._writing:
+                    self._cond.wait()
+                else:
+                    self._write_pending()
+
+    async def commit(self, seq: int) -> None:
+        """Async form of `wait()`: the write and fsync run in a worker thread.
+
+        Coroutines that arrive while a group is being written wait for that group instead of
+        starting their own, so a whole burst of actions shares one fsync.
+        """
+        while self._durable_seq < seq:
+            group = self._group
+            # A finished group may still be set here: awaiting it again would never yield to the loop
+            if group is None or group.done():
+                group = self._group = asyncio.get_running_loop().run_in_executor(None, self.wait, self.last_seq)
+            await asyncio.shield(group)
+
+    def _write_pending(self) -> None:
+        # Called with the lock held; drops it for the actual I/O so appends keep flowing
+        buffer, self._buffer = self._buffer, []
+        upto = self._next_seq - 1
+        self._writing = True
+        self._cond.release()
+        try:
+            self._file.write(b"".join(buffer))
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+        except Exception:
+            self._cond.acquire()
+            self._buffer[:0] = buffer  # Keep the records for the next attempt
+            self._writing = False
+            self._cond.notify_all()
+            raise
+        self._cond.acquire()
+        self._writing = False
+        self._durable_seq = max(self._durable_seq, upto)
+        self._cond.notify_all()
+
+    def _drain(self) -> None:
+        # Called with the lock held; returns once nothing is buffered or being written
+        while self._writing or self._buffer:
+            if self._writing:
+                self._cond.wait()
+            else:
+                self._write_pending()
+
+    def rotate(self) -> int:
+        """Makes everything buffered durable and starts a new segment. Returns its first seq."""
+        with self._cond:
+            self._drain()
+            self._file.close()
+            self._file = open(self._segment_path(self._next_seq), "ab")
+            self.appended_since_rotate = 0
+            return self._next_seq
+
+    def read(self, after_seq: int = 0) -> Iterator[ActionRecord]:
+        """Yields every durable record with a sequence number above `after_seq`, in order."""
+        segments = self._segments()
+        for i, start in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1] <= after_seq + 1:
+                continue  # Whole segment is before the requested range
+            with open(self._segment_path(start), "rb") as f:
+                data = f.read()
+            for record, _ in unpack_records(data):
+                if record.seq > after_seq:
+                    yield record
+
+    def drop_segments_before(self, seq: int) -> int:
+        """Deletes segments whose records all precede `seq`. Returns the number deleted."""
+        segments = self._segments()
+        dropped = 0
+        for i, start in enumerate(segments[:-1]):
+            if segments[i + 1] <= seq:
+                os.remove(self._segment_path(start))
+                dropped += 1
+        return dropped
+
+    def write_snapshot(self, snapshot: dict) -> None:
+        """Atomically replaces the snapshot file."""
+        path = os.path.join(self.path, SNAPSHOT_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def read_snapshot(self) -> Optional[dict]:
+        path = os.path.join(self.path, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def close(self) -> None:
+        with self._cond:
+            self._drain()
+            self._file.close()
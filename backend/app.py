@@ -1,10 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI # type: ignore
 from backend.routes import router
+from backend.database import async_engine, engine
+from backend.create_tables import migrate
+from backend.metrics import MetricsMiddleware, instrument
+from backend import equity, ranges
+from backend.action_log import ActionLog
+from backend.tables import tables
+from backend.cluster import AffinityMiddleware, cluster
+from backend.idempotency import idempotency
+from backend.archive import archiver
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(migrate)  # Brings an older database file up to the current models
+    # Rebuild live tables from the database and action log, then start write-behind persistence
+    if tables.log is None:
+        tables.log = ActionLog()  # Opened here, not at import, so importing the app touches no files
+    await tables.recover()
+    tables.start()
+    await idempotency.load()  # Keys still within their TTL, so retries across a restart are recognised
+    idempotency.start()
+    archiver.start()  # Moves finished and idle games out of the live tables
+    equity.start_pool()
+    ranges.load()  # Memory-maps the preflop tables if they have been built
+    await cluster.start()  # No-op unless BROKER_URL is set
+    yield
+    await archiver.stop()
+    await cluster.stop()
+    equity.shutdown_pool()
+    await tables.stop()
+    await idempotency.stop()
+    await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+instrument(engine, async_engine.sync_engine)
+app.add_middleware(AffinityMiddleware)  # Inside the metrics, so forwarded requests are counted too
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(router)
 
 if __name__ == "__main__":
     import uvicorn # type: ignore
-    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
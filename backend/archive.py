@@ -0,0 +1,238 @@
+"""Moving finished and idle games out of the live tables.
+
+A background pass (every `ARCHIVE_INTERVAL` seconds) picks games that are finished (fewer than
+two players left with chips, untouched for `ARCHIVE_FINISHED_AFTER` seconds) or idle (untouched
+for `ARCHIVE_IDLE_AFTER` seconds), oldest first. In batches of `BATCH_SIZE`, one transaction
+per batch, it writes each game and its player rows as one zlib-compressed row of
+`archived_games` and deletes them from `games` and `players`. The in-memory tables are
+written back and dropped first. A game written in the meantime fails the version check and
+the batch is retried on the next pass. After a pass, SQLite databases in incremental
+auto-vacuum mode give the freed pages back.
+
+Archived games stay readable: `/get-game/` falls back to `fetch()`, one primary-key read
+and a decompression.
+
+    python -m backend.archive run        # one pass now
+    python -m backend.archive compact    # switch a SQLite database to incremental vacuum (one full VACUUM)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select # type: ignore
+from backend.cluster import get_cluster
+from backend.database import AsyncSessionLocal, engine
+from backend.models import ArchivedGameDB, GameDB, PlayerDB
+from backend.tables import TableEngine, TableState, get_tables
+
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "300"))  # Seconds between passes
+IDLE_AFTER = float(os.getenv("ARCHIVE_IDLE_AFTER", "86400"))
+FINISHED_AFTER = float(os.getenv("ARCHIVE_FINISHED_AFTER", "600"))  # Lets clients read the final state first
+BATCH_SIZE = 200  # Games per transaction
+MAX_BATCHES = 50  # Per pass; a larger backlog is worked off over several passes
+VACUUM_PAGES = 4096  # Free pages given back per pass
+
+logger = logging.getLogger(__name__)
+
+_GAMES = GameDB.__table__
+# Deletes a game row only if nothing was written to it since it was archived
+_DELETE = delete(_GAMES).where(_GAMES.c.id == bindparam("b_id"), _GAMES.c.version == bindparam("b_version"))
+
+
+def _columns(row) -> dict:
+    return {c.name: getattr(row, c.name) for c in row.__table__.columns}
+
+
+def pack(game: GameDB, players: list) -> bytes:
+    """A game row and its player rows as compressed JSON."""
+    data = {"game": _columns(game), "players": [_columns(p) for p in players]}
+    return zlib.compress(json.dumps(data, default=str, separators=(",", ":")).encode(), 6)
+
+
+def unpack(data: bytes) -> TableState:
+    """The table an archived game was left as (read-only: it isn't part of the engine)."""
+    rows = json.loads(zlib.decompress(data))
+    return TableState.from_rows(SimpleNamespace(**rows["game"]), [SimpleNamespace(**p) for p in rows["players"]])
+
+
+async def fetch(game_id: str, session_factory=AsyncSessionLocal) -> Optional[TableState]:
+    """An archived game, or None if no game with this id was archived."""
+    async with session_factory() as db:
+        data = (await db.execute(select(ArchivedGameDB.data).where(ArchivedGameDB.id == game_id))).scalar()
+    return unpack(data) if data is not None else None
+
+
+class Archiver:
+    def __init__(self, engine: TableEngine, session_factory=AsyncSessionLocal, interval: float = ARCHIVE_INTERVAL,
+                 idle_after: float = IDLE_AFTER, finished_after: float = FINISHED_AFTER, batch_size: int = BATCH_SIZE):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.interval = interval
+        self.idle_after = idle_after
+        self.finished_after = finished_after
+        self.batch_size = batch_size
+        self.archived = 0
+        self.conflicts = 0  # Batches rolled back because a game was written meanwhile
+        self._task: Optional[asyncio.Task] = None
+
+    def _candidates(self, now: datetime):
+        with_chips = (select(func.count()).where(PlayerDB.game_id == GameDB.id, PlayerDB.stack > 0)
+                      .correlate(GameDB).scalar_subquery())
+        idle = GameDB.updated_at < now - timedelta(seconds=self.idle_after)
+        finished = and_(GameDB.updated_at < now - timedelta(seconds=self.finished_after),
+                        GameDB.player_count >= 2, with_chips < 2)
+        return (select(GameDB.id, case((idle, "idle"), else_="finished"))
+                .where(or_(idle, finished)).order_by(GameDB.updated_at))
+
+    async def archive_batch(self, exclude: frozenset = frozenset()) -> List[str]:
+        """Archives up to `batch_size` games in one transaction.
+
+        Args:
+            exclude (frozenset): Ids already looked at this pass.
+
+        Returns:
+            list: The ids of the games looked at, archived or not; empty when nothing is due.
+        """
+        async with self.session_factory() as db:
+            query = self._candidates(datetime.utcnow())
+            if exclude:
+                query = query.where(GameDB.id.notin_(exclude))
+            seen = list((await db.execute(query.limit(self.batch_size))).scalars())
+        if not seen:
+            return []
+        cluster = get_cluster()
+        ids = [game_id for game_id in seen if not cluster.enabled or cluster.owns(game_id)]
+
+        # Write back and drop the in-memory tables; one still taking actions is skipped
+        await self.engine.release(ids)
+        held = set(self.engine.game_ids())
+        ids = [game_id for game_id in ids if game_id not in held]
+        if not ids:
+            return seen
+
+        async with self.session_factory() as db:
+            # Asked again: writing a table back may have made its game active
+            due = dict((await db.execute(self._candidates(datetime.utcnow()).where(GameDB.id.in_(ids)))).all())
+            games = (await db.execute(select(GameDB).where(GameDB.id.in_(list(due))))).scalars().all()
+            if not games:
+                return seen
+            players: Dict[str, list] = {}
+            for p in (await db.execute(select(PlayerDB).where(PlayerDB.game_id.in_(ids)))).scalars():
+                players.setdefault(p.game_id, []).append(p)
+            now = datetime.utcnow()
+            await db.execute(insert(ArchivedGameDB), [
+                {"id": g.id, "tournament_id": g.tournament_id, "reason": due[g.id], "created_at": g.created_at,
+                 "archived_at": now, "data": pack(g, players.get(g.id, []))} for g in games])
+            await db.execute(delete(PlayerDB).where(PlayerDB.game_id.in_([g.id for g in games])))
+            versions = [{"b_id": g.id, "b_version": g.version} for g in games]
+            if (await db.connection()).dialect.supports_sane_multi_rowcount:
+                deleted = (await db.execute(_DELETE, versions)).rowcount
+            else:
+                deleted = sum([(await db.execute(_DELETE, v)).rowcount for v in versions])
+            if deleted != len(games):
+                await db.rollback()
+                self.conflicts += 1
+                return seen
+            await db.commit()
+
+        for g in games:
+            self.engine.discard(g.id)  # Subscribers are told the game ended; a copy loaded meanwhile is dropped
+        self.archived += len(games)
+        return seen
+
+    async def run_once(self) -> int:
+        """One pass: archives every due game (up to `MAX_BATCHES` batches), then compacts. Returns the games archived."""
+        before = self.archived
+        skipped = set()
+        for _ in range(MAX_BATCHES):
+            seen = await self.archive_batch(frozenset(skipped))
+            if not seen:
+                break
+            skipped.update(seen)  # Archived ones are gone anyway; the rest wait for the next pass
+        if self.archived > before:
+            await self.vacuum()
+        return self.archived - before
+
+    async def vacuum(self, pages: int = VACUUM_PAGES) -> None:
+        """Gives up to `pages` free pages back to the file system (SQLite in incremental auto-vacuum mode only)."""
+        async with self.session_factory() as db:
+            conn = await db.connection()
+            if conn.dialect.name != "sqlite" or (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() != 2:
+                return
+            # A plain execute steps the pragma once (one page); a script runs it to completion
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+
+    def start(self) -> None:
+        """Starts the background archiving task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Error archiving games")
+
+
+def compact(bind=engine) -> None:
+    """Switches a SQLite database to incremental auto-vacuum, which takes one full VACUUM."""
+    if bind.dialect.name != "sqlite":
+        raise RuntimeError("Only SQLite databases are compacted here; other databases vacuum themselves")
+    with bind.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")  # VACUUM can't run in a transaction
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+archiver = Archiver(get_tables())
+
+
+def get_archiver() -> Archiver:
+    return archiver
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    runner = commands.add_parser("run", help="archive every finished or idle game now")
+    runner.add_argument("--idle-after", type=float, default=IDLE_AFTER, help="seconds without a write")
+    commands.add_parser("compact", help="switch SQLite to incremental auto-vacuum")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        compact()
+        print("Database now in incremental auto-vacuum mode")
+        return 0
+
+    async def run():
+        # Offline: no live tables, so nothing needs writing back first
+        archived = await Archiver(TableEngine(), idle_after=args.idle_after).run_once()
+        print(f"Archived {archived} games")
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
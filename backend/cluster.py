@@ -0,0 +1,628 @@
+"""Running several API workers side by side, each owning a share of the games.
+
+Every game is held in the memory of exactly one worker: the one that wins a rendezvous hash of
+the game id over the live workers. Any worker accepts any request; `AffinityMiddleware` passes
+requests for games owned elsewhere on to the owner, so one game's actions always meet the same
+in-memory table and lock. Tables of a tournament share the tournament id as their hash key, so a
+rebalance finds all of them on one worker.
+
+Workers find each other through heartbeats on a small pub/sub broker, which also carries the
+state deltas of every game, so WebSocket / SSE subscribers can connect to any worker. When a
+worker stops heartbeating for `WORKER_TIMEOUT` seconds the others drop it and its games are
+reloaded from the database by their new owners. Changes it had not flushed yet (at most about
+one flush interval) are lost with it; the version check on game rows keeps a worker that was
+wrongly presumed dead from overwriting the new owner.
+
+Forwarded requests are signed with `CLUSTER_SECRET`, which every worker shares, and are only
+taken as forwarded when they come from a live worker's address; anyone else's forwarding header
+is dropped, so clients cannot pin a request to a worker that does not own its game.
+
+    python -m backend.cluster broker --port 7400
+    BROKER_URL=tcp://127.0.0.1:7400 CLUSTER_SECRET=... WORKER_URL=http://127.0.0.1:8001 uvicorn backend.app:app --port 8001
+    python -m backend.cluster local --workers 3 --port 8000    # broker and workers on one machine
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from hashlib import blake2b
+from math import ceil
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx # type: ignore
+from backend.push import Broadcaster, get_broadcaster
+from backend.tables import TableEngine, get_tables
+
+BROKER_URL = os.getenv("BROKER_URL")  # e.g. tcp://127.0.0.1:7400; unset runs a single worker
+CLUSTER_SECRET = os.getenv("CLUSTER_SECRET")  # Shared by all workers, signs forwarded requests
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "1.0"))  # Seconds between heartbeats
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "5.0"))  # Seconds without a heartbeat before a worker is dropped
+FORWARD_TIMEOUT = 10.0  # Seconds to wait for the owning worker's response
+MAX_LINE = 1 << 20  # Longest broker message in bytes
+MAX_BACKLOG = 4 << 20  # Bytes a slow broker subscriber may fall behind before messages to it are dropped
+
+FORWARDED_HEADER = b"x-forwarded-worker"  # "<worker id> <signature>" on forwarded requests, which are always handled where they land
+WORKER_HEADER = b"x-worker"  # The worker that handled the request
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+logger = logging.getLogger(__name__)
+
+# Paths naming the game (or tournament) they act on; other requests carry it as `game_id`
+# in the query string or the JSON body, or are not about one game at all
+GAME_PATH = re.compile(r"^/(?:get-game|end-session|equity)/([^/]+)$"
+                       r"|^/games/([^/]+)/(?:players|actions:batch|view)"
+                       r"|^/tournaments/([^/]+)/rebalance$")
+
+
+def shard_key(game_id: str) -> str:
+    """The key a game is placed by: its id, or for a tournament table (`<tournament_id>.<n>`) the tournament id."""
+    return game_id.split(".", 1)[0]
+
+
+def owner_of(key: str, workers: Iterable[str]) -> Optional[str]:
+    """Picks the worker for `key` by rendezvous hashing.
+
+    Every worker scores every key and the highest score wins, so all workers agree on the owner
+    without talking to each other, and when a worker joins or leaves only the keys it wins or
+    held change hands.
+    """
+    return max(workers, default=None,
+               key=lambda worker: blake2b(f"{worker}\0{key}".encode(), digest_size=8).digest())
+
+
+def _address(url: str) -> tuple:
+    parts = urlsplit(url if "//" in url else f"tcp://{url}")
+    return parts.hostname or "127.0.0.1", parts.port or 7400
+
+
+async def serve_broker(host: str = "127.0.0.1", port: int = 7400) -> asyncio.AbstractServer:
+    """Starts a minimal pub/sub broker: newline-delimited JSON over TCP.
+
+    Clients send `{"op": "sub", "channel": ...}` and `{"op": "pub", "channel": ..., "data": ...}`;
+    every publish is passed on as is to all subscribers of its channel, the sender included.
+    It stands in for Redis-style pub/sub and keeps nothing: a subscriber only sees messages
+    published while it is connected.
+    """
+    channels: Dict[str, set] = {}
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed = set()
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                channel = message.get("channel")
+                if message.get("op") == "sub":
+                    channels.setdefault(channel, set()).add(writer)
+                    subscribed.add(channel)
+                elif message.get("op") == "pub":
+                    for subscriber in list(channels.get(channel, ())):
+                        if subscriber.transport.get_write_buffer_size() < MAX_BACKLOG:
+                            subscriber.write(line)
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            for channel in subscribed:
+                channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port, limit=MAX_LINE)
+
+
+class BrokerClient:
+    """A connection to the broker that reconnects by itself and resubscribes after each reconnect.
+
+    `publish()` may be called from any thread and never blocks; messages published while the
+    connection is down are dropped.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self.connected = asyncio.Event()
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]) -> None:
+        """Calls `handler(data)` on the event loop for every message on `channel`."""
+        self._handlers.setdefault(channel, []).append(handler)
+        self._send({"op": "sub", "channel": channel})
+
+    def publish(self, channel: str, data: dict) -> None:
+        message = {"op": "pub", "channel": channel, "data": data}
+        if self._loop is None or self._loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._send(message)
+        else:
+            self._loop.call_soon_threadsafe(self._send, message)
+
+    def _send(self, message: dict) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    async def start(self, timeout: float = 5.0) -> None:
+        """Connects, waiting up to `timeout` seconds for the broker before carrying on regardless."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = self._loop.create_task(self._run())
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Broker at %s not reachable yet; retrying in the background", self.url)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        host, port = _address(self.url)
+        delay = 0.05
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+            delay = 0.05
+            self._writer = writer
+            for channel in self._handlers:
+                self._send({"op": "sub", "channel": channel})
+            self.connected.set()
+            try:
+                async for line in reader:
+                    message = json.loads(line)
+                    for handler in self._handlers.get(message.get("channel"), ()):
+                        try:
+                            handler(message["data"])
+                        except Exception:
+                            logger.exception("Error handling broker message")
+            except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+                pass
+            finally:
+                self.connected.clear()
+                self._writer = None
+                writer.close()
+
+
+class Cluster:
+    """This worker's view of the cluster: who is alive, and which games are whose.
+
+    Disabled (every game is local) unless a broker URL is configured. Once started it heartbeats
+    on the `workers` channel, drops workers it has not heard from within `timeout`, hands over the
+    tables it no longer owns, and relays game deltas between workers on the `deltas` channel.
+
+    A table is never kept across a change of owner. The old owner writes it back, drops it and
+    announces that on the `released` channel. The new owner drops any copy it holds (a copy
+    `recover()` loaded at startup, or one loaded before the old owner's write landed) when it
+    gains the game and again on that announcement, so its next access reads the current row.
+    """
+
+    def __init__(self, broker_url: Optional[str] = BROKER_URL, worker_id: Optional[str] = None,
+                 url: Optional[str] = None, engine: Optional[TableEngine] = None,
+                 broadcaster: Optional[Broadcaster] = None, heartbeat_interval: float = HEARTBEAT_INTERVAL,
+                 timeout: float = WORKER_TIMEOUT, secret: Optional[str] = CLUSTER_SECRET):
+        self.broker_url = broker_url
+        self.secret = secret
+        self.worker_id = worker_id or os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.url = url or os.getenv("WORKER_URL")
+        self.engine = engine or get_tables()
+        self.broadcaster = broadcaster or get_broadcaster()
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.members: Dict[str, Optional[str]] = {self.worker_id: self.url}  # Live worker id -> base URL
+        self.handovers = 0  # Tables released to another worker
+        self.client: Optional[httpx.AsyncClient] = None
+        self.broker: Optional[BrokerClient] = None
+        self._seen: Dict[str, tuple] = {}  # Worker id -> (url, monotonic time of its last heartbeat)
+        self._placed = dict(self.members)  # The members the held tables were last checked against
+        self._task: Optional[asyncio.Task] = None
+        self._background: set = set()  # Table reloads and address lookups, cancelled on stop
+        self._resolved: Dict[str, set] = {}  # Worker URL host -> the addresses its requests come from
+
+    @property
+    def enabled(self) -> bool:
+        return self.broker_url is not None
+
+    def owner(self, game_id: str) -> str:
+        """The worker that holds `game_id` in memory."""
+        if not self.enabled:
+            return self.worker_id
+        return owner_of(shard_key(game_id), self.members)
+
+    def owns(self, game_id: str) -> bool:
+        return self.owner(game_id) == self.worker_id
+
+    async def start(self) -> None:
+        """Joins the cluster. Returns once the other workers have had time to announce themselves."""
+        if not self.enabled:
+            return
+        if not self.url:
+            raise RuntimeError("WORKER_URL must be set when BROKER_URL is")
+        if not self.secret:
+            raise RuntimeError("CLUSTER_SECRET must be set when BROKER_URL is")
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=FORWARD_TIMEOUT)
+        self.broker = BrokerClient(self.broker_url)
+        self.broker.subscribe("workers", self._on_heartbeat)
+        self.broker.subscribe("deltas", self._on_delta)
+        self.broker.subscribe("released", self._on_released)
+        self.engine.listeners.append(self._publish_delta)
+        await self.broker.start()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        await asyncio.sleep(2 * self.heartbeat_interval)
+        self._refresh()
+        self._resolve()
+        # Every table recover() loaded may be behind its owner's copy; owned ones are reloaded on first use
+        released = await self.engine.release(self.engine.game_ids())
+        self.handovers += sum(1 for g in released if not self.owns(g))
+        self._announce(released)
+
+    async def stop(self) -> None:
+        """Leaves the cluster; the remaining workers take this worker's games over straight away."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in list(self._background):
+            task.cancel()
+        self.broker.publish("workers", {"id": self.worker_id, "leaving": True})
+        await asyncio.sleep(0)
+        await self.broker.stop()
+        self.engine.listeners.remove(self._publish_delta)
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self.broker.publish("workers", {"id": self.worker_id, "url": self.url})
+            if self._refresh():
+                logger.info("Cluster members: %s", ", ".join(sorted(self.members)))
+            self._resolve()
+            # Also picks up tables that could not be released last time, or were loaded since
+            try:
+                placed, held = self._placed, self.engine.game_ids()
+                self._placed = dict(self.members)
+                moved = [g for g in held if not self.owns(g)]
+                if moved:
+                    released = await self.engine.release(moved)
+                    self.handovers += len(released)
+                    self._announce(released)
+                # A table of a game gained from another worker is that worker's old state (or ours from before)
+                gained = [g for g in held if self.owns(g) and owner_of(shard_key(g), placed) != self.worker_id]
+                if gained:
+                    self._announce(await self.engine.release(gained))
+            except Exception:
+                logger.exception("Error handing over tables")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def _announce(self, game_ids: list) -> None:
+        if game_ids:
+            self.broker.publish("released", {"origin": self.worker_id, "games": game_ids})
+
+    def _on_released(self, data: dict) -> None:
+        if data["origin"] == self.worker_id:
+            return
+        held = set(self.engine.game_ids())
+        stale = [g for g in data["games"] if g in held and self.owns(g)]
+        if stale:
+            # Loaded before the old owner's last write: write back (rebasing our actions on it) and reload
+            task = asyncio.get_running_loop().create_task(self.engine.release(stale))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def _refresh(self) -> bool:
+        """Recomputes the live members. Returns whether they changed."""
+        now = time.monotonic()
+        members = {worker: url for worker, (url, seen) in self._seen.items() if now - seen < self.timeout}
+        members[self.worker_id] = self.url
+        changed = members.keys() != self.members.keys()
+        self.members = members
+        return changed
+
+    def _on_heartbeat(self, data: dict) -> None:
+        worker = data["id"]
+        if worker == self.worker_id:
+            return
+        if data.get("leaving"):
+            self._seen.pop(worker, None)
+        else:
+            self._seen[worker] = (data["url"], time.monotonic())
+        # A worker that joins or leaves changes ownership now; one that went silent waits for the timeout
+        if (worker in self.members) != (worker in self._seen):
+            self._refresh()
+
+    def _resolve(self) -> None:
+        """Starts looking up the addresses of member hosts not seen before (names are resolved once)."""
+        for url in self.members.values():
+            host = urlsplit(url).hostname if url else None
+            if host is not None and host not in self._resolved:
+                self._resolved[host] = {host}  # Until the lookup is back: enough for IP literals
+                task = asyncio.get_running_loop().create_task(self._lookup(host))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    async def _lookup(self, host: str) -> None:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None)
+        except OSError:
+            return
+        self._resolved[host] = {host} | {info[4][0] for info in infos}
+
+    def _signature(self, worker: str) -> str:
+        return hmac.new((self.secret or "").encode(), worker.encode(), "sha256").hexdigest()
+
+    def forwarded_by(self, scope: dict) -> Optional[str]:
+        """The live worker that forwarded this request, or None unless its forwarding header is genuine.
+
+        The header must be signed with the shared secret and the request must come from that
+        worker's address; anything else is a client's header and gets no special treatment.
+        """
+        value = dict(scope["headers"]).get(FORWARDED_HEADER)
+        if not value or not self.secret or not scope.get("client"):
+            return None
+        worker, _, signature = value.decode("latin-1").partition(" ")
+        url = self.members.get(worker) if worker != self.worker_id else None
+        if not url or not hmac.compare_digest(signature, self._signature(worker)):
+            return None
+        host = urlsplit(url).hostname
+        return worker if scope["client"][0] in self._resolved.get(host, {host}) else None
+
+    def _publish_delta(self, game_id: str, delta: dict) -> None:
+        self.broker.publish("deltas", {"origin": self.worker_id, "game_id": game_id, "delta": delta})
+
+    def _on_delta(self, data: dict) -> None:
+        if data["origin"] != self.worker_id:
+            self.broadcaster.publish(data["game_id"], data["delta"])
+
+    async def request(self, worker: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """Sends a request to another worker, marked as forwarded so it is handled there."""
+        signed = f"{self.worker_id} {self._signature(self.worker_id)}".encode()
+        headers = [*kwargs.pop("headers", []), (FORWARDED_HEADER, signed)]
+        return await self.client.request(method, self.members[worker] + path, headers=headers, **kwargs)
+
+    async def view(self, game_id: str) -> Optional[dict]:
+        """The client-visible state of a game owned by another worker, or None if there is no such game."""
+        response = await self.request(self.owner(game_id), "GET", f"/games/{game_id}/view")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def apply_batches(self, games: list, atomic: bool, apply_local: Callable) -> list:
+        """Runs a multi-game batch request with each game's actions applied by its owner.
+
+        Args:
+            games (list): The request's `GameBatch` entries.
+            atomic (bool): Passed on to every owner.
+            apply_local (callable): Coroutine function applying a list of entries on this worker.
+
+        Returns:
+            list: One outcome per entry, in the order given.
+        """
+        by_owner: Dict[str, list] = {}
+        for i, game in enumerate(games):
+            by_owner.setdefault(self.owner(game.game_id), []).append(i)
+
+        async def run(worker: str, indexes: list) -> list:
+            batch = [games[i] for i in indexes]
+            if worker == self.worker_id:
+                return await apply_local(batch)
+            payload = {"games": [{"game_id": g.game_id, "actions": [a.model_dump(exclude_none=True) for a in g.actions]}
+                                 for g in batch], "atomic": atomic}
+            try:
+                response = await self.request(worker, "POST", "/games/actions:batch", json=payload)
+                response.raise_for_status()
+                return response.json()["games"]
+            except httpx.HTTPError:
+                return [{"game_id": g.game_id, "applied": 0,
+                         "results": [{"status_code": 503, "detail": "Game owner unavailable"} for _ in g.actions]}
+                        for g in batch]
+
+        outcomes = [None] * len(games)
+        results = await asyncio.gather(*(run(worker, indexes) for worker, indexes in by_owner.items()))
+        for indexes, batch in zip(by_owner.values(), results):
+            for i, outcome in zip(indexes, batch):
+                outcomes[i] = outcome
+        return outcomes
+
+    async def forward(self, worker: str, scope: dict, body: bytes, send) -> None:
+        """Relays an HTTP request to `worker` and its response back to the client."""
+        path = scope["path"] + (f"?{scope['query_string'].decode()}" if scope.get("query_string") else "")
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"host", b"content-length", FORWARDED_HEADER)]
+        try:
+            response = await self.request(worker, scope["method"], path, headers=headers, content=body)
+        except httpx.HTTPError:
+            # The owner is down or unreachable; once it misses its heartbeats another worker takes over
+            body = b'{"detail":"Game owner unavailable"}'
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                    (b"retry-after", str(ceil(self.timeout)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        skip = (b"content-length", b"content-encoding", b"transfer-encoding", b"connection")
+        headers = [(k.lower(), v) for k, v in response.headers.raw if k.lower() not in skip]
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": headers + [(b"content-length", str(len(response.content)).encode())]})
+        await send({"type": "http.response.body", "body": response.content})
+
+
+def _game_in_request(scope: dict, body: Optional[bytes]) -> Optional[str]:
+    match = GAME_PATH.match(scope["path"])
+    if match:
+        return next(g for g in match.groups() if g is not None)
+    game_id = parse_qs(scope.get("query_string", b"").decode()).get("game_id")
+    if game_id:
+        return game_id[0]
+    if body:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and isinstance(data.get("game_id"), str):
+            return data["game_id"]
+    return None
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class AffinityMiddleware:
+    """Hands each request about a game to the worker that owns it (plain ASGI, a no-op unless clustered).
+
+    Forwarded requests are always handled where they arrive, so a request makes at most one hop
+    even while two workers briefly disagree about the membership. A forwarding header that
+    `Cluster.forwarded_by` does not accept is stripped and the request routed like any other.
+    WebSockets and event streams are served locally from the relayed deltas.
+    """
+
+    def __init__(self, app, cluster: Optional[Cluster] = None):
+        self.app = app
+        self._cluster = cluster
+
+    @property
+    def cluster(self) -> Cluster:
+        return self._cluster or get_cluster()
+
+    async def __call__(self, scope, receive, send):
+        cluster = self.cluster
+        if scope["type"] != "http" or not cluster.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        body = None
+        owner = cluster.worker_id
+        if cluster.forwarded_by(scope) is None:
+            scope["headers"] = [(k, v) for k, v in scope["headers"] if k != FORWARDED_HEADER]
+            game_id = _game_in_request(scope, None)
+            if game_id is None and scope["method"] in ("POST", "PUT", "PATCH"):
+                body = await _read_body(receive)
+                game_id = _game_in_request(scope, body)
+            if game_id is None and IDEMPOTENCY_HEADER in dict(scope["headers"]):
+                # Not about one game (a multi-game batch): the key's owner remembers it, so retries go there too
+                game_id = dict(scope["headers"])[IDEMPOTENCY_HEADER].decode("latin-1")
+            if game_id is not None:
+                owner = cluster.owner(game_id)
+
+        if owner != cluster.worker_id:
+            scope["forwarded_to"] = owner
+            await cluster.forward(owner, scope, body if body is not None else await _read_body(receive), send)
+            return
+
+        if body is not None:
+            replayed = False
+            original = receive
+
+            async def receive():
+                nonlocal replayed
+                if replayed:
+                    return await original()
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_tagged(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (WORKER_HEADER, cluster.worker_id.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_tagged)
+
+
+cluster = Cluster()
+
+
+def get_cluster() -> Cluster:
+    return cluster
+
+
+def run_local(workers: int, port: int, broker_port: int, host: str = "127.0.0.1") -> int:
+    """Runs a broker and `workers` uvicorn processes on consecutive ports until interrupted."""
+    env = {**os.environ, "BROKER_URL": f"tcp://{host}:{broker_port}"}
+    env.setdefault("CLUSTER_SECRET", secrets.token_hex(16))
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    processes = [subprocess.Popen([sys.executable, "-m", "backend.cluster", "broker", "--host", host,
+                                   "--port", str(broker_port)], cwd=root, env=env)]
+    for i in range(workers):
+        worker_port = port + i
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", host, "--port", str(worker_port)],
+            cwd=root, env={**env, "WORKER_ID": f"worker-{i}", "WORKER_URL": f"http://{host}:{worker_port}",
+                           "ACTION_LOG_DIR": os.path.join(root, "backend", f"action_log-{i}")}))
+    print(f"Broker on {host}:{broker_port}, workers on ports {port}-{port + workers - 1}")
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    for p in processes:
+        if p.poll() is None:
+            p.send_signal(signal.SIGINT)
+    for p in processes:
+        p.wait()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    broker = commands.add_parser("broker", help="run the pub/sub broker")
+    broker.add_argument("--host", default="127.0.0.1")
+    broker.add_argument("--port", type=int, default=7400)
+    local = commands.add_parser("local", help="run a broker and several workers on this machine")
+    local.add_argument("--workers", type=int, default=2)
+    local.add_argument("--port", type=int, default=8000, help="port of the first worker")
+    local.add_argument("--broker-port", type=int, default=7400)
+    args = parser.parse_args(argv)
+
+    if args.command == "local":
+        return run_local(args.workers, args.port, args.broker_port)
+
+    async def run():
+        server = await serve_broker(args.host, args.port)
+        print(f"Broker listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,12 +6,42 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from backend.database import Base, engine  # Use absolute imports
-from backend.models import GameDB, PlayerDB  # Use absolute imports
+from backend.models import ArchivedGameDB, GameDB, HandDB, HandPlayerDB, IdempotencyKeyDB, PlayerDB, PlayerStatsDB, TournamentDB  # Use absolute imports
+from sqlalchemy import inspect, text # type: ignore
+
+# Fills a newly added column for rows that existed before it
+BACKFILL = {
+    ("games", "created_at"): "UPDATE games SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL",
+    ("games", "player_count"): "UPDATE games SET player_count = (SELECT COUNT(*) FROM players WHERE players.game_id = games.id)",
+    ("games", "updated_at"): "UPDATE games SET updated_at = created_at",
+}
+
+def upgrade_db():
+    """Add columns and indexes that exist on the models but not yet in an existing database"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    default = f" DEFAULT {column.default.arg!r}" if column.default is not None and not callable(column.default.arg) else ""
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+                    if (table.name, column.name) in BACKFILL:
+                        conn.execute(text(BACKFILL[(table.name, column.name)]))
+                    print(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+def migrate():
+    """Create missing tables, then add missing columns and indexes (run by the app at startup)"""
+    Base.metadata.create_all(bind=engine)
+    upgrade_db()
+
 def init_db():
     """Initialize the database by creating all tables"""
     try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
+        migrate()
         print("Database tables created successfully!")
         
         # You can add any initial data here if needed
@@ -1,12 +1,45 @@
 from sqlalchemy import create_engine # type: ignore
+from sqlalchemy.engine import make_url # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine # type: ignore
 from sqlalchemy.ext.declarative import declarative_base # type: ignore
 from sqlalchemy.orm import sessionmaker # type: ignore
+from sqlalchemy.pool import QueuePool # type: ignore
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get the absolute path of the backend directory
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'games.db')}"  # Ensure it always points to backend/games.db"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'games.db')}")  # Defaults to backend/games.db
+
+# Connection pool sizing for the async engine (only applied when it uses a queue pool, see pool_options)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+def async_url(url: str) -> str:
+    """Maps a plain database URL to its async driver: aiosqlite for SQLite, asyncpg for PostgreSQL"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+def pool_options(url: str) -> dict:
+    """Pool sizing keyword arguments for `url`'s default pool.
+
+    Only queue pools take them; the others (e.g. StaticPool for in-memory SQLite) reject them with a TypeError.
+    """
+    url = make_url(url)
+    if not issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        return {}
+    return {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW, "pool_timeout": POOL_TIMEOUT}
+
+# Synchronous engine, used by create_tables and offline tools
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine, used by every route
+async_engine = create_async_engine(async_url(DATABASE_URL), **pool_options(async_url(DATABASE_URL)))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,4 +47,18 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_stats() -> dict:
+    """Current connection usage of the async engine's pool"""
+    pool = async_engine.pool
+    sizing = pool_options(async_url(DATABASE_URL))
+    stats = {"pool": type(pool).__name__, **{k: sizing[k] for k in ("pool_size", "max_overflow") if k in sizing}}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
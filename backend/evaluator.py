@@ -0,0 +1,215 @@
+"""Poker hand evaluation with precomputed lookup tables.
+
+Cards are ints 0-51: `rank * 4 + suit`, with ranks 0-12 for 2..A and suits 0-3 for c, d, h, s.
+A hand's score is an int where higher beats lower and equal scores tie: the category sits in
+bits 20+ and the five deciding ranks in 4-bit groups below it.
+
+Two tables do all the work:
+  * `FLUSH_SCORES[mask]`: best flush or straight flush for a 13-bit mask of one suit's ranks.
+  * A map from a hand's rank multiset to its best non-flush score, one per hand size. The
+    multiset is keyed by `sum(5 ** rank)` over the cards, which is unique because no rank
+    appears more than 4 times.
+
+With 5-7 cards a flush and a full house (or quads) can never coexist, so a hand is scored by
+one lookup in whichever table applies.
+"""
+from itertools import combinations_with_replacement
+from typing import Dict, Iterable, List, Sequence
+
+try:
+    import numpy as np # type: ignore
+except ImportError:  # The batch API falls back to plain Python
+    np = None
+
+RANKS = "23456789TJQKA"
+SUITS = "cdhs"
+
+HAND_NAMES = ["High Card", "Pair", "Two Pair", "Three of a Kind", "Straight",
+              "Flush", "Full House", "Four of a Kind", "Straight Flush"]
+HIGH_CARD, PAIR, TWO_PAIR, TRIPS, STRAIGHT, FLUSH, FULL_HOUSE, QUADS, STRAIGHT_FLUSH = range(9)
+
+POW5 = [5 ** r for r in range(13)]
+
+
+def parse_cards(text: str) -> List[int]:
+    """Parses a string like "AsKd" or "As Kd Tc" into card ints.
+
+    Raises:
+        ValueError: If a card is malformed.
+    """
+    text = text.replace(" ", "").replace(",", "")
+    if len(text) % 2:
+        raise ValueError(f"Invalid cards: {text}")
+    cards = []
+    for i in range(0, len(text), 2):
+        rank, suit = text[i].upper(), text[i + 1].lower()
+        if rank not in RANKS or suit not in SUITS:
+            raise ValueError(f"Invalid card: {text[i:i + 2]}")
+        cards.append(RANKS.index(rank) * 4 + SUITS.index(suit))
+    return cards
+
+
+def format_cards(cards: Iterable[int]) -> str:
+    return "".join(RANKS[c >> 2] + SUITS[c & 3] for c in cards)
+
+
+def cards_to_mask(cards: Iterable[int]) -> int:
+    mask = 0
+    for c in cards:
+        mask |= 1 << c
+    return mask
+
+
+def mask_to_cards(mask: int) -> List[int]:
+    return [c for c in range(52) if mask >> c & 1]
+
+
+def _score(category: int, ranks: Sequence[int]) -> int:
+    score = category
+    for i in range(5):
+        score = (score << 4) | (ranks[i] if i < len(ranks) else 0)
+    return score
+
+
+def hand_category(score: int) -> int:
+    return score >> 20
+
+
+def hand_name(score: int) -> str:
+    return HAND_NAMES[hand_category(score)]
+
+
+def _straight_high(rank_mask: int) -> int:
+    """Highest rank of a straight in a 13-bit rank mask, or -1. The wheel (A-5) counts as 5-high."""
+    for high in range(12, 3, -1):
+        run = 0b11111 << (high - 4)
+        if rank_mask & run == run:
+            return high
+    if rank_mask & 0b1000000001111 == 0b1000000001111:
+        return 3
+    return -1
+
+
+def _build_flush_scores() -> List[int]:
+    scores = [0] * 8192
+    for mask in range(8192):
+        if bin(mask).count("1") < 5:
+            continue
+        high = _straight_high(mask)
+        if high >= 0:
+            scores[mask] = _score(STRAIGHT_FLUSH, [high])
+        else:
+            scores[mask] = _score(FLUSH, [r for r in range(12, -1, -1) if mask >> r & 1][:5])
+    return scores
+
+
+def _nonflush_score(counts: Sequence[int]) -> int:
+    """Best non-flush score for a rank histogram (index 0 = deuce)."""
+    by_count = {n: [r for r in range(12, -1, -1) if counts[r] == n] for n in (4, 3, 2, 1)}
+    present = [r for r in range(12, -1, -1) if counts[r]]
+
+    if by_count[4]:
+        quad = by_count[4][0]
+        return _score(QUADS, [quad, next(r for r in present if r != quad)])
+    if by_count[3] and (len(by_count[3]) > 1 or by_count[2]):
+        trips = by_count[3][0]
+        pair = max([r for r in by_count[3][1:]] + by_count[2])
+        return _score(FULL_HOUSE, [trips, pair])
+
+    high = _straight_high(sum(1 << r for r in present))
+    if high >= 0:
+        return _score(STRAIGHT, [high])
+    if by_count[3]:
+        trips = by_count[3][0]
+        return _score(TRIPS, [trips] + [r for r in present if r != trips][:2])
+    if len(by_count[2]) >= 2:
+        high_pair, low_pair = by_count[2][:2]
+        return _score(TWO_PAIR, [high_pair, low_pair] + [r for r in present if r not in (high_pair, low_pair)][:1])
+    if by_count[2]:
+        pair = by_count[2][0]
+        return _score(PAIR, [pair] + [r for r in present if r != pair][:3])
+    return _score(HIGH_CARD, present[:5])
+
+
+def _build_rank_scores(size: int) -> Dict[int, int]:
+    scores = {}
+    for ranks in combinations_with_replacement(range(13), size):
+        counts = [0] * 13
+        for r in ranks:
+            counts[r] += 1
+        if max(counts) > 4:
+            continue
+        scores[sum(POW5[r] for r in ranks)] = _nonflush_score(counts)
+    return scores
+
+
+FLUSH_SCORES = _build_flush_scores()
+_rank_scores: Dict[int, Dict[int, int]] = {}
+
+
+def rank_scores(size: int = 7) -> Dict[int, int]:
+    """The non-flush table for hands of `size` cards, built on first use (49,205 entries for 7 cards)."""
+    table = _rank_scores.get(size)
+    if table is None:
+        if not 5 <= size <= 7:
+            raise ValueError("Hands must have 5 to 7 cards")
+        table = _rank_scores[size] = _build_rank_scores(size)
+    return table
+
+
+def evaluate(cards: Sequence[int]) -> int:
+    """Scores the best five-card hand among 5-7 cards. Higher is better; equal scores tie."""
+    key = 0
+    suit_masks = [0, 0, 0, 0]
+    for c in cards:
+        rank = c >> 2
+        key += POW5[rank]
+        suit_masks[c & 3] |= 1 << rank
+    for mask in suit_masks:
+        if FLUSH_SCORES[mask]:
+            return FLUSH_SCORES[mask]
+    return rank_scores(len(cards))[key]
+
+
+_np_tables: dict = {}
+
+
+def _numpy_tables(size: int):
+    tables = _np_tables.get(size)
+    if tables is None:
+        table = rank_scores(size)
+        keys = np.fromiter(sorted(table), dtype=np.int64, count=len(table))
+        scores = np.fromiter((table[k] for k in keys.tolist()), dtype=np.int64, count=len(table))
+        tables = _np_tables[size] = (keys, scores, np.array(FLUSH_SCORES, dtype=np.int64), np.array(POW5, dtype=np.int64))
+    return tables
+
+
+def evaluate_batch(hands):
+    """Scores many hands in one call.
+
+    Args:
+        hands: An `(n, k)` array-like of card ints with 5 <= k <= 7, one hand per row.
+
+    Returns:
+        A NumPy int64 array of `n` scores (a list when NumPy is not installed).
+    """
+    if np is None:
+        return [evaluate(hand) for hand in hands]
+
+    hands = np.asarray(hands, dtype=np.int64)
+    keys, scores, flush_scores, pow5 = _numpy_tables(hands.shape[1])
+    ranks = hands >> 2
+    suits = hands & 3
+
+    result = scores[np.searchsorted(keys, pow5[ranks].sum(axis=1))]
+    for suit in range(4):
+        # Cards are distinct, so summing the rank bits of one suit equals OR-ing them
+        suit_mask = np.where(suits == suit, np.left_shift(1, ranks), 0).sum(axis=1)
+        flush = flush_scores[suit_mask]
+        result = np.where(flush > 0, flush, result)
+    return result
+
+
+def best_hands(hole_cards: Dict[int, Sequence[int]], board: Sequence[int]) -> Dict[int, int]:
+    """Scores each player's hole cards together with the board. Returns `{player_id: score}`."""
+    return {player_id: evaluate(list(cards) + list(board)) for player_id, cards in hole_cards.items()}
@@ -0,0 +1,317 @@
+"""Hand history: packed storage of finished hands and a columnar export / import format.
+
+The engine records every finished hand (see `tables.play()`) and writes it to `hands` and
+`hand_players` with the next flush. The actions of a hand are stored packed, one fixed-size
+record per action, using the action codes of the action log.
+
+Exports are a stream of independent chunks so neither side ever holds more than one chunk:
+
+    file   = MAGIC, then chunks
+    chunk  = u32 length, then zlib(payload)
+    payload = u32 header length, JSON header, then the columns' bytes in header order
+
+The header lists `hands` and `players` (row counts) and each column as `[table, name, kind,
+byte length]`: `kind` is an `array` typecode (little-endian), `"str"` (u32 lengths then the
+UTF-8 bytes) or `"bytes"` for the packed actions. Cards are 52-bit masks (see
+`evaluator.cards_to_mask`). Players are listed hand by hand, `players` of them per hand.
+
+    python -m backend.history export hands.phh [--since 2025-01-01T00:00] [--game GAME_ID]
+    python -m backend.history import hands.phh
+"""
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import and_, insert, or_, select # type: ignore
+from backend.action_log import ACTION_CODES, HAS_AMOUNT, HAS_PLAYER, LOGGED_ACTIONS
+from backend.database import AsyncSessionLocal
+from backend.evaluator import cards_to_mask, format_cards, mask_to_cards, parse_cards
+from backend.models import GameDB, HandDB, HandPlayerDB, PlayerDB
+from backend.stats import record as record_stats
+
+MAGIC = b"PKHH\x01"
+CHUNK_HANDS = 5000  # Hands per export chunk
+LENGTH = struct.Struct("<I")
+
+# code, flags (HAS_PLAYER / HAS_AMOUNT), player_id, amount
+ACTION = struct.Struct("<BBqq")
+
+HAND_COLUMNS = (("id", "str"), ("game_id", "str"), ("hand_no", "q"), ("ended_at", "d"), ("board", "q"),
+                ("pot", "q"), ("players", "B"), ("actions", "bytes"))
+PLAYER_COLUMNS = (("player_id", "q"), ("name", "str"), ("seat", "b"), ("position", "str"), ("stack_start", "q"),
+                  ("stack_end", "q"), ("put_in", "q"), ("hole_cards", "q"))
+
+
+def pack_actions(actions: List[list]) -> bytes:
+    """Packs `[action, player_id, amount]` entries into their stored form."""
+    return b"".join(ACTION.pack(ACTION_CODES[action], (HAS_PLAYER if player_id is not None else 0)
+                                | (HAS_AMOUNT if amount is not None else 0), player_id or 0, amount or 0)
+                    for action, player_id, amount in actions)
+
+
+def unpack_actions(data: bytes) -> List[list]:
+    return [[LOGGED_ACTIONS[code], player_id if flags & HAS_PLAYER else None, amount if flags & HAS_AMOUNT else None]
+            for code, flags, player_id, amount in ACTION.iter_unpack(data or b"")]
+
+
+def hand_rows(hand: dict) -> tuple:
+    """The `hands` row and `hand_players` rows for a finished hand recorded by the engine."""
+    row = {"id": hand["id"], "game_id": hand["game_id"], "hand_no": hand["hand_no"], "board": hand["board"],
+           "pot": hand["pot"], "actions": pack_actions(hand["actions"]),
+           "ended_at": datetime.fromtimestamp(hand["ended_at"], timezone.utc).replace(tzinfo=None)}
+    return row, [{"hand_id": hand["id"], **player} for player in hand["players"]]
+
+
+def _timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _column(kind: str, values: list) -> bytes:
+    if kind == "str":
+        encoded = [v.encode() if v is not None else b"" for v in values]
+        lengths = array("I", map(len, encoded))
+        return _little_endian(lengths) + b"".join(encoded)
+    if kind == "bytes":
+        lengths = array("I", map(len, values))
+        return _little_endian(lengths) + b"".join(values)
+    return _little_endian(array(kind, values))
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_column(kind: str, data: bytes, rows: int):
+    if kind in ("str", "bytes"):
+        lengths = _read_column("I", data[:rows * 4], rows)
+        values, offset = [], rows * 4
+        for length in lengths:
+            values.append(data[offset:offset + length])
+            offset += length
+        return [v.decode() for v in values] if kind == "str" else values
+    values = array(kind)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_chunk(hands: List[HandDB], players: Dict[str, List[HandPlayerDB]]) -> bytes:
+    """Encodes finished hands and their players (`{hand_id: [...]}`, in seat order) as one chunk."""
+    seated = [players.get(h.id, []) for h in hands]
+    flat = [p for hand_players in seated for p in hand_players]
+    values = {
+        ("hands", "id"): [h.id for h in hands],
+        ("hands", "game_id"): [h.game_id for h in hands],
+        ("hands", "hand_no"): [h.hand_no or 0 for h in hands],
+        ("hands", "ended_at"): [_timestamp(h.ended_at) for h in hands],
+        ("hands", "board"): [cards_to_mask(parse_cards(h.board or "")) for h in hands],
+        ("hands", "pot"): [h.pot or 0 for h in hands],
+        ("hands", "players"): [len(p) for p in seated],
+        ("hands", "actions"): [h.actions or b"" for h in hands],
+        ("players", "player_id"): [p.player_id for p in flat],
+        ("players", "name"): [p.name for p in flat],
+        ("players", "seat"): [p.seat for p in flat],
+        ("players", "position"): [p.position for p in flat],
+        ("players", "stack_start"): [p.stack_start for p in flat],
+        ("players", "stack_end"): [p.stack_end for p in flat],
+        ("players", "put_in"): [p.put_in or 0 for p in flat],
+        ("players", "hole_cards"): [cards_to_mask(parse_cards(p.hole_cards or "")) for p in flat],
+    }
+    columns, blobs = [], []
+    for table, spec in (("hands", HAND_COLUMNS), ("players", PLAYER_COLUMNS)):
+        for name, kind in spec:
+            blob = _column(kind, values[(table, name)])
+            columns.append([table, name, kind, len(blob)])
+            blobs.append(blob)
+    header = json.dumps({"hands": len(hands), "players": len(flat), "columns": columns}).encode()
+    payload = zlib.compress(LENGTH.pack(len(header)) + header + b"".join(blobs))
+    return LENGTH.pack(len(payload)) + payload
+
+
+def read_chunks(stream: BinaryIO) -> Iterator[dict]:
+    """Yields each chunk of an export as `{"hands": {column: values}, "players": {column: values}}`.
+
+    Raises:
+        ValueError: If the stream is not a hand-history export or ends mid-chunk.
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a hand history export")
+    while True:
+        prefix = stream.read(LENGTH.size)
+        if not prefix:
+            return
+        if len(prefix) != LENGTH.size:
+            raise ValueError("Truncated hand history export")
+        (length,) = LENGTH.unpack(prefix)
+        compressed = stream.read(length)
+        if len(compressed) != length:
+            raise ValueError("Truncated hand history export")
+        payload = zlib.decompress(compressed)
+        (header_length,) = LENGTH.unpack_from(payload)
+        header = json.loads(payload[LENGTH.size:LENGTH.size + header_length])
+        chunk: dict = {"hands": {}, "players": {}}
+        offset = LENGTH.size + header_length
+        for table, name, kind, size in header["columns"]:
+            chunk[table][name] = _read_column(kind, payload[offset:offset + size], header[table])
+            offset += size
+        yield chunk
+
+
+def chunk_hands(chunk: dict) -> Iterator[dict]:
+    """The hands of a decoded chunk as rows, each with its `players`."""
+    hands, players = chunk["hands"], chunk["players"]
+    offset = 0
+    for i in range(len(hands["id"])):
+        count = hands["players"][i]
+        yield {
+            "id": hands["id"][i], "game_id": hands["game_id"][i], "hand_no": hands["hand_no"][i],
+            "ended_at": datetime.fromtimestamp(hands["ended_at"][i], timezone.utc).replace(tzinfo=None),
+            "board": format_cards(mask_to_cards(hands["board"][i])), "pot": hands["pot"][i],
+            "actions": hands["actions"][i],
+            "players": [{"player_id": players["player_id"][j], "name": players["name"][j], "seat": players["seat"][j],
+                         "position": players["position"][j] or None, "stack_start": players["stack_start"][j],
+                         "stack_end": players["stack_end"][j], "put_in": players["put_in"][j],
+                         "hole_cards": format_cards(mask_to_cards(players["hole_cards"][j]))}
+                        for j in range(offset, offset + count)],
+        }
+        offset += count
+
+
+async def hand_pages(session_factory=AsyncSessionLocal, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, game_id: Optional[str] = None,
+                     chunk: int = CHUNK_HANDS) -> AsyncIterator[tuple]:
+    """Yields finished hands, oldest first, as pages of `(hands, {hand_id: players in seat order})`.
+
+    Each page is one keyset-paged query for the hands plus one for their players, so memory
+    use depends on `chunk`, not on how much history there is.
+    """
+    filters = []
+    if since is not None:
+        filters.append(HandDB.ended_at >= since)
+    if until is not None:
+        filters.append(HandDB.ended_at < until)
+    if game_id is not None:
+        filters.append(HandDB.game_id == game_id)
+
+    after = None
+    while True:
+        page = filters + ([or_(HandDB.ended_at > after[0], and_(HandDB.ended_at == after[0], HandDB.id > after[1]))]
+                          if after else [])
+        async with session_factory() as db:
+            hands = (await db.execute(select(HandDB).filter(*page).order_by(HandDB.ended_at, HandDB.id)
+                                      .limit(chunk))).scalars().all()
+            if not hands:
+                return
+            players: Dict[str, list] = {}
+            query = select(HandPlayerDB).filter(HandPlayerDB.hand_id.in_([h.id for h in hands])).order_by(HandPlayerDB.id)
+            for player in (await db.execute(query)).scalars():
+                players.setdefault(player.hand_id, []).append(player)
+        yield hands, players
+        if len(hands) < chunk:
+            return
+        after = (hands[-1].ended_at, hands[-1].id)
+
+
+async def export_chunks(session_factory=AsyncSessionLocal, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, game_id: Optional[str] = None,
+                        chunk: int = CHUNK_HANDS) -> AsyncIterator[bytes]:
+    """Yields an export of finished hands, oldest first, one encoded chunk per page of `hand_pages()`."""
+    yield MAGIC
+    async for hands, players in hand_pages(session_factory, since, until, game_id, chunk):
+        yield encode_chunk(hands, players)
+
+
+async def import_chunks(stream: BinaryIO, session_factory=AsyncSessionLocal) -> dict:
+    """Loads an export into the database, one transaction per chunk.
+
+    Hands already present are skipped; the rest also count towards player stats. Games that no longer exist are recreated at the end,
+    seated as after their last imported hand, with the button moved on for the next one.
+
+    Returns:
+        dict: `hands` imported, `skipped` hands, and `games` recreated.
+    """
+    imported = skipped = 0
+    latest: Dict[str, dict] = {}
+    for chunk in read_chunks(stream):
+        rows = list(chunk_hands(chunk))
+        async with session_factory() as db:
+            existing = set((await db.execute(select(HandDB.id).filter(HandDB.id.in_([r["id"] for r in rows])))).scalars())
+            new = [r for r in rows if r["id"] not in existing]
+            if new:
+                await db.execute(insert(HandDB), [{k: v for k, v in r.items() if k != "players"} for r in new])
+                await db.execute(insert(HandPlayerDB), [{"hand_id": r["id"], **p} for r in new for p in r["players"]])
+                await record_stats(db, [(unpack_actions(r["actions"]), r["players"]) for r in new])
+                await db.commit()
+        imported += len(new)
+        skipped += len(rows) - len(new)
+        for row in rows:
+            last = latest.get(row["game_id"])
+            if last is None or (row["hand_no"], row["ended_at"]) >= (last["hand_no"], last["ended_at"]):
+                latest[row["game_id"]] = row
+
+    async with session_factory() as db:
+        present = set((await db.execute(select(GameDB.id).filter(GameDB.id.in_(list(latest))))).scalars())
+        missing = [row for game_id, row in latest.items() if game_id not in present]
+        wanted = [p["player_id"] for row in missing for p in row["players"]]
+        taken = set((await db.execute(select(PlayerDB.id).filter(PlayerDB.id.in_(wanted))))
+                    .scalars()) if wanted else set()
+        if missing:
+            await db.execute(insert(GameDB), [{"id": row["game_id"], "button": row["hand_no"] + 1,
+                                               "player_count": len(row["players"]), "created_at": row["ended_at"]}
+                                              for row in missing])
+            players = [{"name": p["name"], "stack": p["stack_end"], "seat": p["seat"], "game_id": row["game_id"],
+                        **({} if p["player_id"] in taken else {"id": p["player_id"]})}
+                       for row in missing for p in row["players"]]
+            # Rows with and without explicit ids go in separate statements so each has one shape
+            for group in ([p for p in players if "id" in p], [p for p in players if "id" not in p]):
+                if group:
+                    await db.execute(insert(PlayerDB), group)
+            await db.commit()
+    return {"hands": imported, "skipped": skipped, "games": len(missing)}
+
+
+async def export_file(path: str, **filters) -> int:
+    """Writes an export to `path`. Returns the number of bytes written."""
+    written = 0
+    with open(path, "wb") as f:
+        async for data in export_chunks(**filters):
+            f.write(data)
+            written += len(data)
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write finished hands to a file")
+    export.add_argument("path")
+    export.add_argument("--since", type=datetime.fromisoformat, help="only hands ended at or after this time (UTC)")
+    export.add_argument("--until", type=datetime.fromisoformat, help="only hands ended before this time (UTC)")
+    export.add_argument("--game", help="only hands of this game")
+    load = commands.add_parser("import", help="load an export into the database")
+    load.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        written = asyncio.run(export_file(args.path, since=args.since, until=args.until, game_id=args.game))
+        print(f"Wrote {written} bytes to {args.path}")
+    else:
+        with open(args.path, "rb") as f:
+            print(json.dumps(asyncio.run(import_chunks(f))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
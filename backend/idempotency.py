@@ -0,0 +1,201 @@
+"""Idempotency keys, so a client can retry an action without it being applied twice.
+
+A client sends `Idempotency-Key: <unique string>` with an action. The first response for a key is
+kept, and a retry with the same key gets that response back (with `Idempotent-Replayed: true`)
+rather than acting again. Kept responses live in a bounded in-memory LRU that expires them after
+`IDEMPOTENCY_TTL` seconds, and are written behind to the `idempotency_keys` table so they survive
+a restart. A retry is answered from memory: the table is only read on a miss, and only while
+the LRU has dropped unexpired keys to stay within its size or when the cache is `shared` with
+other workers (a cluster), since a retry may reach this worker after a game moved here and the
+first response was kept by its old owner. Pending keys are also written before every flush of
+the live tables, so a key is never behind the state it answered for when a table is handed over.
+
+A retry that arrives while the first request is still running waits for its response. Server
+errors (5xx) aren't kept, so the retry runs again. Reusing a key for a different request is
+rejected with 422.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, insert, select # type: ignore
+from backend.cluster import get_cluster
+from backend.database import AsyncSessionLocal
+from backend.models import IdempotencyKeyDB
+from backend.tables import tables
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))  # Seconds a key is remembered
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "50000"))  # Keys kept in memory
+MAX_KEY_LENGTH = 255
+FLUSH_INTERVAL = 1.0
+PURGE_INTERVAL = 60.0  # Seconds between deletes of expired rows
+
+logger = logging.getLogger(__name__)
+
+
+class KeyReused(Exception):
+    """The key was first used for a different request."""
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes  # JSON
+    fingerprint: str  # Identifies the request, e.g. "bet:<game_id>:<player_id>:<amount>"
+    created_at: float
+
+
+class IdempotencyCache:
+    def __init__(self, session_factory=AsyncSessionLocal, ttl: float = IDEMPOTENCY_TTL, size: int = CACHE_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, shared: bool = False):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.size = size
+        self.flush_interval = flush_interval
+        self.shared = shared  # Other workers keep keys in the same table
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._running: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, StoredResponse] = {}  # Not yet written
+        self._evicted_until = 0.0  # Newest `created_at` the LRU has dropped; keys since then may be in the table only
+        self._purged = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.db_reads = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: str, fingerprint: str,
+                  handler: Callable[[], Awaitable[Tuple[int, bytes]]]) -> Tuple[StoredResponse, bool]:
+        """Runs `handler` once per key and returns its response, or the response kept for the key.
+
+        Args:
+            fingerprint (str): Identifies the request; a key reused with another one raises `KeyReused`.
+            handler: Does the work and returns `(status_code, json_body)`.
+
+        Returns:
+            tuple: The response, and whether it was replayed rather than produced by this call.
+        """
+        while True:
+            stored = await self._find(key)
+            if stored is not None:
+                if stored.fingerprint != fingerprint:
+                    raise KeyReused(key)
+                self.hits += 1
+                return stored, True
+            if key not in self._running:
+                break
+
+        running = self._running[key] = asyncio.get_running_loop().create_future()
+        stored = None
+        try:
+            status_code, body = await handler()
+            stored = StoredResponse(status_code, body, fingerprint, time.time())
+            if status_code < 500:
+                self._remember(key, stored)
+                self._pending[key] = stored
+            return stored, False
+        finally:
+            del self._running[key]
+            running.set_result(stored if stored is not None and stored.status_code < 500 else None)
+
+    async def _find(self, key: str) -> Optional[StoredResponse]:
+        stored = self._entries.get(key)
+        if stored is not None:
+            if stored.created_at > time.time() - self.ttl:
+                self._entries.move_to_end(key)
+                return stored
+            del self._entries[key]
+            return None
+        if key in self._running:
+            return await asyncio.shield(self._running[key])  # None if the first request failed: this one tries again
+        if self.shared or self._evicted_until > time.time() - self.ttl:
+            return await self._load(key)
+        return None
+
+    async def _load(self, key: str) -> Optional[StoredResponse]:
+        self.db_reads += 1
+        async with self.session_factory() as db:
+            row = (await db.execute(select(IdempotencyKeyDB).where(IdempotencyKeyDB.key == key))).scalar_one_or_none()
+        if row is None or row.created_at <= time.time() - self.ttl:
+            return None
+        stored = StoredResponse(row.status_code, row.body, row.fingerprint, row.created_at)
+        self._remember(key, stored)
+        return stored
+
+    def _remember(self, key: str, stored: StoredResponse) -> None:
+        self._entries[key] = stored
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            _, dropped = self._entries.popitem(last=False)
+            self._evicted_until = max(self._evicted_until, dropped.created_at)
+
+    async def load(self) -> int:
+        """Fills the LRU with the newest unexpired keys from the table. Returns how many were loaded."""
+        cutoff = time.time() - self.ttl
+        async with self.session_factory() as db:
+            rows = (await db.execute(select(IdempotencyKeyDB).where(IdempotencyKeyDB.created_at > cutoff)
+                                     .order_by(IdempotencyKeyDB.created_at.desc()).limit(self.size + 1))).scalars().all()
+        if len(rows) > self.size:
+            self._evicted_until = max(self._evicted_until, rows.pop().created_at)
+        for row in reversed(rows):
+            self._entries[row.key] = StoredResponse(row.status_code, row.body, row.fingerprint, row.created_at)
+        return len(rows)
+
+    async def flush(self) -> int:
+        """Writes the keys kept since the last flush and, now and then, deletes expired ones."""
+        pending, self._pending = self._pending, {}
+        now = time.time()
+        purge = now - self._purged >= PURGE_INTERVAL
+        if not pending and not purge:
+            return 0
+        try:
+            async with self.session_factory() as db:
+                if pending:
+                    # A key already in the table was kept by another worker (for another game); first one wins
+                    taken = set((await db.execute(select(IdempotencyKeyDB.key)
+                                                  .where(IdempotencyKeyDB.key.in_(list(pending))))).scalars())
+                    rows = [{"key": key, **stored._asdict()} for key, stored in pending.items() if key not in taken]
+                    if rows:
+                        await db.execute(insert(IdempotencyKeyDB), rows)
+                if purge:
+                    await db.execute(delete(IdempotencyKeyDB).where(IdempotencyKeyDB.created_at <= now - self.ttl))
+                await db.commit()
+        except Exception:
+            self._pending = {**pending, **self._pending}
+            raise
+        if purge:
+            self._purged = now
+        return len(pending)
+
+    def start(self) -> None:
+        """Starts the background write-behind task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Error writing idempotency keys")
+
+
+idempotency = IdempotencyCache(shared=get_cluster().enabled)
+tables.before_flush.append(idempotency.flush)
+
+
+def get_idempotency() -> IdempotencyCache:
+    return idempotency
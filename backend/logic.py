@@ -1,3 +1,5 @@
+from typing import Optional
+
 positions = {8:['SB','BB','UTG','+1','LJ','HJ','CO','D'],
              7:['SB','BB','UTG','+1','HJ','CO','D'],
              6:['SB','BB','UTG','+1','CO','D'],
@@ -7,8 +9,29 @@ positions = {8:['SB','BB','UTG','+1','LJ','HJ','CO','D'],
              2:['D/SB','BB']
              }
 
+MAX_SEATS = max(positions)
+
+# Index of each position label per table size, so lookups don't scan the label list
+POSITION_INDEX = {n: {label: i for i, label in enumerate(labels)} for n, labels in positions.items()}
+
+# ROTATIONS[n][button][i] is the label of the i-th occupied seat after `button` hands at an n-player table
+ROTATIONS = {n: [tuple(labels[(i + button) % n] for i in range(n)) for button in range(n)]
+             for n, labels in positions.items()}
+
+# Index of the dealer's label ("D", or "D/SB" heads-up) in each table size's order
+DEALER_INDEX = {n: next(i for i, label in enumerate(labels) if label.startswith("D")) for n, labels in positions.items()}
+
 GAME_STATES = ["pre-flop", "flop", "turn", "river", "showdown"]
 
+def seat_positions(num_players: int, button: int) -> Optional[tuple]:
+    """Position labels in seat order for a table of `num_players` with the button moved `button` times.
+
+    Returns:
+        tuple: One label per occupied seat, or None for an unsupported table size.
+    """
+    rotations = ROTATIONS.get(num_players)
+    return rotations[button % num_players] if rotations else None
+
 def update_positions(player_positions: dict) -> dict:
     """Rotates player positions for the next hand.
 
@@ -28,16 +51,13 @@ def update_positions(player_positions: dict) -> dict:
     if any(pos is None for pos in player_positions.values()):
         return {"error": "Player positions are not set"}
 
-    # Sort players by their current positions (ensuring a consistent rotation order)
-    sorted_players = sorted(player_positions.items(), key=lambda x: positions[num_players].index(x[1]))
-
-    # Rotate positions
-    rotated_positions = {
-        p_id: positions[num_players][(i + 1) % num_players]
-        for i, (p_id, _) in enumerate(sorted_players)
-    }
+    index = POSITION_INDEX[num_players]
+    if any(pos not in index for pos in player_positions.values()):
+        return {"error": "Invalid player position"}
 
-    return rotated_positions
+    # Each player moves one position along the precomputed order
+    labels = positions[num_players]
+    return {p_id: labels[(index[pos] + 1) % num_players] for p_id, pos in player_positions.items()}
 
 def get_next_state(current_state: str) -> str:
     """Returns the next state in the game"""
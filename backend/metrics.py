@@ -0,0 +1,249 @@
+"""Per-endpoint request metrics in Prometheus text format.
+
+`MetricsMiddleware` times every HTTP request. For a sampled fraction of them it also turns on
+the SQLAlchemy hooks installed by `instrument()`, which attribute queries, rows loaded, commit
+time and SQLite "database is locked" errors to the request's endpoint. Time SQLite spends
+waiting out its busy timeout is part of the query and commit time; only waits that run out
+count as locked errors. Unsampled requests only pay for a counter and a histogram update, so
+sampling keeps the cost low enough to leave on.
+
+Settings (environment):
+    METRICS_SAMPLE_RATE: Fraction of requests whose database work is measured (default 0.01,
+        i.e. 1%; raise it to 1.0 to measure every request while investigating).
+    SLOW_REQUEST_MS: Log sampled requests slower than this many milliseconds (unset: off).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+
+SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS")) if os.getenv("SLOW_REQUEST_MS") else None
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+
+logger = logging.getLogger("backend.metrics")
+
+
+class RequestStats:
+    """Database work done while serving one sampled request."""
+
+    __slots__ = ("queries", "query_seconds", "rows", "commits", "commit_seconds", "locked_errors",
+                 "_query_start", "_commit_start")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.locked_errors = 0
+        self._query_start = 0.0
+        self._commit_start = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Counters and histograms keyed by endpoint. Safe to update from any thread."""
+
+    COUNTERS = {
+        "sampled_requests_total": "Requests whose database work was measured",
+        "db_queries_total": "SQL statements executed by sampled requests",
+        "db_query_seconds_total": "Time spent executing SQL in sampled requests",
+        "db_rows_loaded_total": "ORM rows loaded by sampled requests",
+        "db_commits_total": "Commits made by sampled requests",
+        "db_locked_errors_total": "SQLite 'database is locked' errors (busy timeout ran out) in sampled requests",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.commit_latency: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Dict[str, float]] = {name: {} for name in self.COUNTERS}
+
+    def record(self, method: str, endpoint: str, status: int, seconds: float, stats: Optional[RequestStats]) -> None:
+        key = f"{method} {endpoint}"
+        with self._lock:
+            self.requests[(method, endpoint, status)] = self.requests.get((method, endpoint, status), 0) + 1
+            self.latency.setdefault(key, Histogram()).observe(seconds)
+            if stats is None:
+                return
+            for name, value in (("sampled_requests_total", 1), ("db_queries_total", stats.queries),
+                                ("db_query_seconds_total", stats.query_seconds), ("db_rows_loaded_total", stats.rows),
+                                ("db_commits_total", stats.commits), ("db_locked_errors_total", stats.locked_errors)):
+                counter = self.counters[name]
+                counter[key] = counter.get(key, 0) + value
+            if stats.commits:
+                self.commit_latency.setdefault(key, Histogram()).observe(stats.commit_seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.latency.clear()
+            self.commit_latency.clear()
+            for counter in self.counters.values():
+                counter.clear()
+
+    def render(self) -> str:
+        """The Prometheus text exposition of every metric."""
+        lines = ["# HELP http_requests_total Requests served", "# TYPE http_requests_total counter"]
+        with self._lock:
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+            _render_histograms(lines, "http_request_duration_seconds", "Request latency", self.latency)
+            _render_histograms(lines, "db_commit_duration_seconds", "Commit time per sampled request", self.commit_latency)
+            for name, help_text in self.COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{{{_labels(key)}}} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: str) -> str:
+    method, endpoint = key.split(" ", 1)
+    return f'method="{method}",endpoint="{endpoint}"'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+def _render_histograms(lines: list, name: str, help_text: str, histograms: Dict[str, Histogram]) -> None:
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        labels = _labels(key)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+registry = Registry()
+
+
+def current() -> Optional[RequestStats]:
+    """Stats of the sampled request being served, or None."""
+    return _current.get()
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records every HTTP request in `registry`."""
+
+    def __init__(self, app, sample_rate: Optional[float] = None, slow_request_ms: Optional[float] = None):
+        self.app = app
+        self.sample_rate = sample_rate  # None: use the module settings, read per request
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        sample_rate = SAMPLE_RATE if self.sample_rate is None else self.sample_rate
+        stats = RequestStats() if random.random() < sample_rate else None
+        token = _current.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            _current.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or ("forwarded" if scope.get("forwarded_to") else "unmatched")  # Templates, so ids don't explode the label set
+            registry.record(scope["method"], endpoint, status, seconds, stats)
+            slow_ms = SLOW_REQUEST_MS if self.slow_request_ms is None else self.slow_request_ms
+            if stats is not None and slow_ms is not None and seconds * 1000 >= slow_ms:
+                logger.warning("Slow request %s %s: %.1f ms, %d queries (%.1f ms), %d rows, %d commits (%.1f ms), "
+                               "%d locked errors", scope["method"], scope["path"], seconds * 1000,
+                               stats.queries, stats.query_seconds * 1000, stats.rows, stats.commits,
+                               stats.commit_seconds * 1000, stats.locked_errors)
+
+
+# SQLAlchemy hooks. Each one is a context-variable lookup when the request isn't sampled.
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - stats._query_start
+
+
+def _handle_error(exception_context):
+    stats = _current.get()
+    message = str(exception_context.original_exception).lower()
+    if stats is not None and "is locked" in message:  # "database is locked" / "database table is locked"
+        stats.locked_errors += 1
+
+
+def _loaded(session, instance):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+def _before_commit(session):
+    stats = _current.get()
+    if stats is not None:
+        stats._commit_start = time.perf_counter()
+
+
+def _after_commit(session):
+    stats = _current.get()
+    if stats is not None and stats._commit_start:
+        stats.commits += 1
+        stats.commit_seconds += time.perf_counter() - stats._commit_start
+        stats._commit_start = 0.0
+
+
+def instrument(*engines) -> None:
+    """Installs the query hooks on `engines` (sync engines, or `AsyncEngine.sync_engine`) and the ORM session hooks."""
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+    if not event.contains(Session, "loaded_as_persistent", _loaded):
+        event.listen(Session, "loaded_as_persistent", _loaded)
+        event.listen(Session, "before_commit", _before_commit)
+        event.listen(Session, "after_commit", _after_commit)
+
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey # type: ignore
+from datetime import datetime
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, ForeignKey, Index, LargeBinary # type: ignore
 from sqlalchemy.orm import relationship # type: ignore
 from backend.database import Base
 
@@ -11,7 +12,10 @@ class PlayerDB(Base):
     active = Column(Boolean, default=True)
     bet_amount = Column(Integer, default=0)
     game_id = Column(String, ForeignKey("games.id"))
-    position = Column(String, nullable=True)
+    position = Column(String, nullable=True)  # Legacy label; positions are now derived from seat and GameDB.button
+    seat = Column(Integer, nullable=True)  # 0 .. MAX_SEATS - 1, fixed while the player is at the table
+    hole_cards = Column(String, default="")  # e.g. "AsKd"
+    contributed = Column(Integer, default=0)  # Chips put into the pots this hand
 
 class GameDB(Base):
     __tablename__ = "games"
@@ -21,4 +25,97 @@ class GameDB(Base):
     pot = Column(Integer, default=0)
     current_bet = Column(Integer, default=0)
     raise_size = Column(Integer, default=0)
-    game_state = Column(String, default="pre-flop")
\ No newline at end of file
+    game_state = Column(String, default="pre-flop")
+    community_cards = Column(String, default="")  # e.g. "2c7hTd"
+    button = Column(Integer, default=0)  # Hands played at this table (numbers the hand history)
+    dealer_seat = Column(Integer, nullable=True)  # Seat on the button; NULL derives it from `button` as before
+    log_seq = Column(Integer, default=0)  # Last action-log record reflected in this row
+    log_id = Column(String, nullable=True)  # The action log that log_seq counts in (each worker has its own)
+    version = Column(Integer, default=0)  # Bumped by every engine write; writes compare-and-swap on it
+    player_count = Column(Integer, default=0, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)  # Last engine write; idle games are archived
+    tournament_id = Column(String, ForeignKey("tournaments.id"), nullable=True, index=True)
+    shot_clock = Column(Float, nullable=True)  # Seconds per turn (0: turns enforced, no limit); None: turns not enforced
+    to_act = Column(Integer, nullable=True)  # Player whose turn it is; see backend/turns.py
+    acted = Column(Integer, nullable=True)  # Seats that have acted since the last bet, as a bitmask
+
+    # Keyset pagination for /show-active-games/, newest first, with and without a state filter
+    __table_args__ = (
+        Index("ix_games_created_at_id", "created_at", "id"),
+        Index("ix_games_state_created_at_id", "game_state", "created_at", "id"),
+    )
+
+class TournamentDB(Base):
+    __tablename__ = "tournaments"
+
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String)
+    table_size = Column(Integer, default=8)  # Seats per table, 2-8
+    created_at = Column(DateTime, default=datetime.utcnow)
+    tables = relationship("GameDB", backref="tournament")
+
+class HandDB(Base):
+    __tablename__ = "hands"
+
+    id = Column(String, primary_key=True, index=True)
+    game_id = Column(String, index=True)  # Not a foreign key: history outlives the game
+    hand_no = Column(Integer)  # GameDB.button while the hand was played
+    board = Column(String, default="")  # e.g. "2c7hTdJs9s"
+    pot = Column(Integer, default=0)  # Chips put in by all players
+    actions = Column(LargeBinary)  # Packed (action, player_id, amount) records; see backend/history.py
+    ended_at = Column(DateTime, default=datetime.utcnow)
+    players = relationship("HandPlayerDB", backref="hand")
+
+    # Export pages through history oldest first
+    __table_args__ = (Index("ix_hands_ended_at_id", "ended_at", "id"),)
+
+class HandPlayerDB(Base):
+    __tablename__ = "hand_players"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hand_id = Column(String, ForeignKey("hands.id"), index=True)
+    player_id = Column(Integer)
+    name = Column(String)
+    seat = Column(Integer)
+    position = Column(String, nullable=True)
+    stack_start = Column(Integer)
+    stack_end = Column(Integer)
+    put_in = Column(Integer, default=0)  # Chips this player put into the pots
+    hole_cards = Column(String, default="")
+
+class PlayerStatsDB(Base):
+    __tablename__ = "player_stats"
+
+    # Running counts per player name and position, added to as hands are flushed (see backend/stats.py)
+    name = Column(String, primary_key=True)
+    position = Column(String, primary_key=True)  # "" when the table size had no position labels
+    hands = Column(Integer, default=0)
+    vpip = Column(Integer, default=0)  # Hands with a voluntary pre-flop bet, raise, call or all-in
+    pfr = Column(Integer, default=0)  # Hands with a pre-flop bet, raise or all-in
+    aggressive = Column(Integer, default=0)  # Bets, raises and all-ins
+    calls = Column(Integer, default=0)
+    folds = Column(Integer, default=0)
+    won = Column(Integer, default=0)  # Hands finished with more chips than they started with
+    net = Column(Integer, default=0)  # Chips won minus chips lost
+
+class IdempotencyKeyDB(Base):
+    """The first response to a client's idempotency key; see backend/idempotency.py"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String)  # The request the key was first used for
+    status_code = Column(Integer)
+    body = Column(LargeBinary)  # JSON response body
+    created_at = Column(Float, index=True)  # Unix time; rows older than IDEMPOTENCY_TTL are deleted
+
+class ArchivedGameDB(Base):
+    """A finished or idle game moved out of the live tables; see backend/archive.py"""
+    __tablename__ = "archived_games"
+
+    id = Column(String, primary_key=True)
+    tournament_id = Column(String, nullable=True, index=True)
+    reason = Column(String)  # "finished" or "idle"
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow, index=True)
+    data = Column(LargeBinary)  # zlib-compressed JSON: the game row and its player rows
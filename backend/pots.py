@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class Pot:
+    """One main or side pot. `size` is the most any single player can put in it (None: no limit)."""
+
+    __slots__ = ("size", "amount", "contributions")
+
+    def __init__(self, size: Optional[int] = None):
+        self.size = size
+        self.amount = 0
+        self.contributions: Dict[int, int] = {}
+
+    def put(self, player_id: Optional[int], chips: int) -> None:
+        self.amount += chips
+        if player_id is not None:
+            self.contributions[player_id] = self.contributions.get(player_id, 0) + chips
+
+
+class PotLedger:
+    """Main and side pots for one hand, kept up to date as chips go in.
+
+    Pots are stacked in layers: the main pot takes each player's first `size` chips, the next
+    side pot the following `size`, and the last pot is uncapped. A new layer boundary appears
+    whenever a player goes all-in at a total no boundary exists for yet. Adding chips walks
+    the layers once and a new boundary splits one layer, so every update is O(players).
+    """
+
+    def __init__(self):
+        self.pots: List[Pot] = [Pot()]
+        self.totals: Dict[int, int] = {}  # Chips each player has put in this hand
+        self.all_in: Dict[int, int] = {}  # Total at which a player went all-in
+
+    @property
+    def total(self) -> int:
+        return sum(pot.amount for pot in self.pots)
+
+    def add(self, player_id: int, chips: int, all_in: bool = False) -> None:
+        """Puts a player's chips into the pots, opening a side pot if the player is now all-in."""
+        remaining = chips
+        for pot in self.pots:
+            if remaining <= 0:
+                break
+            if pot.size is None:
+                pot.put(player_id, remaining)
+                remaining = 0
+            else:
+                room = pot.size - pot.contributions.get(player_id, 0)
+                if room > 0:
+                    pot.put(player_id, min(room, remaining))
+                    remaining -= min(room, remaining)
+
+        total = self.totals[player_id] = self.totals.get(player_id, 0) + chips
+        if all_in and total > 0:
+            self.all_in[player_id] = total
+            self._split_at(total)
+
+    def add_dead(self, chips: int) -> None:
+        """Adds chips that belong to no player (e.g. a pot carried over from before pots were tracked)."""
+        if chips > 0:
+            self.pots[0].put(None, chips)
+
+    def _split_at(self, level: int) -> None:
+        floor = 0
+        for i, pot in enumerate(self.pots):
+            ceiling = floor + pot.size if pot.size is not None else None
+            if ceiling == level:
+                return  # Boundary already exists
+            if ceiling is None or level < ceiling:
+                cut = level - floor
+                lower, upper = Pot(cut), Pot(pot.size - cut if pot.size is not None else None)
+                for player_id, chips in pot.contributions.items():
+                    lower.put(player_id, min(chips, cut))
+                    if chips > cut:
+                        upper.put(player_id, chips - cut)
+                lower.amount += pot.amount - sum(pot.contributions.values())  # Dead money stays in the lower pot
+                self.pots[i:i + 1] = [lower, upper]
+                return
+            floor = ceiling
+
+    def ceilings(self) -> List[Optional[int]]:
+        """Cumulative contribution needed to be all the way into each pot (None for the uncapped one)."""
+        result, floor = [], 0
+        for pot in self.pots:
+            floor = floor + pot.size if pot.size is not None and floor is not None else None
+            result.append(floor)
+        return result
+
+    def eligible(self, contenders: Sequence[int]) -> List[List[int]]:
+        """Players who can win each pot: contenders (players who haven't folded, in seating order)
+        unless they went all-in for less than the pot reaches."""
+        result = []
+        for pot, ceiling in zip(self.pots, self.ceilings()):
+            players = [p for p in contenders
+                       if p not in self.all_in or (ceiling is not None and self.all_in[p] >= ceiling)]
+            if not players:
+                # Everyone who reached this pot folded: it goes to whoever is left in it, then to anyone left
+                players = [p for p in contenders if pot.contributions.get(p)] or list(contenders)
+            result.append(players)
+        return result
+
+    def summary(self, contenders: Sequence[int]) -> List[dict]:
+        return [{"amount": pot.amount, "eligible": players}
+                for pot, players in zip(self.pots, self.eligible(contenders)) if pot.amount]
+
+    def settle(self, contenders: Sequence[int], scores: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+        """Splits every pot among its best eligible hands.
+
+        Args:
+            contenders (list): Players still in the hand, in seating order (odd chips go to the earliest).
+            scores (dict): Hand score per contender (higher wins). May be omitted when only one player is left.
+
+        Returns:
+            dict: Chips won per player.
+        """
+        scores = scores or {}
+        winnings: Dict[int, int] = {}
+        for pot, players in zip(self.pots, self.eligible(contenders)):
+            if not pot.amount:
+                continue
+            best = max((scores.get(p, 0) for p in players), default=0)
+            winners = [p for p in players if scores.get(p, 0) == best]
+            share, odd_chips = divmod(pot.amount, len(winners))
+            for i, player_id in enumerate(winners):
+                winnings[player_id] = winnings.get(player_id, 0) + share + (1 if i < odd_chips else 0)
+        return winnings
+
+    @classmethod
+    def rebuild(cls, totals: Dict[int, int], all_in: Iterable[int], dead: int = 0) -> "PotLedger":
+        """Builds the ledger from each player's hand total, e.g. after loading a table from the database."""
+        ledger = cls()
+        all_in = set(all_in)
+        for player_id in sorted(totals, key=lambda p: totals[p]):
+            ledger.add(player_id, totals[player_id], all_in=player_id in all_in)
+        ledger.add_dead(dead)
+        return ledger
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+from backend.tables import tables
+
+SEND_TIMEOUT = 5.0  # Seconds a subscriber may take to accept one message before it is dropped
+KEEPALIVE_INTERVAL = 15.0  # Seconds between keep-alives on an idle server-sent-event stream
+
+
+def merge_delta(pending: dict, delta: dict) -> None:
+    """Folds `delta` into `pending` in place so the newest value of every field wins."""
+    for key, value in delta.items():
+        if key == "players":
+            players = pending.setdefault("players", {})
+            for player_id, fields in value.items():
+                players.setdefault(player_id, {}).update(fields)
+        else:
+            pending[key] = value
+
+
+class Subscription:
+    """One client's view of a game's changes.
+
+    Deltas are never queued: anything the client hasn't picked up yet is merged into a single
+    pending delta, so a slow client costs one dict of memory and skips intermediate states
+    instead of holding up the game.
+    """
+
+    __slots__ = ("game_id", "pending", "event")
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.pending: Optional[dict] = None
+        self.event = asyncio.Event()
+
+    def offer(self, delta: dict) -> None:
+        if self.pending is None:
+            self.pending = {}
+        merge_delta(self.pending, delta)
+        self.event.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Waits for the next (possibly coalesced) delta. Returns None on timeout."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.event.clear()
+        delta, self.pending = self.pending, None
+        return delta
+
+
+class Broadcaster:
+    """Fans table changes out to every subscriber of a game.
+
+    Subscribers are plain objects waiting on an event in the event loop, so thousands of idle
+    connections cost no threads or timers. `publish()` may be called from any thread and never
+    blocks: it schedules delivery on the loop and returns.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, set] = {}
+        self._versions: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def subscribe(self, game_id: str) -> Subscription:
+        """Registers a subscriber. Must be called from the event loop that serves it."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        subscription = Subscription(game_id)
+        self._subscribers.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.game_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:  # Nobody holds a version of this game any more: numbering restarts
+                del self._subscribers[subscription.game_id]
+                self._versions.pop(subscription.game_id, None)
+
+    def subscriber_count(self, game_id: Optional[str] = None) -> int:
+        if game_id is not None:
+            return len(self._subscribers.get(game_id, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+    def version(self, game_id: str) -> int:
+        return self._versions.get(game_id, 0)
+
+    def wants(self, game_id: str) -> bool:
+        """Whether anyone subscribes to `game_id`; the engine skips working out deltas nobody reads."""
+        return game_id in self._subscribers
+
+    def publish(self, game_id: str, delta: dict) -> None:
+        """Queues `delta` for every subscriber of `game_id`. Cheap no-op when nobody is listening."""
+        if game_id not in self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._deliver(game_id, delta)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, game_id, delta)
+
+    __call__ = publish  # So the broadcaster itself is an engine listener, `wants()` and all
+
+    def _deliver(self, game_id: str, delta: dict) -> None:
+        if game_id not in self._subscribers:  # The last one left after this was queued
+            return
+        version = self._versions[game_id] = self._versions.get(game_id, 0) + 1
+        delta = {**delta, "version": version}
+        for subscription in self._subscribers.get(game_id, ()):
+            subscription.offer(delta)
+        if delta.get("ended"):
+            self._versions.pop(game_id, None)
+
+
+broadcaster = Broadcaster()
+tables.listeners.append(broadcaster)
+
+
+def get_broadcaster() -> Broadcaster:
+    return broadcaster
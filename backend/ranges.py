@@ -0,0 +1,226 @@
+"""Precomputed preflop equity of the 169 starting-hand classes, and opening ranges derived from it.
+
+The table holds, for every class ("AA", "AKs", "72o", ...) and every number of opponents from 1
+to 7, the hand's expected share of the pot at showdown against that many random hands. It is
+built offline by Monte Carlo over a process pool and saved as a `.npy` file, which the server
+memory-maps at startup, so a lookup is an array index and a range is a binary search.
+
+    python -m backend.ranges build --trials 100000 --workers 4    # writes backend/preflop_equity.npy
+    python -m backend.ranges range --players 6 --position CO --stack 20
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.evaluator import RANKS, evaluate_batch, np, parse_cards
+from backend.logic import positions
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_PATH = os.getenv("PREFLOP_TABLE") or os.path.join(BASE_DIR, "preflop_equity.npy")
+MAX_OPPONENTS = max(positions) - 1
+TRIALS = 100000  # Deals per starting-hand class when building
+BLINDS = {"SB": 0.5, "D/SB": 0.5, "BB": 1.0}  # Big blinds already posted by position
+
+# Classes in grid order: rank pairs from the top, suited above the diagonal, offsuit below it
+CLASSES: List[str] = []
+for _high in range(12, -1, -1):
+    for _low in range(12, -1, -1):
+        if _high == _low:
+            CLASSES.append(RANKS[_high] * 2)
+        elif _high > _low:
+            CLASSES.append(f"{RANKS[_high]}{RANKS[_low]}s")
+        else:
+            CLASSES.append(f"{RANKS[_low]}{RANKS[_high]}o")
+CLASS_INDEX = {name: i for i, name in enumerate(CLASSES)}
+COMBOS = [6 if len(c) == 2 else 4 if c[2] == "s" else 12 for c in CLASSES]  # Card combinations per class
+
+
+def hand_class(cards: Sequence[int]) -> str:
+    """The starting-hand class of two hole cards, e.g. `[As, Kd]` -> "AKo"."""
+    high, low = sorted(cards, reverse=True)
+    if high >> 2 == low >> 2:
+        return RANKS[high >> 2] * 2
+    return f"{RANKS[high >> 2]}{RANKS[low >> 2]}{'s' if high & 3 == low & 3 else 'o'}"
+
+
+def parse_hand(text: str) -> str:
+    """Accepts a class ("AKs", "tt") or two cards ("AsKd") and returns the class name."""
+    text = text.strip()
+    if len(text) == 4:
+        cards = parse_cards(text)
+        if len(cards) != 2 or cards[0] == cards[1]:
+            raise ValueError(f"Not a starting hand: {text}")
+        return hand_class(cards)
+    name = text[:2].upper() + text[2:].lower()
+    if name not in CLASS_INDEX:
+        raise ValueError(f"Not a starting hand: {text}")
+    return name
+
+
+def _representative(name: str) -> List[int]:
+    # Equity doesn't depend on the actual suits, only on whether they match
+    high, low = RANKS.index(name[0]), RANKS.index(name[1])
+    return [high * 4, low * 4 + (0 if name[2:] == "s" else 1)]
+
+
+def class_equity(index: int, trials: int, seed: int = 0) -> List[float]:
+    """Monte Carlo equity of one class against 1..MAX_OPPONENTS random hands. Runs in a pool worker.
+
+    Every deal gives MAX_OPPONENTS hands and a board; the first `n` hands are the opponents of
+    the `n`-opponent estimate, so each deal is scored once for all opponent counts.
+    """
+    hero = _representative(CLASSES[index])
+    deck = np.array([c for c in range(52) if c not in hero], dtype=np.int64)
+    rng = np.random.default_rng([seed, index])
+    dealt = 2 * MAX_OPPONENTS + 5
+    deals = deck[rng.random((trials, len(deck))).argpartition(dealt, axis=1)[:, :dealt]]
+    board = deals[:, -5:]
+
+    hero_score = evaluate_batch(np.hstack([np.broadcast_to(np.array(hero), (trials, 2)), board]))
+    opponents = np.stack([evaluate_batch(np.hstack([deals[:, 2 * i:2 * i + 2], board]))
+                          for i in range(MAX_OPPONENTS)], axis=1)
+    best = np.maximum.accumulate(opponents, axis=1)
+    ties = np.cumsum(opponents == hero_score[:, None], axis=1)
+    share = np.where(hero_score[:, None] > best, 1.0,
+                     np.where(hero_score[:, None] == best, 1.0 / (1 + ties), 0.0))
+    return share.mean(axis=0).tolist()
+
+
+def build(trials: int = TRIALS, workers: int = 1, seed: int = 0, path: str = TABLE_PATH) -> "np.ndarray":
+    """Computes the equity table and writes it to `path` (replacing any old file only once complete).
+
+    Returns:
+        The `(169, MAX_OPPONENTS)` float32 table; column `n - 1` is the equity against `n` opponents.
+    """
+    if np is None:
+        raise RuntimeError("Building preflop tables needs NumPy")
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            rows = list(pool.map(class_equity, range(len(CLASSES)), [trials] * len(CLASSES),
+                                 [seed] * len(CLASSES), chunksize=4))
+    else:
+        rows = [class_equity(i, trials, seed) for i in range(len(CLASSES))]
+    table = np.array(rows, dtype=np.float32)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        np.save(f, table)
+    os.replace(partial, path)
+    return table
+
+
+class PreflopTable:
+    """The equity table, memory-mapped, with each opponent count's classes pre-sorted by equity."""
+
+    def __init__(self, equity: "np.ndarray"):
+        if equity.shape != (len(CLASSES), MAX_OPPONENTS):
+            raise ValueError(f"Preflop table has shape {equity.shape}, expected {(len(CLASSES), MAX_OPPONENTS)}")
+        self.equity = equity
+        self._order = np.argsort(-equity, axis=0, kind="stable")  # Best class first, per opponent count
+        self._sorted = -np.take_along_axis(equity, self._order, axis=0)  # Ascending, for searchsorted
+        self._combos = np.cumsum(np.array(COMBOS)[self._order], axis=0)
+
+    def hand(self, name: str, opponents: int) -> float:
+        return float(self.equity[CLASS_INDEX[name], opponents - 1])
+
+    def top(self, opponents: int, min_equity: float) -> tuple:
+        """Classes with at least `min_equity` against `opponents` hands, best first, and their combinations."""
+        count = int(np.searchsorted(self._sorted[:, opponents - 1], -min_equity, side="right"))
+        classes = [CLASSES[i] for i in self._order[:count, opponents - 1]]
+        return classes, int(self._combos[count - 1, opponents - 1]) if count else 0
+
+
+_table: Optional[PreflopTable] = None
+
+
+def load(path: str = TABLE_PATH) -> Optional[PreflopTable]:
+    """Memory-maps the table file. Returns None (and lookups are unavailable) if it hasn't been built."""
+    global _table
+    if np is None or not os.path.exists(path):
+        _table = None
+        return None
+    _table = PreflopTable(np.load(path, mmap_mode="r"))
+    return _table
+
+
+def get_table() -> Optional[PreflopTable]:
+    """The loaded table, loading it on first use if startup didn't."""
+    return _table if _table is not None else load()
+
+
+def left_to_act(num_players: int, position: str) -> int:
+    """Players still to act behind `position` before the flop (action starts left of the big blind)."""
+    labels = positions[num_players]
+    order = labels[2:] + labels[:2]
+    return num_players - 1 - order.index(position)
+
+
+def opening_range(table: PreflopTable, num_players: int, position: str, stack: float) -> dict:
+    """The hands worth moving all in with from `position` when every player behind calls.
+
+    Going all in for `stack` big blinds risks the stack minus any blind already posted; if all
+    `n` players left to act call, the pot is `(n + 1) * stack`. A hand qualifies when its equity
+    against `n` random hands covers that price, which tends to a fair share `1 / (n + 1)` as
+    stacks get deep and drops slightly for the blinds when they are short. The big blind, with
+    nobody left to act, is priced against one opponent.
+
+    Args:
+        num_players (int): Players at the table (a key of `logic.positions`).
+        position (str): A label of `logic.positions[num_players]`.
+        stack (float): Effective stack in big blinds.
+
+    Returns:
+        dict: `opponents`, the `break_even` equity, the `range` of classes (best first) with its
+        `combos` and `percent` of all starting hands, and the `equity` of every class in it.
+    """
+    opponents = max(1, left_to_act(num_players, position))
+    posted = min(BLINDS.get(position, 0.0), stack)
+    break_even = (stack - posted) / ((opponents + 1) * stack)
+    classes, combos = table.top(opponents, break_even)
+    return {
+        "players": num_players,
+        "position": position,
+        "stack": stack,
+        "opponents": opponents,
+        "break_even": round(break_even, 4),
+        "range": classes,
+        "combos": combos,
+        "percent": round(100 * combos / 1326, 2),
+        "equity": {name: round(table.hand(name, opponents), 4) for name in classes},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    builder = commands.add_parser("build", help="compute the equity table")
+    builder.add_argument("--trials", type=int, default=TRIALS, help="deals per starting-hand class")
+    builder.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    builder.add_argument("--seed", type=int, default=0)
+    builder.add_argument("--out", default=TABLE_PATH)
+    lookup = commands.add_parser("range", help="print the range for a position and stack depth")
+    lookup.add_argument("--players", type=int, default=6)
+    lookup.add_argument("--position", required=True)
+    lookup.add_argument("--stack", type=float, default=100.0, help="in big blinds")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        table = build(args.trials, args.workers, args.seed, args.out)
+        print(f"Wrote {args.out}: AA {table[CLASS_INDEX['AA'], 0]:.3f}, 72o {table[CLASS_INDEX['72o'], 0]:.3f} heads-up")
+        return 0
+
+    table = load()
+    if table is None:
+        parser.error(f"{TABLE_PATH} not found; run the build command first")
+    if args.position not in positions.get(args.players, []):
+        parser.error(f"unknown position {args.position} for {args.players} players")
+    print(json.dumps(opening_range(table, args.players, args.position, args.stack), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
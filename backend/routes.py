@@ -1,14 +1,38 @@
-from typing import Dict, List
-from fastapi import APIRouter, Depends, HTTPException # type: ignore
-from sqlalchemy.orm import Session # type: ignore
-from backend.models import GameDB, PlayerDB
-from backend.database import get_db
-from backend.logic import update_positions, get_next_state, positions
+import asyncio
+import base64
+import json
+import random
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
+from fastapi.encoders import jsonable_encoder # type: ignore
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse # type: ignore
+from sqlalchemy import and_, delete, func, insert, or_, select # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from backend.models import GameDB, PlayerDB, TournamentDB
+from backend.database import get_async_db, pool_stats
+from backend.metrics import registry
+from backend.logic import positions
+from backend.tables import ActionError, TableEngine, TableState, get_tables
+from backend.evaluator import cards_to_mask, format_cards, parse_cards
+from backend.equity import calculate_equity
+from backend.history import export_chunks
+from backend.stats import player_stats
+from backend.tournaments import seat_draw
+from backend.ranges import (CLASS_INDEX, COMBOS, MAX_OPPONENTS, PreflopTable, get_table as get_preflop_table,
+                           opening_range, parse_hand)
+from backend.push import Broadcaster, get_broadcaster, KEEPALIVE_INTERVAL, SEND_TIMEOUT
+from backend import archive
+from backend.cluster import Cluster, get_cluster
+from backend.idempotency import MAX_KEY_LENGTH, IdempotencyCache, KeyReused, get_idempotency
 import uuid
-from pydantic import BaseModel # type: ignore
+from pydantic import BaseModel, Field # type: ignore
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 200  # Largest page /show-active-games/ returns
+
 class BetRequest(BaseModel):
     game_id: str
     player_id: int
@@ -24,303 +48,537 @@ class NextHandRequest(BaseModel):
 class NextStageRequest(BaseModel):
     game_id: str
 
+class CardsRequest(BaseModel):
+    game_id: str
+    player_id: Optional[int] = None  # Omit to set the community cards
+    cards: str  # e.g. "AsKd" for hole cards, "2c7hTd" for a flop
+
+class ActionInput(BaseModel):
+    action: str  # "bet", "raise", "call", "fold", "all-in", "check", "next-round", "next-stage", "next-hand", "hole-cards", "board"
+    player_id: Optional[int] = None
+    amount: Optional[int] = None  # Bet or raise-to amount
+    cards: Optional[str] = None  # For "hole-cards" and "board"
+
+def card_mask(cards: str) -> int:
+    """Parses a card string into the bitmask the card actions take"""
+    try:
+        return cards_to_mask(parse_cards(cards))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def action_tuple(a: ActionInput) -> tuple:
+    return (a.action, a.player_id, card_mask(a.cards) if a.cards is not None else a.amount)
+
+class BatchRequest(BaseModel):
+    actions: List[ActionInput]
+    atomic: bool = False  # Roll back the whole batch if any action is rejected
+
+class GameBatch(BaseModel):
+    game_id: str
+    actions: List[ActionInput]
+
+class MultiBatchRequest(BaseModel):
+    games: List[GameBatch]
+    atomic: bool = False  # Applies per game
+
+def idempotency_key(idempotency_key: Optional[str] = Header(None),
+                    keys: IdempotencyCache = Depends(get_idempotency)) -> Optional[tuple]:
+    """The request's `Idempotency-Key` header with the cache it is checked against, or None without one"""
+    if idempotency_key is None:
+        return None
+    if not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    return keys, idempotency_key
+
+async def once(key: Optional[tuple], fingerprint: str, work):
+    """Runs `work()` once per idempotency key; a retry with the same key gets the first response back"""
+    if key is None:
+        return await work()
+    keys, value = key
+
+    async def handler() -> tuple:
+        try:
+            return 200, json.dumps(jsonable_encoder(await work())).encode()
+        except HTTPException as e:
+            return e.status_code, json.dumps({"detail": e.detail}).encode()
+
+    try:
+        stored, replayed = await keys.run(value, fingerprint, handler)
+    except KeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return Response(stored.body, status_code=stored.status_code, media_type="application/json",
+                    headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+async def run_action(tables: TableEngine, game_id: str, action: str, player_id: int = None, amount: int = None,
+                     key: Optional[tuple] = None) -> dict:
+    """Applies an action to the live table, turning rule violations into HTTP errors"""
+    async def work() -> dict:
+        try:
+            return await tables.apply(game_id, action, player_id, amount)
+        except ActionError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    return await once(key, f"{action}:{game_id}:{player_id}:{amount}", work)
+
 @router.get("/")
-def main() -> Dict[str, str]:
+async def main() -> Dict[str, str]:
     return {"msg": "Successfully run"}
 
 # Define Pydantic model for input validation
 class PlayerInput(BaseModel):
     players: Dict[str, int]  # Dictionary of {player_name: stack}
+    shot_clock: Optional[float] = Field(None, ge=0)  # Seconds per turn; set (0 for no limit) to enforce turn order
+
+class TournamentInput(BaseModel):
+    name: str
+    players: Dict[str, int]  # Dictionary of {player_name: stack}
+    table_size: int = 8  # Seats per table, 2-8
+    seed: Optional[int] = None  # Makes the seat draw reproducible
+    shot_clock: Optional[float] = Field(None, ge=0)  # Seconds per turn at every table
+
+class JoinRequest(BaseModel):
+    name: str
+    stack: int
 
 @router.post("/create-game/")
-def create_game(player_data: PlayerInput, db: Session = Depends(get_db)) -> Dict[str, str]:
+async def create_game(player_data: PlayerInput, db: AsyncSession = Depends(get_async_db)) -> Dict[str, str]:
     """Creates a new game and stores it in the database"""
 
-    game_id = str(uuid.uuid4())
-    new_game = GameDB(id=game_id, game_state="pre-flop")
-    db.add(new_game)
-    db.commit()
-
     num_players = len(player_data.players)
     if num_players not in positions:
         raise HTTPException(status_code=400, detail="Invalid number of players for a game.")
 
-    position_list = positions[num_players]
+    # The game and its players go in together, in one transaction
+    game_id = str(uuid.uuid4())
+    new_game = GameDB(id=game_id, game_state="pre-flop", player_count=num_players, shot_clock=player_data.shot_clock)
+    db.add(new_game)
 
-    # Add players
-    for i, (name, stack) in enumerate(player_data.players.items()):
+    # Add players; seat order fixes the position labels (seat 0 starts as the small blind)
+    for seat, (name, stack) in enumerate(player_data.players.items()):
         player = PlayerDB(
             name=name,
             stack=stack,
             active=True,
             game_id=game_id,
-            position=position_list[i]  # ✅ Now correctly aligned with zero-based index
+            seat=seat
         )
         db.add(player)
     
-    db.commit()
+    await db.commit()
     return {"game_id": game_id, "message": "Game created successfully"}
 
+def game_body(table: TableState, **extra) -> bytes:
+    """The serialized /get-game/ response for a table (called with its lock held)"""
+    labels = table.positions()
+    return json.dumps({
+        "game_id": table.id,
+        "state": table.game_state,
+        "pot": table.pot,
+        "pots": table.pots.summary(table.contenders()),
+        "current_bet": table.current_bet,
+        "community_cards": format_cards(table.board),
+        "button": table.button,
+        "dealer_seat": table.dealer_seat(),
+        "to_act": table.to_act,
+        "shot_clock": table.shot_clock,
+        "turn_deadline": table.turn_deadline,
+        "players": [{"id": p.id, "name": p.name, "stack": p.stack, "active": p.active, "seat": p.seat, "position": labels[p.id]}
+                    for p in table.players.values()],
+        **extra,
+    }, separators=(",", ":")).encode()
+
 @router.get('/get-game/{game_id}')
-def get_game(game_id: str, db: Session = Depends(get_db)) -> Dict[str, dict]:
-    """Retrieve an existing game from the database"""
-    
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
-    if not game:
-        return {"error": "Game not found"}
-    
-    players = db.query(PlayerDB).filter(PlayerDB.game_id == game_id).all()
-    return {
-        "game_id": game_id,
-        "state": game.game_state,
-        "pot": game.pot,
-        "current_bet": game.current_bet,
-        "players": [{"id": p.id, "name": p.name, "stack": p.stack, "active": p.active} for p in players]
-    }
+async def get_game(game_id: str, if_none_match: Optional[str] = Header(None),
+                   tables: TableEngine = Depends(get_tables)) -> Response:
+    """Retrieve an existing game from the live table state.
+
+    The body is serialized once per table version and reused until the next change. Send the
+    returned ETag back as If-None-Match to get a 304 while nothing has changed. Archived games
+    are read from the archive, marked `"archived": true`.
+    """
+    table = await tables.get(game_id)
+    if not table:
+        table = await archive.fetch(game_id)
+        if table is None:
+            return JSONResponse({"error": "Game not found"})
+        return Response(game_body(table, archived=True), media_type="application/json")
+
+    with table.lock:
+        etag = f'"{table.epoch}-{table.version}"'
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers={"ETag": etag})
+        body = table.cached("get-game", game_body)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def encode_cursor(created_at: datetime, game_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), game_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, game_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), game_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get('/show-active-games/')
-def get_all_games(db: Session = Depends(get_db)) -> Dict[str, list]:
-    """Retrieve all active games"""
-    
-    games = db.query(GameDB).all()
-    return {"games": [{"game_id": g.id} for g in games]}
+async def get_all_games(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None,
+                        state: Optional[str] = None, min_players: Optional[int] = None, max_players: Optional[int] = None,
+                        created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+                        db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Lists games newest first, one page at a time.
+
+    Filters use indexed columns and pages are keyset-paginated on (created_at, id), so each page
+    costs the same however many games exist. Summaries come from the database as of the last
+    write-behind flush. Pass `next_cursor` from a response as `cursor` to get the following page.
+    """
+    filters = []
+    if state is not None:
+        filters.append(GameDB.game_state == state)
+    if min_players is not None:
+        filters.append(GameDB.player_count >= min_players)
+    if max_players is not None:
+        filters.append(GameDB.player_count <= max_players)
+    if created_after is not None:
+        filters.append(GameDB.created_at >= created_after)
+    if created_before is not None:
+        filters.append(GameDB.created_at < created_before)
+    if cursor is not None:
+        after_created, after_id = decode_cursor(cursor)
+        filters.append(or_(GameDB.created_at < after_created,
+                           and_(GameDB.created_at == after_created, GameDB.id < after_id)))
+
+    # The page is picked from the index first; only its games are joined to their players
+    page = (select(GameDB.id, GameDB.game_state, GameDB.pot, GameDB.created_at)
+            .filter(*filters).order_by(GameDB.created_at.desc(), GameDB.id.desc()).limit(limit + 1).subquery())
+    rows = (await db.execute(
+        select(page, func.count(PlayerDB.id), func.coalesce(func.sum(PlayerDB.stack), 0))
+        .outerjoin(PlayerDB, PlayerDB.game_id == page.c.id)
+        .group_by(page.c.id, page.c.game_state, page.c.pot, page.c.created_at)
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    )).all()
+
+    games = [{"game_id": game_id, "state": game_state, "players": players, "pot": pot or 0, "stacks": stacks,
+              "created_at": created_at.isoformat() if created_at else None}
+             for game_id, game_state, pot, created_at, players, stacks in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return {"games": games, "next_cursor": next_cursor}
 
 @router.delete("/end-session/{game_id}")
-def end_game_session(game_id: str, db: Session = Depends(get_db)) -> Dict[str, str]:
+async def end_game_session(game_id: str, db: AsyncSession = Depends(get_async_db), tables: TableEngine = Depends(get_tables)) -> Dict[str, str]:
     """Deletes a game and all associated players"""
     
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
+    game = (await db.execute(select(GameDB).filter(GameDB.id == game_id))).scalars().first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    db.query(PlayerDB).filter(PlayerDB.game_id == game_id).delete()
-    db.delete(game)  # ✅ Delete game directly
-    db.commit()
+    tables.discard(game_id)  # Drop pending in-memory changes before the rows go
 
-    return {"message": f"Game {game_id} and all associated players have been deleted"}
+    await db.execute(delete(PlayerDB).filter(PlayerDB.game_id == game_id))
+    await db.delete(game)  # ✅ Delete game directly
+    await db.commit()
 
-@router.put("/check/")
-def check(request: CheckRequest, db: Session = Depends(get_db)):
-    """Player checks (takes no action, does not bet)"""
-
-    player = db.query(PlayerDB).filter(
-        PlayerDB.id == request.player_id, PlayerDB.game_id == request.game_id
-    ).first()
-    game = db.query(GameDB).filter(GameDB.id == request.game_id).first()
+    return {"message": f"Game {game_id} and all associated players have been deleted"}
 
-    if not player or not game:
-        raise HTTPException(status_code=404, detail="Player or Game not found")
-    
-    if not player.active:
-        raise HTTPException(status_code=400, detail="Player has already folded")
+@router.get("/hands/export")
+async def export_hands(since: Optional[datetime] = None, until: Optional[datetime] = None, game_id: Optional[str] = None,
+                       tables: TableEngine = Depends(get_tables)) -> StreamingResponse:
+    """Streams finished hands, oldest first, in the chunked columnar format of backend/history.py"""
+    await tables.flush()  # Include hands finished since the last flush
+    return StreamingResponse(export_chunks(since=since, until=until, game_id=game_id),
+                             media_type="application/octet-stream",
+                             headers={"Content-Disposition": 'attachment; filename="hands.phh"'})
+
+@router.get("/players/{name}/stats")
+async def get_player_stats(name: str, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """VPIP, PFR, aggression factor and win rate of a player, per position and overall, across all games"""
+    stats = await player_stats(db, name)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return stats
+
+@router.post("/tournaments/")
+async def create_tournament(data: TournamentInput, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Creates every table of a multi-table event with bulk inserts in a single transaction"""
+    if data.table_size not in positions:
+        raise HTTPException(status_code=400, detail=f"Tables must have {min(positions)} to {max(positions)} seats")
+    if len(data.players) < min(positions):
+        raise HTTPException(status_code=400, detail="Invalid number of players for a game.")
 
-    # 🚀 Ensure a check is only possible when there is NO active bet
-    if game.current_bet > 0 and player.bet_amount < game.current_bet:
-        raise HTTPException(status_code=400, detail="Cannot check. You must call or raise.")
+    draw = list(data.players.items())
+    random.Random(data.seed).shuffle(draw)
+    seating = seat_draw(draw, data.table_size)
+
+    tournament_id = str(uuid.uuid4())
+    created_at = datetime.utcnow()
+    game_rows, player_rows = [], []
+    for n, players in enumerate(seating):
+        game_id = f"{tournament_id}.{n}"  # Keeps the event's tables together on one worker
+        game_rows.append({"id": game_id, "tournament_id": tournament_id, "game_state": "pre-flop",
+                          "player_count": len(players), "created_at": created_at, "shot_clock": data.shot_clock})
+        player_rows += [{"name": name, "stack": stack, "active": True, "bet_amount": 0, "game_id": game_id, "seat": seat}
+                        for seat, (name, stack) in enumerate(players)]
+
+    db.add(TournamentDB(id=tournament_id, name=data.name, table_size=data.table_size, created_at=created_at))
+    await db.flush()
+    await db.execute(insert(GameDB), game_rows)
+    await db.execute(insert(PlayerDB), player_rows)
+    await db.commit()
+    return {"tournament_id": tournament_id, "tables": [{"game_id": g["id"], "players": g["player_count"]} for g in game_rows]}
+
+@router.post("/tournaments/{tournament_id}/rebalance")
+async def rebalance_tournament(tournament_id: str, db: AsyncSession = Depends(get_async_db),
+                               tables: TableEngine = Depends(get_tables)) -> dict:
+    """Removes busted players, closes surplus tables and evens out the rest between hands"""
+    tournament = await db.get(TournamentDB, tournament_id)
+    if not tournament:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    game_ids = (await db.execute(select(GameDB.id).filter(GameDB.tournament_id == tournament_id))).scalars().all()
+    await db.close()  # Release the connection; the rebalance opens its own transaction
+
+    try:
+        return await tables.rebalance(list(game_ids), tournament.table_size)
+    except ActionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.post("/games/{game_id}/players")
+async def join_game(game_id: str, request: JoinRequest, tables: TableEngine = Depends(get_tables)):
+    """Seats a new player between hands"""
+    try:
+        return await tables.join(game_id, request.name, request.stack)
+    except ActionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.delete("/games/{game_id}/players/{player_id}")
+async def leave_game(game_id: str, player_id: int, tables: TableEngine = Depends(get_tables)):
+    """Removes a player between hands"""
+    try:
+        return await tables.leave(game_id, player_id)
+    except ActionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    return {"message": f"Player {request.player_id} checked"}
+@router.put("/check/")
+async def check(request: CheckRequest, tables: TableEngine = Depends(get_tables),
+                key: Optional[tuple] = Depends(idempotency_key)):
+    """Player checks (takes no action, does not bet)"""
+    return await run_action(tables, request.game_id, "check", request.player_id, key=key)
 
 @router.put("/bet/")
-def place_bet(request: BetRequest, db: Session = Depends(get_db)):
+async def place_bet(request: BetRequest, tables: TableEngine = Depends(get_tables),
+                    key: Optional[tuple] = Depends(idempotency_key)):
     """Player places a bet, reducing their stack and adding to the pot"""
-
-    player = db.query(PlayerDB).filter(
-        PlayerDB.id == request.player_id, PlayerDB.game_id == request.game_id
-    ).first()
-    game = db.query(GameDB).filter(GameDB.id == request.game_id).first()
-
-    if not player or not game:
-        raise HTTPException(status_code=404, detail="Player or Game not found")
-
-    if player.stack < request.amount:
-        raise HTTPException(status_code=400, detail="Insufficient stack")
-
-    if request.amount < game.current_bet + game.raise_size:
-        raise HTTPException(status_code=400, detail=f"Bet must be at least {game.current_bet + game.raise_size}")
-
-    # Deduct stack and update pot
-    player.stack -= request.amount
-    game.pot += request.amount
-    game.current_bet = max(request.amount, game.current_bet)
-
-    # Update player's bet for the round
-    player.bet_amount = request.amount
-
-    db.commit()
-    return {"message": f"Player {request.player_id} bet {request.amount}. Remaining stack: {player.stack}, Pot: {game.pot}"}
+    return await run_action(tables, request.game_id, "bet", request.player_id, request.amount, key=key)
 
 @router.put("/raise/")
-def place_raise(game_id: str, player_id: int, raise_amount: int, db: Session = Depends(get_db)):
+async def place_raise(game_id: str, player_id: int, raise_amount: int, tables: TableEngine = Depends(get_tables),
+                      key: Optional[tuple] = Depends(idempotency_key)):
     """Player raises the bet, increasing the pot and setting a new highest bet"""
-
-    player = db.query(PlayerDB).filter(PlayerDB.id == player_id, PlayerDB.game_id == game_id).first()
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
-
-    if not player or not game:
-        raise HTTPException(status_code=404, detail="Player or Game not found")
-
-    # Ensure `raise_size` exists in GameDB
-    if not hasattr(game, "raise_size"):
-        raise HTTPException(status_code=500, detail="raise_size is not defined in GameDB")
-
-    if player.stack < raise_amount:
-        raise HTTPException(status_code=400, detail="Insufficient stack to raise")
-
-    if raise_amount < game.current_bet + game.raise_size:
-        raise HTTPException(status_code=400, detail=f"Raise must be at least {game.current_bet + game.raise_size}")
-
-    # Deduct stack and update pot
-    difference = raise_amount - player.bet_amount  # Only deduct the additional amount
-    player.stack -= difference
-    game.pot += difference
-
-    # Update game bet information
-    game.raise_size = raise_amount - game.current_bet  # Update the raise size
-    game.current_bet = raise_amount  # Update the highest bet
-
-    # Update player's bet amount
-    player.bet_amount = raise_amount
-
-    db.commit()
-    return {"message": f"Player {player_id} raised to {raise_amount}. Remaining stack: {player.stack}, Pot: {game.pot}"}
+    return await run_action(tables, game_id, "raise", player_id, raise_amount, key=key)
 
 @router.put("/fold/")
-def fold(game_id: str, player_id: int, db: Session = Depends(get_db)):
+async def fold(game_id: str, player_id: int, tables: TableEngine = Depends(get_tables),
+               key: Optional[tuple] = Depends(idempotency_key)):
     """Player folds and is removed from the round"""
-    
-    player = db.query(PlayerDB).filter(PlayerDB.id == player_id, PlayerDB.game_id == game_id).first()
-    if not player:
-        raise HTTPException(status_code=404, detail="Player not found")
-
-    if not player.active:
-        raise HTTPException(status_code=400, detail="Player has already folded")
-
-    player.active = False  # Mark player as folded
-    db.commit()
-    return {"message": f"Player {player_id} has folded"}
+    return await run_action(tables, game_id, "fold", player_id, key=key)
 
 @router.put("/call/")
-def call_bet(game_id: str, player_id: int, db: Session = Depends(get_db)):
+async def call_bet(game_id: str, player_id: int, tables: TableEngine = Depends(get_tables),
+                   key: Optional[tuple] = Depends(idempotency_key)):
     """Player calls the current bet amount"""
-
-    player = db.query(PlayerDB).filter(PlayerDB.id == player_id, PlayerDB.game_id == game_id).first()
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
-
-    if not player or not game:
-        raise HTTPException(status_code=404, detail="Player or Game not found")
-
-    call_amount = game.current_bet - player.bet_amount
-
-    if player.stack < call_amount:
-        call_amount = player.stack  # Player goes all-in
-
-    player.stack -= call_amount
-    game.pot += call_amount
-    player.bet_amount = game.current_bet
-
-    db.commit()
-    return {"message": f"Player {player_id} called with {call_amount}. Remaining stack: {player.stack}, Pot: {game.pot}"}
+    return await run_action(tables, game_id, "call", player_id, key=key)
 
 @router.put("/all-in/")
-def all_in(game_id: str, player_id: int, db: Session = Depends(get_db)):
+async def all_in(game_id: str, player_id: int, tables: TableEngine = Depends(get_tables),
+                 key: Optional[tuple] = Depends(idempotency_key)):
     """Player goes all-in, betting their entire stack"""
-
-    player = db.query(PlayerDB).filter(PlayerDB.id == player_id, PlayerDB.game_id == game_id).first()
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
-
-    if not player or not game:
-        raise HTTPException(status_code=404, detail="Player or Game not found")
-    
-    if player.bet_amount == player.stack:
-        raise HTTPException(status_code=400, detail="Player is already all-in")
-
-    all_in_amount = player.stack
-
-    # Deduct stack and update pot
-    game.pot += all_in_amount
-    player.stack = 0
-    player.bet_amount += all_in_amount
-
-    # Update current bet if this is the highest
-    if all_in_amount > game.current_bet:
-        game.current_bet = all_in_amount
-
-    db.commit()
-    return {"message": f"Player {player_id} went all-in with {all_in_amount}. Pot: {game.pot}"}
+    return await run_action(tables, game_id, "all-in", player_id, key=key)
 
 @router.put("/next-round/")
-def next_round(game_id: str, db: Session = Depends(get_db)):
+async def next_round(game_id: str, tables: TableEngine = Depends(get_tables),
+                     key: Optional[tuple] = Depends(idempotency_key)):
     """Moves to the next betting round and resets player bet amounts"""
-
-    game = db.query(GameDB).filter(GameDB.id == game_id).first()
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    # Reset player bet amounts for the next round
-    players = db.query(PlayerDB).filter(PlayerDB.game_id == game_id).all()
-    for player in players:
-        player.bet_amount = 0
-
-    game.current_bet = 0  # Reset the current bet
-    game.raise_size = 0
-
-    db.commit()
-    return {"message": "Next betting round has started"}
+    return await run_action(tables, game_id, "next-round", key=key)
 
 @router.put("/next_stage/")
-def next_stage(request:NextStageRequest, db: Session = Depends(get_db)):
+async def next_stage(request:NextStageRequest, tables: TableEngine = Depends(get_tables),
+                     key: Optional[tuple] = Depends(idempotency_key)):
     """Moves the game to the next stage (Flop, Turn, River, Showdown)"""
-
-    game = db.query(GameDB).filter(GameDB.id == request.game_id).first()
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    if game.game_state == "showdown":
-        raise HTTPException(status_code=400, detail="Game is already at showdown")
-    
-    new_state = get_next_state(game.game_state)
-
-    if new_state == "error":
-        raise HTTPException(status_code=400, detail="Invalid game state")
-
-    game.game_state = new_state
-    db.commit()
-
-    return {"message": f"Game moved to {new_state}", "new_state": new_state}
+    return await run_action(tables, request.game_id, "next-stage", key=key)
 
 @router.put("/next_hand/")
-def next_hand(request:NextHandRequest, db: Session = Depends(get_db)):
-    """Updates player positions for the next hand"""
-
-    # Fetch game and players
-    game = db.query(GameDB).filter(GameDB.id == request.game_id).first()
-    if not game:
+async def next_hand(request:NextHandRequest, tables: TableEngine = Depends(get_tables),
+                    key: Optional[tuple] = Depends(idempotency_key)):
+    """Updates player positions for the next hand and persists the finished hand"""
+    return await run_action(tables, request.game_id, "next-hand", key=key)
+
+
+@router.put("/cards/")
+async def set_cards(request: CardsRequest, tables: TableEngine = Depends(get_tables),
+                    key: Optional[tuple] = Depends(idempotency_key)):
+    """Records a player's hole cards, or the community cards when no player is given"""
+    action = "hole-cards" if request.player_id is not None else "board"
+    return await run_action(tables, request.game_id, action, request.player_id, card_mask(request.cards), key=key)
+
+@router.get("/equity/{game_id}")
+async def game_equity(game_id: str, precision: float = 0.005, confidence: float = 0.95, seed: Optional[int] = None,
+                      tables: TableEngine = Depends(get_tables)):
+    """Win/tie equity of every player still in the hand, from their hole cards and the board"""
+    table = await tables.get(game_id)
+    if not table:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    players = db.query(PlayerDB).filter(PlayerDB.game_id == request.game_id).all()
-    if not players:
-        raise HTTPException(status_code=400, detail="No players found in game")
-
-    # Convert players into dictionary `{player_id: position}` for `update_positions()`
-    player_positions = {p.id: p.position for p in players}
-
-    # Get updated positions
-    updated_positions = update_positions(player_positions)
-
-    # Handle errors from `logic.py`
-    if "error" in updated_positions:
-        raise HTTPException(status_code=400, detail=updated_positions["error"])
-
-    # Update player positions in the database
-    for player in players:
-        player.position = updated_positions[player.id]
-    
-    game.game_stage = "pre-flop"
-    game.pot = 0
-    game.current_bet = 0
-    for player in players:
-        player.bet_amount = 0
+    with table.lock:
+        contenders = [(p.id, p.cards) for p in table.players.values() if p.active]
+        board = table.board
+    missing = [player_id for player_id, cards in contenders if len(cards) != 2]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Hole cards missing for player {missing[0]}")
+
+    try:
+        result = await run_in_threadpool(calculate_equity, [cards for _, cards in contenders], board,
+                                         precision, confidence, seed=seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for entry, (player_id, _) in zip(result["players"], contenders):
+        entry["player_id"] = player_id
+    return {"game_id": game_id, "board": format_cards(board), **result}
+
+def require_preflop_table(table: Optional[PreflopTable] = Depends(get_preflop_table)) -> PreflopTable:
+    if table is None:
+        raise HTTPException(status_code=503, detail="Preflop tables not built; run python -m backend.ranges build")
+    return table
+
+@router.get("/preflop/ranges")
+async def preflop_range(players: int, position: str, stack: float = Query(100.0, gt=0),
+                        table: PreflopTable = Depends(require_preflop_table)) -> dict:
+    """Starting hands worth going all in with from a position at a stack depth (in big blinds), from the precomputed table"""
+    if players not in positions:
+        raise HTTPException(status_code=400, detail="Invalid number of players for a game.")
+    if position not in positions[players]:
+        raise HTTPException(status_code=400, detail=f"Unknown position for {players} players: {position}")
+    return opening_range(table, players, position, stack)
+
+@router.get("/preflop/hands/{hand}")
+async def preflop_hand(hand: str, opponents: Optional[int] = Query(None, ge=1, le=MAX_OPPONENTS),
+                       table: PreflopTable = Depends(require_preflop_table)) -> dict:
+    """Precomputed equity of a starting hand ("AKs", "T9o", "QQ" or two cards like "AsKd") against random hands"""
+    try:
+        name = parse_hand(hand)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    counts = [opponents] if opponents else range(1, MAX_OPPONENTS + 1)
+    return {"hand": name, "combos": COMBOS[CLASS_INDEX[name]],
+            "equity": {str(n): round(table.hand(name, n), 4) for n in counts}}
+
+@router.post("/games/actions:batch")
+async def apply_multi_batch(request: MultiBatchRequest, tables: TableEngine = Depends(get_tables),
+                            cluster: Cluster = Depends(get_cluster),
+                            x_forwarded_worker: Optional[str] = Header(None),
+                            key: Optional[tuple] = Depends(idempotency_key)):
+    """Applies ordered action batches to several games with a single commit (one per owning worker)"""
+    async def apply_local(games: List[GameBatch]) -> list:
+        batches = [(g.game_id, [action_tuple(a) for a in g.actions]) for g in games]
+        return await tables.apply_batches(batches, request.atomic)
+
+    async def work() -> dict:
+        if cluster.enabled and x_forwarded_worker is None:
+            return {"games": await cluster.apply_batches(request.games, request.atomic, apply_local)}
+        return {"games": await apply_local(request.games)}
+
+    return await once(key, f"batch:{request.model_dump_json()}", work)
+
+@router.post("/games/{game_id}/actions:batch")
+async def apply_batch(game_id: str, request: BatchRequest, tables: TableEngine = Depends(get_tables),
+                      key: Optional[tuple] = Depends(idempotency_key)):
+    """Validates and applies an ordered list of actions to one game with a single commit"""
+    async def work() -> dict:
+        return await tables.apply_batch(game_id, [action_tuple(a) for a in request.actions], request.atomic)
+
+    return await once(key, f"batch:{game_id}:{request.model_dump_json()}", work)
+
+@router.get("/games/{game_id}/view")
+async def game_view(game_id: str, tables: TableEngine = Depends(get_tables)) -> dict:
+    """The client-visible state live updates start from"""
+    table = await tables.get(game_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    with table.lock:
+        return table.view()
+
+async def initial_update(game_id: str, tables: TableEngine, broadcaster: Broadcaster, cluster: Cluster) -> Optional[dict]:
+    """Full client-visible state sent once to a new subscriber; deltas follow. None if the game doesn't exist.
+
+    Subscribers may connect to any worker: for a game owned by another one the state is fetched
+    from the owner, and its deltas arrive through the cluster broker.
+    """
+    if not cluster.owns(game_id):
+        view = await cluster.view(game_id)
+    else:
+        table = await tables.get(game_id)
+        if table is None:
+            return None
+        with table.lock:
+            view = table.view()
+    return None if view is None else {"game_id": game_id, "version": broadcaster.version(game_id), **view}
+
+@router.get("/db-pool/")
+async def db_pool() -> dict:
+    """Connection pool usage of the async database engine"""
+    return pool_stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Request and database metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.websocket("/ws/games/{game_id}")
+async def game_updates(websocket: WebSocket, game_id: str, tables: TableEngine = Depends(get_tables),
+                       broadcaster: Broadcaster = Depends(get_broadcaster), cluster: Cluster = Depends(get_cluster)):
+    """Pushes the game state, then a delta of the changed fields after every action"""
+    subscription = broadcaster.subscribe(game_id)
+    first = await initial_update(game_id, tables, broadcaster, cluster)
+    if first is None:
+        broadcaster.unsubscribe(subscription)
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    try:
+        await websocket.send_json(first)
+        while True:
+            # Idle connections get a keep-alive so dead clients are noticed and dropped
+            delta = await subscription.next(KEEPALIVE_INTERVAL) or {"keepalive": True}
+            await asyncio.wait_for(websocket.send_json(delta), SEND_TIMEOUT)  # Drop clients that stall
+            if delta.get("ended"):
+                await websocket.close()
+                break
+    except (WebSocketDisconnect, asyncio.TimeoutError, RuntimeError):
+        pass
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+@router.get("/games/{game_id}/events")
+async def game_events(game_id: str, tables: TableEngine = Depends(get_tables),
+                      broadcaster: Broadcaster = Depends(get_broadcaster), cluster: Cluster = Depends(get_cluster)):
+    """Server-sent-event version of the game update stream"""
+    subscription = broadcaster.subscribe(game_id)
+    first = await initial_update(game_id, tables, broadcaster, cluster)
+    if first is None:
+        broadcaster.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail="Game not found")
 
-    db.commit()
-    
-    return {"message": "Positions updated for next hand", "new_positions": updated_positions}
\ No newline at end of file
+    async def stream():
+        try:
+            yield f"data: {json.dumps(first)}\n\n"
+            while True:
+                delta = await subscription.next(KEEPALIVE_INTERVAL)
+                if delta is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(delta)}\n\n"
+                if delta.get("ended"):
+                    break
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
\ No newline at end of file
@@ -0,0 +1,362 @@
+"""Headless hand simulation for evaluating bots.
+
+Plays hands straight on `TableState` with the betting rules from `backend.tables` and the
+positions from `backend.logic`: no HTTP, no ORM, no action log. Each seat is driven by a
+strategy callback; stacks are reset every hand so results are chips won or lost per hand.
+
+Hands are played in fixed-size chunks, each with its own RNG seeded from `(seed, chunk)`, so a
+run gives the same results whatever the number of worker processes:
+
+    python -m backend.simulation --hands 100000 --players 6 --strategies check_call,aggressive \\
+        --workers 4 --seed 1 --out results.npz
+
+Results are one row per player per hand, written column by column (`.npz`, or `.parquet` when
+pyarrow is installed).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.evaluator import np
+from backend.logic import POSITION_INDEX, seat_positions
+from backend.tables import (ActionError, PlayerState, TableState, all_in, call, check, fold, next_hand, next_round,
+                            next_stage, raise_bet, showdown)
+
+try:
+    import pyarrow as pa # type: ignore
+    import pyarrow.parquet as pq # type: ignore
+except ImportError:  # Results are written as .npz instead
+    pa = pq = None
+
+CHUNK_HANDS = 1000  # Hands per RNG stream and per unit of work sent to a worker
+STACK = 1000
+SMALL_BLIND = 5
+BIG_BLIND = 10
+
+# Result columns and their array typecodes, one row per player per hand
+COLUMNS = {
+    "hand": "q",      # Hand number, 0-based across the whole run
+    "seat": "b",
+    "position": "b",  # Index into logic.positions[players]
+    "delta": "q",     # Chips won (positive) or lost this hand
+    "pot": "q",       # Total chips in the middle at the end of the hand
+    "street": "b",    # Last betting round reached: 0 pre-flop .. 3 river
+    "showdown": "b",  # 1 if the player was still in when the pots were settled with cards
+}
+
+
+class Decision:
+    """What a strategy sees when it is its turn to act."""
+
+    __slots__ = ("seat", "position", "street", "hole", "board", "stack", "bet", "to_call", "current_bet",
+                 "min_raise", "pot", "players_in")
+
+    def __init__(self, seat: int, position: str, street: str, hole: tuple, board: tuple, stack: int, bet: int,
+                 to_call: int, current_bet: int, min_raise: int, pot: int, players_in: int):
+        self.seat = seat
+        self.position = position
+        self.street = street
+        self.hole = hole  # Card ints (see backend/evaluator.py)
+        self.board = board
+        self.stack = stack
+        self.bet = bet  # Chips already put in this betting round
+        self.to_call = to_call
+        self.current_bet = current_bet
+        self.min_raise = min_raise  # Smallest legal total to raise to
+        self.pot = pot
+        self.players_in = players_in
+
+
+# A strategy returns `(action, amount)`: "fold", "check", "call", "all-in", or "raise" with the
+# total to raise to. Strategies must be importable top-level callables to run in worker processes.
+Strategy = Callable[[Decision, random.Random], Tuple[str, int]]
+
+
+def check_call(decision: Decision, rng: random.Random) -> Tuple[str, int]:
+    """Never folds, never raises."""
+    return ("call", 0) if decision.to_call else ("check", 0)
+
+
+def aggressive(decision: Decision, rng: random.Random) -> Tuple[str, int]:
+    """Raises the minimum a third of the time when it can afford to, otherwise calls or checks."""
+    if rng.random() < 1 / 3 and decision.stack >= decision.min_raise:
+        return "raise", decision.min_raise
+    return check_call(decision, rng)
+
+
+def random_play(decision: Decision, rng: random.Random) -> Tuple[str, int]:
+    """Folds to a bet 30% of the time and otherwise picks uniformly among calling, raising and shoving."""
+    if decision.to_call and rng.random() < 0.3:
+        return "fold", 0
+    choice = rng.randrange(3)
+    if choice == 1 and decision.stack >= decision.min_raise:
+        return "raise", decision.min_raise + rng.randrange(decision.min_raise + 1)
+    if choice == 2:
+        return "all-in", 0
+    return check_call(decision, rng)
+
+
+STRATEGIES: Dict[str, Strategy] = {"check_call": check_call, "aggressive": aggressive, "random": random_play}
+
+
+def _act(table: TableState, player: PlayerState, action: str, amount: int) -> bool:
+    """Applies a strategy's choice through the betting rules. Returns False if the rules rejected it."""
+    try:
+        if action == "fold":
+            fold(table, player.id)
+        elif action == "check":
+            check(table, player.id)
+        elif action == "call":
+            call(table, player.id)
+        elif action == "raise":
+            raise_bet(table, player.id, amount)
+        elif action == "all-in":
+            all_in(table, player.id)
+        else:
+            return False
+    except ActionError:
+        return False
+    return True
+
+
+def _betting_round(table: TableState, order: List[PlayerState], labels: Dict[int, str], strategies: Sequence[Strategy],
+                   rng: random.Random, big_blind: int) -> int:
+    """Asks players for actions in `order` until every bet is matched or only one player is left.
+
+    A rejected action counts as a check when there is nothing to call and as a fold otherwise.
+
+    Returns:
+        int: The number of rejected actions.
+    """
+    rejected = 0
+    queue = [p for p in order if p.active and p.stack > 0]
+    while queue:
+        player = queue.pop(0)
+        if not player.active or player.stack == 0:
+            continue
+        contenders = [p for p in order if p.active]
+        if len(contenders) == 1:
+            break
+        to_call = max(table.current_bet - player.bet_amount, 0)
+        if not to_call and all(p.stack == 0 for p in contenders if p is not player):
+            continue  # Nobody left to bet against
+
+        decision = Decision(player.seat, labels[player.id], table.game_state, player.cards, table.board, player.stack,
+                            player.bet_amount, to_call, table.current_bet,
+                            table.current_bet + max(table.raise_size, big_blind), table.pot, len(contenders))
+        action, amount = strategies[player.seat](decision, rng)
+        before = table.current_bet
+        if not _act(table, player, action, amount):
+            rejected += 1
+            if to_call:
+                fold(table, player.id)
+        if table.current_bet > before:
+            # A raise reopens the action for everyone behind the raiser
+            i = order.index(player)
+            queue = [p for p in order[i + 1:] + order[:i] if p.active and p.stack > 0]
+    return rejected
+
+
+def _post_blind(table: TableState, player: PlayerState, blind: int) -> None:
+    chips = min(blind, player.stack)
+    table.contribute(player, chips)
+    player.bet_amount = chips
+
+
+def play_hand(table: TableState, strategies: Sequence[Strategy], rng: random.Random, stack: int = STACK,
+              small_blind: int = SMALL_BLIND, big_blind: int = BIG_BLIND) -> dict:
+    """Deals and plays one hand at `table`, then moves the button.
+
+    Every player starts the hand with `stack`; strategies are indexed by seat.
+
+    Returns:
+        dict: `deltas` (`{player_id: chips won}`), `positions` (`{player_id: label}`), `pot`,
+        `street` (index of the last betting round), `showdown` (player ids settled with cards) and `rejected`.
+    """
+    players = list(table.players.values())
+    n = len(players)
+    for player in players:
+        player.stack = stack
+
+    # Dealt straight from a shuffled deck, so the hole-card and board rules have nothing to check
+    deck = list(range(52))
+    rng.shuffle(deck)
+    for i, player in enumerate(players):
+        player.cards = (deck[2 * i], deck[2 * i + 1])
+    runout = tuple(deck[2 * n:2 * n + 5])
+
+    labels = dict(zip((p.id for p in players), seat_positions(n, table.button)))
+    index = POSITION_INDEX[n]
+    by_position = sorted(players, key=lambda p: index[labels[p.id]])
+    preflop = by_position[2 % n:] + by_position[:2 % n]  # UTG first; heads-up the button/small blind
+    postflop = by_position if n > 2 else by_position[1:] + by_position[:1]  # Small blind first; heads-up the big blind
+
+    _post_blind(table, by_position[0], small_blind)
+    _post_blind(table, by_position[1], big_blind)
+    table.current_bet = max(p.bet_amount for p in by_position[:2])
+    table.raise_size = big_blind
+
+    rejected = 0
+    street = 0
+    for street, cards in enumerate((0, 3, 4, 5)):
+        if street:
+            next_stage(table)
+            next_round(table)
+            table.board = runout[:cards]
+        rejected += _betting_round(table, preflop if street == 0 else postflop, labels, strategies, rng, big_blind)
+        if len(table.contenders()) == 1:
+            break
+
+    pot = table.pot
+    contenders = table.contenders()
+    if table.game_state == "river" and len(contenders) > 1:
+        next_stage(table)  # Showdown settles the pots
+        shown = contenders
+    else:
+        showdown(table)
+        shown = []
+
+    result = {"deltas": {p.id: p.stack - stack for p in players}, "positions": labels, "pot": pot, "street": street,
+              "showdown": shown, "rejected": rejected}
+    next_hand(table)
+    return result
+
+
+def new_table(players: int, button: int = 0) -> TableState:
+    """A table of `players` seated in seats 0 .. players - 1 (player id = seat)."""
+    if players not in POSITION_INDEX:
+        raise ValueError(f"Tables seat {min(POSITION_INDEX)} to {max(POSITION_INDEX)} players")
+    seated = {seat: PlayerState(seat, f"Seat {seat}", STACK, True, 0, seat) for seat in range(players)}
+    return TableState("simulation", players=seated, button=button)
+
+
+def run_chunk(seed: int, chunk: int, hands: int, strategies: Sequence[Strategy], stack: int = STACK,
+              small_blind: int = SMALL_BLIND, big_blind: int = BIG_BLIND, chunk_hands: int = CHUNK_HANDS) -> tuple:
+    """Plays `hands` hands, the `chunk`-th run of `chunk_hands`, with an RNG seeded from `(seed, chunk)`.
+
+    Returns:
+        tuple: The result columns (`{name: array}`) and the number of rejected actions.
+    """
+    rng = random.Random(f"{seed}:{chunk}")
+    first = chunk * chunk_hands
+    table = new_table(len(strategies), button=first)
+    columns = {name: array(code) for name, code in COLUMNS.items()}
+    rejected = 0
+
+    for hand in range(first, first + hands):
+        result = play_hand(table, strategies, rng, stack, small_blind, big_blind)
+        rejected += result["rejected"]
+        index = POSITION_INDEX[len(strategies)]
+        for player_id, delta in result["deltas"].items():
+            columns["hand"].append(hand)
+            columns["seat"].append(player_id)
+            columns["position"].append(index[result["positions"][player_id]])
+            columns["delta"].append(delta)
+            columns["pot"].append(result["pot"])
+            columns["street"].append(result["street"])
+            columns["showdown"].append(player_id in result["showdown"])
+    return columns, rejected
+
+
+def simulate(hands: int, strategies: Sequence[Strategy], seed: int = 0, workers: int = 1, stack: int = STACK,
+             small_blind: int = SMALL_BLIND, big_blind: int = BIG_BLIND, chunk_hands: int = CHUNK_HANDS) -> dict:
+    """Plays `hands` hands with one strategy per seat.
+
+    Args:
+        hands (int): Number of hands to play.
+        strategies (list): One strategy per seat (2-8 seats).
+        seed (int): Results depend only on the seed and the chunk size, not on `workers`.
+        workers (int): Worker processes; 1 plays every hand in this process.
+        stack (int): Chips every player starts each hand with.
+        small_blind (int): Small blind.
+        big_blind (int): Big blind; also the smallest bet and raise increment offered to strategies.
+        chunk_hands (int): Hands per RNG stream and per unit of work.
+
+    Returns:
+        dict: `columns` (see `COLUMNS`; NumPy arrays when NumPy is installed), `seats` (per seat
+        `strategy`, `net` chips and `bb_per_100`), `rejected` actions, `elapsed_s` and `hands_per_hour`.
+    """
+    if len(strategies) not in POSITION_INDEX:
+        raise ValueError(f"Tables seat {min(POSITION_INDEX)} to {max(POSITION_INDEX)} players")
+    chunks = [(seed, i, min(chunk_hands, hands - i * chunk_hands), strategies, stack, small_blind, big_blind, chunk_hands)
+              for i in range((hands + chunk_hands - 1) // chunk_hands)]
+
+    start = time.perf_counter()
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            parts = list(pool.map(run_chunk, *zip(*chunks)))
+    else:
+        parts = [run_chunk(*args) for args in chunks]
+    elapsed = time.perf_counter() - start
+
+    columns = {name: array(code) for name, code in COLUMNS.items()}
+    for part, _ in parts:
+        for name, values in part.items():
+            columns[name].extend(values)
+    if np is not None:
+        columns = {name: np.frombuffer(values, dtype=values.typecode) if len(values) else np.array([], values.typecode)
+                   for name, values in columns.items()}
+
+    net = [0] * len(strategies)
+    for seat, delta in zip(columns["seat"], columns["delta"]):
+        net[seat] += int(delta)
+    return {
+        "columns": columns,
+        "seats": [{"seat": seat, "strategy": getattr(strategy, "__name__", repr(strategy)), "net": net[seat],
+                   "bb_per_100": round(net[seat] / big_blind / hands * 100, 2) if hands else 0.0}
+                  for seat, strategy in enumerate(strategies)],
+        "rejected": sum(rejected for _, rejected in parts),
+        "elapsed_s": round(elapsed, 3),
+        "hands_per_hour": round(hands / elapsed * 3600) if elapsed else None,
+    }
+
+
+def write_columns(path: str, columns: Dict[str, Sequence]) -> None:
+    """Writes result columns to `path`: Parquet for a `.parquet` path (needs pyarrow), otherwise a NumPy `.npz`."""
+    if path.endswith(".parquet"):
+        if pq is None:
+            raise RuntimeError("Writing Parquet needs pyarrow")
+        pq.write_table(pa.table({name: list(values) if np is None else values for name, values in columns.items()}), path)
+    elif np is not None:
+        np.savez_compressed(path, **{name: np.asarray(values) for name, values in columns.items()})
+    else:
+        raise RuntimeError("Writing .npz needs NumPy")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hands", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=6, help="seats at the table (2-8)")
+    parser.add_argument("--strategies", default="check_call",
+                        help=f"comma-separated, cycled over the seats ({', '.join(STRATEGIES)})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--stack", type=int, default=STACK)
+    parser.add_argument("--blinds", default=f"{SMALL_BLIND}/{BIG_BLIND}", help="small/big")
+    parser.add_argument("--out", help="write the per-hand results to this .npz or .parquet file")
+    args = parser.parse_args(argv)
+
+    names = args.strategies.split(",")
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown strategies: {', '.join(unknown)}")
+    small_blind, big_blind = (int(x) for x in args.blinds.split("/"))
+    strategies = [STRATEGIES[names[seat % len(names)]] for seat in range(args.players)]
+
+    result = simulate(args.hands, strategies, args.seed, args.workers, args.stack, small_blind, big_blind)
+    if args.out:
+        write_columns(args.out, result["columns"])
+    print(json.dumps({k: v for k, v in result.items() if k != "columns"}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Per-player statistics by position, maintained incrementally as hands are written.
+
+`player_stats` holds one row of running counts per player name and position. Every flush that
+writes finished hands adds their counts in the same transaction (`record()`), so reading a
+player's stats is a primary-key lookup of at most one row per position, however many hands
+they have played.
+
+    VPIP               hands with a voluntary bet, raise, call or all-in before the flop
+    PFR                hands with a bet, raise or all-in before the flop
+    aggression factor  (bets + raises + all-ins) / calls
+    win rate           net chips won per hand
+
+    python -m backend.stats --rebuild   # recompute from the stored hand history
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import and_, bindparam, delete, insert, select, update # type: ignore
+from backend.database import AsyncSessionLocal
+from backend.models import PlayerStatsDB
+
+COUNTERS = ("hands", "vpip", "pfr", "aggressive", "calls", "folds", "won", "net")
+VOLUNTARY = {"bet", "raise", "call", "all-in"}
+AGGRESSIVE = {"bet", "raise", "all-in"}
+
+
+def hand_stats(actions: Iterable[list], players: Iterable[dict]) -> Dict[tuple, dict]:
+    """Counts for one finished hand, keyed by `(name, position)`.
+
+    Args:
+        actions (list): The hand's `[action, player_id, amount]` entries in order.
+        players (list): One dict per player with `player_id`, `name`, `position`, `stack_start` and `stack_end`.
+    """
+    counts = {}
+    for p in players:
+        net = p["stack_end"] - p["stack_start"]
+        counts[p["player_id"]] = {"key": (p["name"], p["position"] or ""), "hands": 1, "vpip": 0, "pfr": 0,
+                                  "aggressive": 0, "calls": 0, "folds": 0, "won": int(net > 0), "net": net}
+
+    street = 0
+    for action, player_id, _ in actions:
+        if action == "next-stage":
+            street += 1
+            continue
+        player = counts.get(player_id)
+        if player is None:
+            continue
+        if street == 0 and action in VOLUNTARY:
+            player["vpip"] = 1
+            if action in AGGRESSIVE:
+                player["pfr"] = 1
+        if action in AGGRESSIVE:
+            player["aggressive"] += 1
+        elif action == "call":
+            player["calls"] += 1
+        elif action == "fold":
+            player["folds"] += 1
+    return {c.pop("key"): c for c in counts.values()}
+
+
+def combine(hands: Iterable[tuple], totals: Optional[Dict[tuple, dict]] = None) -> Dict[tuple, dict]:
+    """Sums `hand_stats()` over `(actions, players)` pairs, adding to `totals` if given."""
+    totals = {} if totals is None else totals
+    for actions, players in hands:
+        for key, counts in hand_stats(actions, players).items():
+            total = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            for name in COUNTERS:
+                total[name] += counts[name]
+    return totals
+
+
+async def record(db, hands: Iterable[tuple]) -> int:
+    """Adds the counts of finished hands to `player_stats` within the caller's transaction.
+
+    Existing rows are incremented in place (one executemany), so concurrent writers never
+    overwrite each other's counts; rows seen for the first time are inserted.
+
+    Returns:
+        int: The number of `(name, position)` rows touched.
+    """
+    totals = combine(hands)
+    if not totals:
+        return 0
+    names = {name for name, _ in totals}
+    query = select(PlayerStatsDB.name, PlayerStatsDB.position).filter(PlayerStatsDB.name.in_(names))
+    existing = set((await db.execute(query)).all())
+
+    increments = [{"b_name": name, "b_position": position, **{f"d_{k}": v for k, v in counts.items()}}
+                  for (name, position), counts in totals.items() if (name, position) in existing]
+    if increments:
+        table = PlayerStatsDB.__table__
+        statement = (update(table)
+                     .where(and_(table.c.name == bindparam("b_name"), table.c.position == bindparam("b_position")))
+                     .values({k: table.c[k] + bindparam(f"d_{k}") for k in COUNTERS}))
+        await db.execute(statement, increments)
+    new = [{"name": name, "position": position, **counts}
+           for (name, position), counts in totals.items() if (name, position) not in existing]
+    if new:
+        await db.execute(insert(PlayerStatsDB), new)
+    return len(totals)
+
+
+def _rates(counts: dict) -> dict:
+    hands = counts["hands"]
+    return {
+        "hands": hands,
+        "vpip": round(counts["vpip"] / hands, 4) if hands else None,
+        "pfr": round(counts["pfr"] / hands, 4) if hands else None,
+        "aggression_factor": round(counts["aggressive"] / counts["calls"], 4) if counts["calls"] else None,
+        "win_rate": round(counts["net"] / hands, 2) if hands else None,
+        "hands_won": counts["won"],
+        "net": counts["net"],
+    }
+
+
+async def player_stats(db, name: str) -> Optional[dict]:
+    """A player's stats per position and overall, or None if they have no finished hands."""
+    rows = (await db.execute(select(PlayerStatsDB).filter(PlayerStatsDB.name == name))).scalars().all()
+    if not rows:
+        return None
+    overall = dict.fromkeys(COUNTERS, 0)
+    positions = {}
+    for row in rows:
+        counts = {k: getattr(row, k) or 0 for k in COUNTERS}
+        for k in COUNTERS:
+            overall[k] += counts[k]
+        positions[row.position or "unknown"] = _rates(counts)
+    return {"name": name, "overall": _rates(overall), "positions": positions}
+
+
+async def rebuild(session_factory=AsyncSessionLocal) -> int:
+    """Recomputes `player_stats` from the stored hand history. Returns the number of hands counted."""
+    from backend.history import hand_pages, unpack_actions
+
+    totals: Dict[tuple, dict] = {}
+    counted = 0
+    async for hands, players in hand_pages(session_factory):
+        page = [(unpack_actions(h.actions), [{"player_id": p.player_id, "name": p.name, "position": p.position,
+                                              "stack_start": p.stack_start, "stack_end": p.stack_end}
+                                             for p in players.get(h.id, [])]) for h in hands]
+        combine(page, totals)
+        counted += len(hands)
+
+    async with session_factory() as db:
+        await db.execute(delete(PlayerStatsDB))
+        if totals:
+            await db.execute(insert(PlayerStatsDB), [{"name": name, "position": position, **counts}
+                                                     for (name, position), counts in totals.items()])
+        await db.commit()
+    return counted
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rebuild", action="store_true", help="recompute every player's stats from hand history")
+    parser.add_argument("name", nargs="?", help="print this player's stats")
+    args = parser.parse_args(argv)
+
+    async def run():
+        if args.rebuild:
+            print(f"Counted {await rebuild()} hands")
+        if args.name:
+            async with AsyncSessionLocal() as db:
+                print(json.dumps(await player_stats(db, args.name), indent=2))
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1338 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy import bindparam, delete, insert, select, update # type: ignore
+from sqlalchemy.orm import joinedload # type: ignore
+from backend.action_log import ActionLog, ActionRecord
+from backend.database import AsyncSessionLocal
+from backend.models import GameDB, HandDB, HandPlayerDB, PlayerDB
+from backend.logic import DEALER_INDEX, MAX_SEATS, POSITION_INDEX, get_next_state, seat_positions
+from backend.evaluator import best_hands, format_cards, hand_name, mask_to_cards, parse_cards
+from backend.history import hand_rows
+from backend.pots import PotLedger
+from backend.stats import record as record_stats
+from backend.tournaments import plan_rebalance
+from backend.turns import (BETTING_ACTIONS, ShotClock, acted_from_mask, acted_mask, advance, check_turn,
+                           start_street)
+
+FLUSH_INTERVAL = 1.0  # Seconds between write-behind flushes
+SNAPSHOT_EVERY = 10000  # Logged actions between snapshots
+MAX_CAS_RETRIES = 3  # Times one flush redoes a table's actions after another writer changed its row
+
+logger = logging.getLogger(__name__)
+
+
+class ActionError(Exception):
+    """Raised when an action breaks the betting rules. Routes turn it into an HTTP error."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PlayerState:
+    __slots__ = ("id", "name", "stack", "active", "bet_amount", "seat", "cards", "contributed")
+
+    def __init__(self, id: int, name: str, stack: int, active: bool, bet_amount: int, seat: int,
+                 cards: tuple = (), contributed: int = 0):
+        self.id = id
+        self.name = name
+        self.stack = stack
+        self.active = active
+        self.bet_amount = bet_amount
+        self.seat = seat  # 0 .. MAX_SEATS - 1; position labels come from TableState.positions()
+        self.cards = cards  # Hole cards as card ints (see backend/evaluator.py)
+        self.contributed = contributed  # Chips put into the pots this hand
+
+
+def _seats(players: list) -> Dict[int, int]:
+    """Seat of each `(player_id, seat, position)`. Rows saved before seats existed get the seat their position label implies."""
+    if all(seat is not None for _, seat, _ in players):
+        return {player_id: seat for player_id, seat, _ in players}
+    index = POSITION_INDEX.get(len(players), {})
+    if sorted(index.get(position, -1) for _, _, position in players) == list(range(len(players))):
+        return {player_id: index[position] for player_id, _, position in players}
+    return {player_id: i for i, (player_id, _, _) in enumerate(sorted(players))}
+
+
+def next_dealer(seats: list, dealer: int) -> int:
+    """The seat the button passes to from seat `dealer`: the nearest occupied one below it, wrapping around."""
+    return max((s for s in seats if s < dealer), default=seats[-1])
+
+
+class TableState:
+    """Live state of one game. `players` maps player_id to `PlayerState` in seat order.
+
+    `button` counts the hands played and `dealer` is the seat on the button. Position labels
+    follow the occupied seats in order from the dealer, looked up from the precomputed rotation
+    for the table size, so a player joining or leaving between hands moves nobody's button: it
+    stays on its seat, or passes to the seat next in line for it if the dealer left. Each hand
+    the button passes to that seat too. Tables saved before the seat was kept (`dealer` None)
+    place it from the hand count, as they always have.
+
+    `seq` is the sequence number of the last action-log record applied to this table. `pots`
+    splits the chips in the middle into main and side pots; `pot` is their total. When no ledger
+    is given it is rebuilt from each player's `contributed`, and any part of `pot` not covered by
+    contributions (tables saved before pots were tracked) goes into the main pot.
+
+    `version` goes up whenever the engine changes the table; together with `epoch` (unique per
+    loaded copy) it identifies one state, which is what response caches and ETags key on.
+
+    `hand` tracks the hand in progress for the history (starting stacks, chips put in, actions)
+    and `history` holds finished hands until the next flush writes them; see `play()`.
+
+    `log_id` names the action log that `seq` counts in: the log of the engine that last wrote the
+    row (None if none has), which is the only log whose records may be replayed onto it.
+
+    `row_version` is the `GameDB.version` this copy is based on and `pending` the actions applied
+    since, which is what a flush needs to write the row with compare-and-swap and, if another
+    writer got there first, to redo the actions on top of the newer row.
+
+    `to_act` is the player whose turn it is (None between betting rounds) and `acted` who has
+    acted since the last bet; see `backend/turns.py`. Games with a `shot_clock` (seconds, 0 for
+    no time limit) only accept betting actions in turn, and `turn_deadline` is when the player
+    to act will be checked or folded automatically.
+    """
+
+    __slots__ = ("id", "pots", "current_bet", "raise_size", "game_state", "players", "board", "button", "seq", "lock",
+                 "version", "epoch", "cache", "frozen", "hand", "history", "row_version", "pending", "to_act", "acted",
+                 "shot_clock", "turn_deadline", "log_id", "dealer")
+
+    def __init__(self, id: str, pot: int = 0, current_bet: int = 0, raise_size: int = 0,
+                 game_state: str = "pre-flop", players: Optional[Dict[int, PlayerState]] = None,
+                 board: tuple = (), button: int = 0, seq: int = 0, hand: Optional[dict] = None,
+                 history: Optional[list] = None, row_version: int = 0, pending: Optional[list] = None,
+                 to_act: Optional[int] = None, acted: Optional[set] = None, shot_clock: Optional[float] = None,
+                 turn_deadline: Optional[float] = None, log_id: Optional[str] = None, dealer: Optional[int] = None):
+        self.id = id
+        self.current_bet = current_bet
+        self.raise_size = raise_size
+        self.game_state = game_state
+        self.players = players if players is not None else {}
+        self.board = board  # Community cards as card ints
+        self.button = button
+        self.dealer = dealer
+        self.seq = seq
+        self.log_id = log_id
+        self.lock = threading.RLock()
+        self.pots = self._rebuild_pots(pot)
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:12]
+        self.cache: Dict[str, tuple] = {}
+        self.frozen = False  # Set while players are being moved to or from this table
+        self.hand = hand
+        self.history = history if history is not None else []
+        self.row_version = row_version
+        self.pending = pending if pending is not None else []
+        self.to_act = to_act
+        self.acted = acted if acted is not None else set()
+        self.shot_clock = shot_clock
+        self.turn_deadline = turn_deadline
+
+    def changed(self) -> None:
+        """Marks the state as new, invalidating anything cached for it. Call with the lock held."""
+        self.version += 1
+
+    def cached(self, key: str, build: Callable[["TableState"], object]):
+        """`build(self)`, reused until the table next changes. Call with the lock held."""
+        hit = self.cache.get(key)
+        if hit is not None and hit[0] == self.version:
+            return hit[1]
+        value = build(self)
+        self.cache[key] = (self.version, value)
+        return value
+
+    @property
+    def pot(self) -> int:
+        return self.pots.total
+
+    def _rebuild_pots(self, pot: int = 0) -> PotLedger:
+        totals = {p.id: p.contributed for p in self.players.values() if p.contributed}
+        all_in = [p.id for p in self.players.values() if p.contributed and p.stack == 0]
+        return PotLedger.rebuild(totals, all_in, dead=pot - sum(totals.values()))
+
+    def contribute(self, player: PlayerState, chips: int) -> None:
+        """Moves chips from a player's stack into the pots."""
+        player.stack -= chips
+        player.contributed += chips
+        self.pots.add(player.id, chips, all_in=player.stack == 0)
+
+    def positions(self) -> Dict[int, Optional[str]]:
+        """Position label of every player, from seat order and the dealer's seat."""
+        seats = [p.seat for p in self.players.values()]
+        if len(seats) not in DEALER_INDEX:
+            return dict.fromkeys(self.players)
+        labels = seat_positions(len(seats), DEALER_INDEX[len(seats)] - seats.index(self.dealer_seat()))
+        return dict(zip(self.players, labels))
+
+    def dealer_seat(self) -> Optional[int]:
+        """The seat on the button (None at an empty table)."""
+        seats = [p.seat for p in self.players.values()]
+        if not seats or self.dealer in seats:
+            return self.dealer if seats else None
+        if self.dealer is None:
+            # Placed from the hand count, as before the seat was kept
+            return seats[(DEALER_INDEX.get(len(seats), len(seats) - 1) - self.button) % len(seats)]
+        return next_dealer(seats, self.dealer)
+
+    def seat_players(self, players: Iterable[PlayerState]) -> None:
+        """Replaces who is at the table, keeping `players` in seat order and the button on its seat."""
+        dealer = self.dealer_seat()
+        self.players = {p.id: p for p in sorted(players, key=lambda p: p.seat)}
+        self.dealer = dealer
+        self.dealer = self.dealer_seat()  # Passed on if the dealer's seat emptied
+
+    def contenders(self) -> list:
+        """Ids of the players still in the hand, in seating order."""
+        return [p.id for p in self.players.values() if p.active]
+
+    @classmethod
+    def from_rows(cls, game: GameDB, players: list) -> "TableState":
+        seats = _seats([(p.id, p.seat, p.position) for p in players])
+        table = cls(
+            id=game.id,
+            pot=game.pot or 0,
+            current_bet=game.current_bet or 0,
+            raise_size=game.raise_size or 0,
+            game_state=game.game_state or "pre-flop",
+            players={
+                p.id: PlayerState(p.id, p.name, p.stack or 0, bool(p.active), p.bet_amount or 0, seats[p.id],
+                                  tuple(parse_cards(p.hole_cards or "")), p.contributed or 0)
+                for p in sorted(players, key=lambda p: seats[p.id])
+            },
+            board=tuple(parse_cards(game.community_cards or "")),
+            button=game.button or 0,
+            dealer=game.dealer_seat,
+            seq=game.log_seq or 0,
+            log_id=game.log_id,
+            row_version=game.version or 0,
+            to_act=game.to_act,
+            shot_clock=game.shot_clock,
+        )
+        if game.acted is None:
+            start_street(table)  # Never written by the engine: a new game, or one from before turns were tracked
+        else:
+            table.acted = acted_from_mask(table.players.values(), game.acted)
+            if table.to_act is not None and table.shot_clock:
+                table.turn_deadline = round(time.time() + table.shot_clock, 3)  # The clock restarts on load
+        return table
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TableState":
+        seats = _seats([(p["id"], p.get("seat"), p.get("position")) for p in data["players"]])
+        return cls(
+            id=data["id"],
+            pot=data["pot"],
+            current_bet=data["current_bet"],
+            raise_size=data["raise_size"],
+            game_state=data["game_state"],
+            players={p["id"]: PlayerState(p["id"], p["name"], p["stack"], p["active"], p["bet_amount"], seats[p["id"]],
+                                          tuple(parse_cards(p.get("hole_cards", ""))), p.get("contributed", 0))
+                     for p in sorted(data["players"], key=lambda p: seats[p["id"]])},
+            board=tuple(parse_cards(data.get("community_cards", ""))),
+            button=data.get("button", 0),
+            dealer=data.get("dealer_seat"),
+            seq=data["seq"],
+            hand=_hand_from_dict(data.get("hand")),
+            history=data.get("history", []),
+            row_version=data.get("row_version", 0),
+            pending=[tuple(a) for a in data.get("pending", [])],
+            to_act=data.get("to_act"),
+            acted={p["id"] for p in data["players"] if data.get("acted", 0) >> seats[p["id"]] & 1},
+            shot_clock=data.get("shot_clock"),
+            turn_deadline=data.get("turn_deadline"),
+        )
+
+    def restore(self, data: dict) -> None:
+        """Resets this table in place to a state captured by `to_dict()`."""
+        saved = TableState.from_dict(data)
+        for name in ("pots", "current_bet", "raise_size", "game_state", "players", "board", "button", "dealer", "seq",
+                     "hand", "history", "pending", "to_act", "acted", "turn_deadline"):
+            setattr(self, name, getattr(saved, name))
+
+    def to_dict(self) -> dict:
+        hand = self.hand and {"start": dict(self.hand["start"]), "put_in": dict(self.hand["put_in"]),
+                              "actions": list(self.hand["actions"])}
+        return {**self.game_row(), "seq": self.seq,
+                "players": [{**row, "name": self.players[row["id"]].name} for row in self.player_rows()],
+                "hand": hand, "history": list(self.history), "row_version": self.row_version,
+                "pending": list(self.pending), "turn_deadline": self.turn_deadline}
+
+    def view(self) -> dict:
+        """The client-visible fields, in the shape used for push deltas."""
+        positions = self.positions()
+        return {
+            "pot": self.pot,
+            "pots": self.pots.summary(self.contenders()),
+            "current_bet": self.current_bet,
+            "game_state": self.game_state,
+            "board": format_cards(self.board),
+            "to_act": self.to_act,
+            "turn_deadline": self.turn_deadline,
+            "players": {p.id: {"stack": p.stack, "active": p.active, "position": positions[p.id]} for p in self.players.values()},
+        }
+
+    def game_row(self) -> dict:
+        return {"id": self.id, "pot": self.pot, "current_bet": self.current_bet,
+                "raise_size": self.raise_size, "game_state": self.game_state,
+                "community_cards": format_cards(self.board), "button": self.button, "dealer_seat": self.dealer_seat(),
+                "player_count": len(self.players), "log_seq": self.seq, "to_act": self.to_act,
+                "acted": acted_mask(self), "shot_clock": self.shot_clock}
+
+    def player_rows(self) -> list:
+        return [{"id": p.id, "stack": p.stack, "active": p.active, "bet_amount": p.bet_amount, "seat": p.seat,
+                 "hole_cards": format_cards(p.cards), "contributed": p.contributed}
+                for p in self.players.values()]
+
+
+def _hand_from_dict(hand: Optional[dict]) -> Optional[dict]:
+    # JSON snapshots turn the player id keys into strings
+    if hand is None:
+        return None
+    return {"start": {int(k): v for k, v in hand["start"].items()},
+            "put_in": {int(k): v for k, v in hand["put_in"].items()}, "actions": list(hand["actions"])}
+
+
+def diff_views(before: dict, after: dict) -> dict:
+    """Returns only the fields of `after` that differ from `before` (players are compared field by field)."""
+    delta = {k: v for k, v in after.items() if k != "players" and before.get(k) != v}
+    players = {}
+    for player_id, fields in after["players"].items():
+        old = before["players"].get(player_id, {})
+        changed = {k: v for k, v in fields.items() if old.get(k) != v}
+        if changed:
+            players[player_id] = changed
+    for player_id in before["players"].keys() - after["players"].keys():
+        players[player_id] = {"left": True}
+    if players:
+        delta["players"] = players
+    return delta
+
+
+# Betting rules. Each action validates first and only then mutates, so a rejected
+# action leaves the table untouched.
+
+def _player(table: TableState, player_id: int, detail: str = "Player or Game not found") -> PlayerState:
+    player = table.players.get(player_id)
+    if player is None:
+        raise ActionError(404, detail)
+    return player
+
+
+def check(table: TableState, player_id: int, amount: Optional[int] = None) -> dict:
+    """Player checks (takes no action, does not bet)"""
+    player = _player(table, player_id)
+
+    if not player.active:
+        raise ActionError(400, "Player has already folded")
+
+    # Ensure a check is only possible when there is NO active bet
+    if table.current_bet > 0 and player.bet_amount < table.current_bet:
+        raise ActionError(400, "Cannot check. You must call or raise.")
+
+    return {"message": f"Player {player_id} checked"}
+
+
+def bet(table: TableState, player_id: int, amount: int) -> dict:
+    """Player places a bet, reducing their stack and adding to the pot"""
+    player = _player(table, player_id)
+
+    if player.stack < amount:
+        raise ActionError(400, "Insufficient stack")
+
+    if amount < table.current_bet + table.raise_size:
+        raise ActionError(400, f"Bet must be at least {table.current_bet + table.raise_size}")
+
+    table.contribute(player, amount)
+    table.current_bet = max(amount, table.current_bet)
+    player.bet_amount = amount
+
+    return {"message": f"Player {player_id} bet {amount}. Remaining stack: {player.stack}, Pot: {table.pot}"}
+
+
+def raise_bet(table: TableState, player_id: int, amount: int) -> dict:
+    """Player raises the bet, increasing the pot and setting a new highest bet"""
+    player = _player(table, player_id)
+
+    if player.stack < amount:
+        raise ActionError(400, "Insufficient stack to raise")
+
+    if amount < table.current_bet + table.raise_size:
+        raise ActionError(400, f"Raise must be at least {table.current_bet + table.raise_size}")
+
+    # Only deduct the additional amount
+    difference = amount - player.bet_amount
+    table.contribute(player, difference)
+
+    table.raise_size = amount - table.current_bet
+    table.current_bet = amount
+    player.bet_amount = amount
+
+    return {"message": f"Player {player_id} raised to {amount}. Remaining stack: {player.stack}, Pot: {table.pot}"}
+
+
+def fold(table: TableState, player_id: int, amount: Optional[int] = None) -> dict:
+    """Player folds and is removed from the round"""
+    player = _player(table, player_id, "Player not found")
+
+    if not player.active:
+        raise ActionError(400, "Player has already folded")
+
+    player.active = False
+    return {"message": f"Player {player_id} has folded"}
+
+
+def call(table: TableState, player_id: int, amount: Optional[int] = None) -> dict:
+    """Player calls the current bet amount"""
+    player = _player(table, player_id)
+
+    call_amount = max(table.current_bet - player.bet_amount, 0)
+    if player.stack < call_amount:
+        call_amount = player.stack  # Player goes all-in
+
+    table.contribute(player, call_amount)
+    player.bet_amount = table.current_bet
+
+    return {"message": f"Player {player_id} called with {call_amount}. Remaining stack: {player.stack}, Pot: {table.pot}"}
+
+
+def all_in(table: TableState, player_id: int, amount: Optional[int] = None) -> dict:
+    """Player goes all-in, betting their entire stack"""
+    player = _player(table, player_id)
+
+    if player.bet_amount == player.stack:
+        raise ActionError(400, "Player is already all-in")
+
+    all_in_amount = player.stack
+    table.contribute(player, all_in_amount)
+    player.bet_amount += all_in_amount
+
+    if player.bet_amount > table.current_bet:
+        table.current_bet = player.bet_amount
+
+    return {"message": f"Player {player_id} went all-in with {all_in_amount}. Pot: {table.pot}"}
+
+
+def next_round(table: TableState, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+    """Moves to the next betting round and resets player bet amounts"""
+    for player in table.players.values():
+        player.bet_amount = 0
+    table.current_bet = 0
+    table.raise_size = 0
+    return {"message": "Next betting round has started"}
+
+
+def next_stage(table: TableState, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+    """Moves the game to the next stage (Flop, Turn, River, Showdown)"""
+    if table.game_state == "showdown":
+        raise ActionError(400, "Game is already at showdown")
+
+    new_state = get_next_state(table.game_state)
+    if new_state == "error":
+        raise ActionError(400, "Invalid game state")
+
+    table.game_state = new_state
+    if new_state == "showdown":
+        return {"message": f"Game moved to {new_state}", "new_state": new_state, "winners": showdown(table)}
+    return {"message": f"Game moved to {new_state}", "new_state": new_state}
+
+
+def showdown(table: TableState) -> list:
+    """Settles the main pot and every side pot among the best hands eligible for it.
+
+    A lone remaining player wins without cards. Otherwise every contender needs hole cards and
+    the full board; if any are missing the pots are left alone. Odd chips go to the first winners
+    in seating order.
+
+    Returns:
+        list: `{"player_id", "amount", "hand"}` for each player who won chips (empty if nothing was awarded).
+    """
+    contenders = [p for p in table.players.values() if p.active]
+    if not contenders or table.pot == 0:
+        return []
+
+    scores = {}
+    if len(contenders) > 1:
+        if len(table.board) != 5 or any(len(p.cards) != 2 for p in contenders):
+            return []
+        scores = best_hands({p.id: p.cards for p in contenders}, table.board)
+
+    awards = []
+    for player_id, amount in table.pots.settle([p.id for p in contenders], scores).items():
+        table.players[player_id].stack += amount
+        awards.append({"player_id": player_id, "amount": amount,
+                       "hand": hand_name(scores[player_id]) if player_id in scores else None})
+    _clear_pots(table)
+    return awards
+
+
+def _clear_pots(table: TableState) -> None:
+    for player in table.players.values():
+        player.contributed = 0
+    table.pots = PotLedger()
+
+
+def _cards_in_play(table: TableState, except_player: Optional[int] = None) -> set:
+    cards = set(table.board)
+    for player in table.players.values():
+        if player.id != except_player:
+            cards.update(player.cards)
+    return cards
+
+
+def hole_cards(table: TableState, player_id: int, amount: int) -> dict:
+    """Records a player's two hole cards. `amount` is the cards as a bitmask (bit n = card n)."""
+    player = _player(table, player_id)
+    cards = mask_to_cards(amount or 0)
+    if len(cards) != 2:
+        raise ActionError(400, "Hole cards must be exactly 2 cards")
+    if _cards_in_play(table, player_id).intersection(cards):
+        raise ActionError(400, "Card already in play")
+
+    player.cards = tuple(cards)
+    return {"message": f"Player {player_id} was dealt {format_cards(cards)}"}
+
+
+def board(table: TableState, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+    """Replaces the community cards. `amount` is the cards as a bitmask (bit n = card n)."""
+    cards = mask_to_cards(amount or 0)
+    if len(cards) > 5:
+        raise ActionError(400, "Board can have at most 5 cards")
+    if _cards_in_play(table).difference(table.board).intersection(cards):
+        raise ActionError(400, "Card already in play")
+
+    table.board = tuple(cards)
+    return {"message": f"Board is {format_cards(cards)}"}
+
+
+def next_hand(table: TableState, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+    """Moves the button for the next hand and clears the finished one"""
+    if not table.players:
+        raise ActionError(400, "No players found in game")
+    if seat_positions(len(table.players), 0) is None:
+        raise ActionError(400, "Invalid number of players")
+
+    table.dealer = next_dealer([p.seat for p in table.players.values()], table.dealer_seat())
+    table.button += 1
+    for player in table.players.values():
+        player.active = True  # Players who folded are dealt back in
+        player.bet_amount = 0
+        player.cards = ()
+
+    _clear_pots(table)
+    table.board = ()
+    table.game_state = "pre-flop"
+    table.current_bet = 0
+
+    return {"message": "Positions updated for next hand", "new_positions": table.positions()}
+
+
+def _check_not_frozen(table: TableState) -> None:
+    if table.frozen:
+        raise ActionError(409, "Table is being rebalanced")
+
+
+def _between_hands(table: TableState) -> None:
+    _check_not_frozen(table)
+    if (table.game_state != "pre-flop" or table.pot or table.current_bet or table.board
+            or any(p.cards for p in table.players.values())):
+        raise ActionError(400, "Players can only join or leave between hands")
+
+
+def free_seat(table: TableState) -> int:
+    """The lowest empty seat for a new player.
+
+    Raises:
+        ActionError: If the table is full or a hand is in progress.
+    """
+    _between_hands(table)
+    taken = {p.seat for p in table.players.values()}
+    seat = next((s for s in range(MAX_SEATS) if s not in taken), None)
+    if seat is None or len(table.players) >= MAX_SEATS:
+        raise ActionError(400, "Table is full")
+    return seat
+
+
+def join(table: TableState, player: PlayerState) -> dict:
+    """Seats a new player between hands. Positions for everyone follow from the new seat order."""
+    if player.seat != free_seat(table):
+        raise ActionError(409, "Seat is no longer free")
+    table.seat_players([*table.players.values(), player])
+    start_street(table)
+    return {"message": f"Player {player.id} joined in seat {player.seat}", "positions": table.positions()}
+
+
+def leave(table: TableState, player_id: int) -> dict:
+    """Removes a player between hands."""
+    _player(table, player_id, "Player not found")
+    _between_hands(table)
+    if len(table.players) <= min(POSITION_INDEX):
+        raise ActionError(400, f"A game needs at least {min(POSITION_INDEX)} players")
+    table.seat_players(p for p in table.players.values() if p.id != player_id)
+    start_street(table)
+    return {"message": f"Player {player_id} left the table", "positions": table.positions()}
+
+
+ACTIONS = {
+    "check": check,
+    "bet": bet,
+    "raise": raise_bet,
+    "call": call,
+    "fold": fold,
+    "all-in": all_in,
+    "next-round": next_round,
+    "next-stage": next_stage,
+    "next-hand": next_hand,
+    "hole-cards": hole_cards,
+    "board": board,
+}
+
+# Detail returned when the game itself is missing (matches the per-route wording)
+MISSING_GAME = {
+    "fold": "Player not found",
+    "next-round": "Game not found",
+    "next-stage": "Game not found",
+    "next-hand": "Game not found",
+    "board": "Game not found",
+}
+
+
+def _finished_hand(table: TableState) -> Optional[dict]:
+    hand = table.hand
+    if hand is None:
+        return None
+    positions = table.positions()
+    return {
+        "id": str(uuid.uuid4()), "game_id": table.id, "hand_no": table.button, "ended_at": time.time(),
+        "board": format_cards(table.board), "pot": sum(hand["put_in"].values()), "actions": hand["actions"],
+        "players": [{"player_id": p.id, "name": p.name, "seat": p.seat, "position": positions[p.id],
+                     "stack_start": hand["start"].get(p.id, p.stack), "stack_end": p.stack,
+                     "put_in": hand["put_in"].get(p.id, 0), "hole_cards": format_cards(p.cards)}
+                    for p in table.players.values()],
+    }
+
+
+def play(table: TableState, action: str, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+    """Applies one action from `ACTIONS` and records it in the hand history.
+
+    The first change of a hand notes everyone's stack; `next-hand` closes the hand and queues
+    it in `table.history` for the next flush. Every change is also added to `table.pending`.
+    Betting actions pass the turn on, and at tables with a shot clock they must come in turn.
+    """
+    handler = ACTIONS[action]
+    betting = action in BETTING_ACTIONS
+    if betting and table.shot_clock is not None:
+        try:
+            check_turn(table, player_id)
+        except ValueError as e:
+            raise ActionError(409, str(e))
+    if action == "next-hand":
+        finished = _finished_hand(table)
+        result = handler(table, player_id, amount)
+        if finished is not None:
+            table.history.append(finished)
+        table.hand = None
+        table.pending.append((action, player_id, amount))
+        start_street(table)
+        return result
+
+    if table.hand is None:
+        table.hand = {"start": {p.id: p.stack for p in table.players.values()}, "put_in": {}, "actions": []}
+    current_bet = table.current_bet
+    result = handler(table, player_id, amount)
+    if betting:
+        advance(table, player_id, table.current_bet > current_bet)
+    elif action in ("next-round", "next-stage"):
+        start_street(table)
+    table.pending.append((action, player_id, amount))
+    table.hand["actions"].append([action, player_id, amount])
+    for player in table.players.values():
+        if player.contributed:  # Showdown clears `contributed`, so keep the last amount seen
+            table.hand["put_in"][player.id] = player.contributed
+    return result
+
+
+def replay(tables: Dict[str, TableState], records: Iterable[ActionRecord]) -> int:
+    """Applies logged actions straight to table state, skipping records a table already contains.
+
+    This is the bulk path for rebuilding state: no HTTP, no ORM, one dict lookup per record.
+    Records for games that are not in `tables` (e.g. deleted games) are ignored.
+
+    Returns:
+        int: The number of records applied.
+    """
+    applied = 0
+    for record in records:
+        table = tables.get(record.game_id)
+        if table is None or record.seq <= table.seq:
+            continue
+        try:
+            play(table, record.action, record.player_id, record.amount)
+        except ActionError:
+            pass  # Logged actions succeeded once; only a stale base can reject them
+        table.seq = record.seq
+        applied += 1
+    return applied
+
+
+_GAMES = GameDB.__table__
+# Writes a game row only if it still has the version this copy was based on
+_CAS = update(_GAMES).where(_GAMES.c.id == bindparam("b_id"), _GAMES.c.version == bindparam("b_version"))
+
+
+async def _compare_and_swap(db, rows: list) -> set:
+    """Runs `_CAS` for every row. Returns the ids of the games that had moved on.
+
+    One executemany when the driver reports its total row count and nothing conflicted;
+    otherwise the statements are rolled back and rerun one by one to find the losers.
+    """
+    if not rows:
+        return set()
+    if (await db.connection()).dialect.supports_sane_multi_rowcount:
+        if (await db.execute(_CAS, rows)).rowcount == len(rows):
+            return set()
+        await db.rollback()
+    return {row["b_id"] for row in rows if (await db.execute(_CAS, row)).rowcount != 1}
+
+
+def _wants(listener, game_id: str) -> bool:
+    wants = getattr(listener, "wants", None)
+    return wants is None or wants(game_id)
+
+
+class TableEngine:
+    """Keeps every live game in memory and writes changes back to the database behind the request path.
+
+    The engine is authoritative: routes read and validate against `TableState` only. Changed
+    tables are collected in a dirty set and written in one transaction by `flush()`, which runs
+    on a background task, at hand boundaries, and on shutdown. All database access goes through
+    the async session factory, so nothing here blocks the event loop.
+
+    Callables in `listeners` are called with `(game_id, delta)` after every change, where the
+    delta holds only the client-visible fields that changed (see `TableState.view()`). A listener
+    with a `wants(game_id)` method is only called for the games it wants, and no delta is worked
+    out for a game that no listener wants.
+    Coroutine functions in `before_flush` are awaited before a flush writes anything, for state
+    that must reach the database no later than the tables (e.g. idempotency keys).
+
+    With an `ActionLog`, every applied action is also appended to the log and made durable before
+    the route returns, so changes not yet flushed survive a crash: `recover()` rebuilds the tables
+    from the database (or a newer snapshot) and replays the log tail.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, flush_interval: float = FLUSH_INTERVAL,
+                 log: Optional[ActionLog] = None):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.log = log
+        self.listeners = []
+        self.before_flush = []
+        self._tables: Dict[str, TableState] = {}
+        self._dirty = set()
+        self._hands = []  # Finished hands of tables that were discarded before their flush
+        self.cas_conflicts = 0  # Game rows found changed by another writer at flush time
+        self.dropped_actions = 0  # Pending actions the newer state rejected when redone
+        self.clock = ShotClock(self._expire_turns)
+        self.timeouts = 0  # Turns the shot clock played for the player
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def load_all(self) -> int:
+        """Rebuilds every table from the database. Returns the number of tables loaded."""
+        async with self.session_factory() as db:
+            players_by_game: Dict[str, list] = {}
+            for p in (await db.execute(select(PlayerDB))).scalars():
+                players_by_game.setdefault(p.game_id, []).append(p)
+            games = (await db.execute(select(GameDB))).scalars()
+            tables = {g.id: TableState.from_rows(g, players_by_game.get(g.id, [])) for g in games}
+
+        with self._lock:
+            self._tables = tables
+            self._dirty.clear()
+        for table in tables.values():
+            self.clock.set(table.id, table.turn_deadline)
+        return len(tables)
+
+    async def get(self, game_id: str) -> Optional[TableState]:
+        """Returns the live table, loading it from the database on first access."""
+        table = self._tables.get(game_id)
+        if table is not None:
+            return table
+
+        async with self._load_lock:
+            table = self._tables.get(game_id)
+            if table is None:
+                table = await self._load(game_id)
+                if table is not None:
+                    with self._lock:
+                        self._tables[game_id] = table
+                    self.clock.set(game_id, table.turn_deadline)
+        return table
+
+    async def _load(self, game_id: str) -> Optional[TableState]:
+        async with self.session_factory() as db:
+            # One round trip: the game joined to its players
+            query = select(GameDB).options(joinedload(GameDB.players)).filter(GameDB.id == game_id)
+            game = (await db.execute(query)).unique().scalars().first()
+            if not game:
+                return None
+            return TableState.from_rows(game, game.players)
+
+    def discard(self, game_id: str) -> None:
+        """Forgets a table without writing its pending changes (used when the game is deleted).
+
+        Finished hands are kept: history outlives the game and goes out with the next flush.
+        Subscribers are told the game ended, also when the table was no longer in memory (e.g.
+        released before the game was archived).
+        """
+        with self._lock:
+            table = self._tables.pop(game_id, None)
+            self._dirty.discard(game_id)
+            if table is not None:
+                self._hands.extend(table.history)
+        self.clock.set(game_id, None)
+        self._notify(game_id, {"ended": True})
+
+    def game_ids(self) -> list:
+        """Ids of the tables held in memory."""
+        with self._lock:
+            return list(self._tables)
+
+    async def release(self, game_ids: Iterable[str]) -> list:
+        """Writes tables back and forgets them, for when another worker takes the games over.
+
+        A table that changed again after the flush (so still has unwritten actions) is kept
+        for the next call. Subscribers are not told anything: the game goes on elsewhere.
+
+        Returns:
+            list: The ids of the tables released.
+        """
+        await self.flush()
+        released = []
+        for game_id in game_ids:
+            table = self._tables.get(game_id)
+            if table is None:
+                continue
+            with table.lock:
+                if table.pending or table.history:
+                    continue
+                with self._lock:
+                    self._tables.pop(game_id, None)
+                    self._dirty.discard(game_id)
+            self.clock.set(game_id, None)
+            released.append(game_id)
+        return released
+
+    def _watched(self, game_id: str) -> bool:
+        return any(_wants(listener, game_id) for listener in self.listeners)
+
+    def _notify(self, game_id: str, delta: Optional[dict]) -> None:
+        if not delta:
+            return
+        for listener in self.listeners:
+            if _wants(listener, game_id):
+                listener(game_id, delta)
+
+    def mark_dirty(self, game_id: str) -> None:
+        with self._lock:
+            self._dirty.add(game_id)
+
+    async def apply(self, game_id: str, action: str, player_id: Optional[int] = None, amount: Optional[int] = None) -> dict:
+        """Validates and applies one action to a live table.
+
+        Raises:
+            ActionError: If the game or player is missing or the action breaks the rules.
+        """
+        if action not in ACTIONS:
+            raise ActionError(400, f"Unknown action: {action}")
+
+        table = await self.get(game_id)
+        if table is None:
+            raise ActionError(404, MISSING_GAME.get(action, "Player or Game not found"))
+
+        seq, delta = None, None
+        with table.lock:
+            _check_not_frozen(table)
+            before = table.view() if self._watched(table.id) else None
+            result = play(table, action, player_id, amount)
+            table.changed()
+            if self.log is not None:
+                # Appended under the table lock so the log order matches the order applied
+                seq = table.seq = self.log.append(game_id, action, player_id, amount)
+            if before is not None:
+                delta = diff_views(before, table.view())
+
+        if seq is not None:
+            await self.log.commit(seq)
+        self.clock.set(game_id, table.turn_deadline)
+        self._notify(game_id, delta)
+        self.mark_dirty(game_id)
+        if action == "next-hand":
+            await self.request_flush()
+        return result
+
+    async def join(self, game_id: str, name: str, stack: int) -> dict:
+        """Seats a new player between hands.
+
+        Joining and leaving write through to the database immediately (the row id is the player
+        id), so the seating in the database is always current even when other changes are not.
+
+        Raises:
+            ActionError: If the game is missing, full, or mid-hand.
+        """
+        table = await self.get(game_id)
+        if table is None:
+            raise ActionError(404, "Game not found")
+        with table.lock:
+            seat = free_seat(table)
+
+        async with self.session_factory() as db:
+            row = PlayerDB(name=name, stack=stack, active=True, bet_amount=0, game_id=game_id, seat=seat)
+            db.add(row)
+            await db.execute(update(GameDB).filter(GameDB.id == game_id).values(player_count=GameDB.player_count + 1))
+            await db.commit()
+            player = PlayerState(row.id, name, stack, True, 0, seat)
+            try:
+                with table.lock:
+                    before = table.view() if self._watched(table.id) else None
+                    result = join(table, player)
+                    table.changed()
+                    delta = diff_views(before, table.view()) if before is not None else None
+            except ActionError:
+                await db.delete(row)  # Lost the seat to a concurrent join
+                await db.execute(update(GameDB).filter(GameDB.id == game_id).values(player_count=GameDB.player_count - 1))
+                await db.commit()
+                raise
+
+        self._notify(game_id, delta)
+        self.mark_dirty(game_id)
+        return {**result, "player_id": player.id}
+
+    async def leave(self, game_id: str, player_id: int) -> dict:
+        """Removes a player between hands and deletes their row.
+
+        Raises:
+            ActionError: If the game or player is missing, a hand is in progress, or too few players would remain.
+        """
+        table = await self.get(game_id)
+        if table is None:
+            raise ActionError(404, "Game not found")
+        with table.lock:
+            before = table.view() if self._watched(table.id) else None
+            result = leave(table, player_id)
+            table.changed()
+            delta = diff_views(before, table.view()) if before is not None else None
+
+        async with self.session_factory() as db:
+            await db.execute(delete(PlayerDB).filter(PlayerDB.id == player_id))
+            await db.execute(update(GameDB).filter(GameDB.id == game_id).values(player_count=GameDB.player_count - 1))
+            await db.commit()
+
+        self._notify(game_id, delta)
+        self.mark_dirty(game_id)
+        return result
+
+    async def rebalance(self, game_ids: list, table_size: int) -> dict:
+        """Evens out the players of a multi-table event and closes the tables it no longer needs.
+
+        The plan is computed in memory from the live tables (see `tournaments.plan_rebalance`),
+        written to the database in one transaction, and then applied to the tables. Tables taking
+        part are frozen in between, so no action can slip in while players are in transit.
+
+        Raises:
+            ActionError: If a table that would change has a hand in progress.
+        """
+        loaded = {}
+        for game_id in sorted(game_ids):
+            table = await self.get(game_id)
+            if table is not None:
+                loaded[game_id] = table
+
+        with ExitStack() as stack:
+            for table in loaded.values():
+                stack.enter_context(table.lock)
+            plan = plan_rebalance({t.id: [(p.id, p.seat, p.stack) for p in t.players.values()] for t in loaded.values()},
+                                  table_size)
+            eliminated = set(plan["eliminated"])
+            involved = sorted({m["from"] for m in plan["moves"]} | {m["to"] for m in plan["moves"]} | set(plan["closed"])
+                              | {t.id for t in loaded.values() if eliminated.intersection(t.players)})
+            for game_id in involved:
+                try:
+                    _between_hands(loaded[game_id])
+                except ActionError as e:
+                    raise ActionError(409, f"Table {game_id} has a hand in progress") if e.status_code == 400 else e
+            for game_id in involved:
+                loaded[game_id].frozen = True
+
+        try:
+            counts = {t.id: len(t.players) for t in loaded.values()}
+            for table in loaded.values():
+                counts[table.id] -= len(eliminated.intersection(table.players))
+            for move in plan["moves"]:
+                counts[move["from"]] -= 1
+                counts[move["to"]] += 1
+
+            async with self.session_factory() as db:
+                if eliminated:
+                    await db.execute(delete(PlayerDB).filter(PlayerDB.id.in_(eliminated)))
+                if plan["moves"]:
+                    await db.execute(update(PlayerDB), [{"id": m["player_id"], "game_id": m["to"], "seat": m["seat"]}
+                                                        for m in plan["moves"]])
+                if plan["closed"]:
+                    await db.execute(delete(GameDB).filter(GameDB.id.in_(plan["closed"])))
+                kept = [{"id": g, "player_count": counts[g]} for g in involved if g not in plan["closed"]]
+                if kept:
+                    await db.execute(update(GameDB), kept)
+                await db.commit()
+        except BaseException:
+            for game_id in involved:
+                loaded[game_id].frozen = False
+            raise
+
+        deltas = []
+        with ExitStack() as stack:
+            for game_id in involved:
+                stack.enter_context(loaded[game_id].lock)
+            before = {g: loaded[g].view() for g in involved if self._watched(g)}
+            for game_id in involved:
+                table = loaded[game_id]
+                table.seat_players(p for p in table.players.values() if p.id not in eliminated)
+            for move in plan["moves"]:
+                source, target = loaded[move["from"]], loaded[move["to"]]
+                player = source.players[move["player_id"]]
+                source.seat_players(p for p in source.players.values() if p.id != player.id)
+                player.seat = move["seat"]
+                target.seat_players([*target.players.values(), player])
+            for game_id in involved:
+                loaded[game_id].frozen = False
+                start_street(loaded[game_id])
+                loaded[game_id].changed()
+                if game_id in before and game_id not in plan["closed"]:
+                    deltas.append((game_id, diff_views(before[game_id], loaded[game_id].view())))
+
+        for game_id in plan["closed"]:
+            self.discard(game_id)
+        for game_id, delta in deltas:
+            self._notify(game_id, delta)
+        for game_id in involved:
+            if game_id not in plan["closed"]:
+                self.clock.set(game_id, loaded[game_id].turn_deadline)
+                self.mark_dirty(game_id)
+        return plan
+
+    async def apply_batch(self, game_id: str, actions: list, atomic: bool = False) -> dict:
+        """Applies an ordered list of `(action, player_id, amount)` to one table under a single lock.
+
+        Each action is validated against the state left by the previous ones. Rejected actions
+        are reported and skipped; with `atomic=True` the first rejection rolls the whole batch
+        back instead. All records share one log commit and the table is flushed once.
+
+        Returns:
+            dict: `applied` (number of actions kept) and one result per action, each with a
+            `status_code` plus the route's usual response or error `detail`.
+        """
+        return (await self.apply_batches([(game_id, actions)], atomic))[0]
+
+    async def apply_batches(self, batches: list, atomic: bool = False) -> list:
+        """Applies `(game_id, actions)` batches for several games with one shared log commit."""
+        outcomes, deltas, last_seq, hand_ended = [], [], None, False
+        for game_id, actions in batches:
+            outcome, seq, delta = self._apply_batch(game_id, await self.get(game_id), actions, atomic)
+            outcomes.append(outcome)
+            deltas.append((game_id, delta))
+            if seq is not None:
+                last_seq = seq
+            if outcome["applied"]:
+                self.mark_dirty(game_id)
+                hand_ended = hand_ended or any(a[0] == "next-hand" for a in actions)
+
+        if last_seq is not None:
+            await self.log.commit(last_seq)
+        for game_id, delta in deltas:
+            self._notify(game_id, delta)  # One coalesced delta per game for the whole batch
+        if hand_ended:
+            await self.request_flush()
+        return outcomes
+
+    def _apply_batch(self, game_id: str, table: Optional[TableState], actions: list, atomic: bool):
+        if table is None:
+            results = [{"status_code": 404, "detail": MISSING_GAME.get(a[0], "Player or Game not found")} for a in actions]
+            return {"game_id": game_id, "applied": 0, "results": results}, None, None
+
+        results, applied, seq, delta = [], [], None, None
+        with table.lock:
+            saved = table.to_dict() if atomic else None
+            before = table.view() if self._watched(table.id) else None
+            for action, player_id, amount in actions:
+                try:
+                    _check_not_frozen(table)
+                    if action not in ACTIONS:
+                        raise ActionError(400, f"Unknown action: {action}")
+                    results.append({"status_code": 200, **play(table, action, player_id, amount)})
+                    applied.append((action, player_id, amount))
+                except ActionError as e:
+                    results.append({"status_code": e.status_code, "detail": e.detail})
+                    if atomic:
+                        table.restore(saved)
+                        return {"game_id": game_id, "applied": 0, "results": results}, None, None
+
+            if applied:
+                table.changed()
+            if self.log is not None:
+                for action, player_id, amount in applied:
+                    seq = table.seq = self.log.append(game_id, action, player_id, amount)
+            if before is not None:
+                delta = diff_views(before, table.view())
+
+        self.clock.set(game_id, table.turn_deadline)
+        return {"game_id": game_id, "applied": len(applied), "results": results}, seq, delta
+
+    async def recover(self) -> int:
+        """Rebuilds all tables after a restart: database state, then any newer snapshot, then the log tail.
+
+        Returns:
+            int: The number of log records replayed.
+        """
+        await self.load_all()
+        if self.log is None:
+            return 0
+
+        # Rows last written through another worker's log are newer than anything in ours
+        own = {g: t for g, t in self._tables.items() if t.log_id in (None, self.log.id)}
+        snapshot = self.log.read_snapshot()
+        if snapshot:
+            for data in snapshot["tables"]:
+                table = own.get(data["id"])
+                if table is not None and data["seq"] > table.seq:
+                    restored = TableState.from_dict(data)
+                    restored.log_id = table.log_id
+                    # Seating is written through, so the database knows best who is at the table
+                    restored.seat_players(restored.players.get(p.id, p) for p in table.players.values())
+                    self._tables[data["id"]] = own[data["id"]] = restored
+
+            # Finished hands in the snapshot may have been flushed after it was taken
+            pending = [h["id"] for t in self._tables.values() for h in t.history]
+            if pending:
+                async with self.session_factory() as db:
+                    flushed = set((await db.execute(select(HandDB.id).filter(HandDB.id.in_(pending)))).scalars())
+                for table in self._tables.values():
+                    table.history = [h for h in table.history if h["id"] not in flushed]
+
+        after = min((t.seq for t in own.values()), default=0)
+        applied = replay(own, self.log.read(after))
+        for table in self._tables.values():
+            if table.turn_deadline is not None:
+                table.turn_deadline = round(time.time() + table.shot_clock, 3)  # Nobody could act while we were down
+            self.clock.set(table.id, table.turn_deadline)
+        if applied:
+            with self._lock:
+                self._dirty.update(self._tables)
+            await self.flush()
+        return applied
+
+    async def snapshot(self) -> None:
+        """Writes every table to the log's snapshot file and drops log segments it covers."""
+        if self.log is None:
+            return
+
+        # Everything before the rotation point is already applied to the tables we serialize
+        start = await asyncio.to_thread(self.log.rotate)
+        with self._lock:
+            tables = list(self._tables.values())
+        data = []
+        for table in tables:
+            with table.lock:
+                data.append(table.to_dict())
+
+        await asyncio.to_thread(self.log.write_snapshot, {"seq": start, "tables": data})
+        self.log.drop_segments_before(start)
+
+    async def flush(self) -> int:
+        """Writes all dirty tables and finished hands, with the player stats they add to.
+
+        Game rows are written with compare-and-swap on `GameDB.version`. A table whose row was
+        changed by another writer since it was read is rebuilt from the newer row with its pending
+        actions redone on top (see `_rebase()`) and written again, up to `MAX_CAS_RETRIES` times
+        per flush; after that it stays dirty for the next flush.
+
+        Returns:
+            int: The number of tables written.
+        """
+        async with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                tables = [self._tables[g] for g in dirty if g in self._tables]
+                hands, self._hands = self._hands, []
+            if not tables and not hands:
+                return 0
+            try:
+                for hook in self.before_flush:
+                    await hook()
+            except Exception:
+                with self._lock:
+                    self._dirty.update(t.id for t in tables)  # Retry on the next flush
+                    self._hands[:0] = hands
+                raise
+
+            written = 0
+            for _ in range(MAX_CAS_RETRIES + 1):
+                conflicts = await self._write(tables, hands)
+                written += len(tables) - len(conflicts)
+                hands = []
+                if not conflicts:
+                    break
+                self.cas_conflicts += len(conflicts)
+                for table in conflicts:
+                    await self._rebase(table)
+                tables = [t for t in conflicts if self._tables.get(t.id) is t]
+            else:
+                with self._lock:
+                    self._dirty.update(t.id for t in tables)
+            return written
+
+    async def _write(self, tables: list, hands: list) -> list:
+        """One flush transaction. Returns the tables whose compare-and-swap failed (nothing of theirs is written)."""
+        rows = []
+        stamp = {"updated_at": datetime.utcnow()}
+        if self.log is not None:
+            stamp["log_id"] = self.log.id  # `log_seq` counts in this log from now on
+        for table in tables:
+            with table.lock:
+                rows.append((table, {**table.game_row(), **stamp, "version": table.row_version + 1},
+                             table.player_rows(), table.history, len(table.pending)))
+                table.history = []
+
+        try:
+            async with self.session_factory() as db:
+                lost = await _compare_and_swap(db, [{**{k: v for k, v in game.items() if k != "id"}, "b_id": game["id"],
+                                                     "b_version": table.row_version} for table, game, *_ in rows])
+                kept = [row for row in rows if row[0].id not in lost]
+                player_rows = [p for _, _, players, _, _ in kept for p in players]
+                if player_rows:
+                    await db.execute(update(PlayerDB), player_rows)
+                finished = hands + [h for *_, history, _ in kept for h in history]
+                if finished:
+                    hand_records, hand_player_rows = [], []
+                    for hand in finished:
+                        row, players = hand_rows(hand)
+                        hand_records.append(row)
+                        hand_player_rows.extend(players)
+                    await db.execute(insert(HandDB), hand_records)
+                    await db.execute(insert(HandPlayerDB), hand_player_rows)
+                    await record_stats(db, [(h["actions"], h["players"]) for h in finished])
+                await db.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(t.id for t in tables)  # Retry on the next flush
+                self._hands[:0] = hands + [h for *_, history, _ in rows for h in history]
+            raise
+
+        for table, game, _, _, flushed in kept:
+            with table.lock:
+                table.row_version = game["version"]
+                table.log_id = game.get("log_id", table.log_id)
+                del table.pending[:flushed]
+        # The hands of a table that lost are dropped here and recorded again when its actions are redone
+        return [table for table, *_ in rows if table.id in lost]
+
+    async def _rebase(self, table: TableState) -> None:
+        """Rebuilds a table from its current database row and redoes the actions not yet written on top.
+
+        Actions the newer state rejects are dropped (counted in `dropped_actions`), exactly as if
+        they had arrived after the other writer's.
+        """
+        fresh = await self._load(table.id)
+        if fresh is None:
+            self.discard(table.id)  # Deleted by the other writer
+            return
+
+        with table.lock:
+            before = table.view() if self._watched(table.id) else None
+            for action, player_id, amount in table.pending:
+                try:
+                    play(fresh, action, player_id, amount)
+                except ActionError:
+                    self.dropped_actions += 1
+            for name in ("pots", "current_bet", "raise_size", "game_state", "players", "board", "button", "dealer",
+                         "hand", "history", "row_version", "pending", "to_act", "acted", "shot_clock", "turn_deadline",
+                         "log_id"):
+                setattr(table, name, getattr(fresh, name))
+            table.changed()
+            delta = diff_views(before, table.view()) if before is not None else None
+        self.clock.set(table.id, table.turn_deadline)
+        self._notify(table.id, delta)
+
+    async def _expire_turns(self, expired: list) -> None:
+        """Checks (or, facing a bet, folds) for every player whose shot clock ran out, as one batch."""
+        batches = []
+        for game_id, deadline in expired:
+            table = self._tables.get(game_id)
+            if table is None:
+                continue
+            with table.lock:
+                player = table.players.get(table.to_act)
+                if table.turn_deadline != deadline or player is None:
+                    continue  # The player acted in time
+                action = "check" if player.bet_amount >= table.current_bet else "fold"
+                batches.append((game_id, [(action, player.id, None)]))
+        if batches:
+            self.timeouts += len(batches)
+            await self.apply_batches(batches)
+
+    async def request_flush(self) -> None:
+        """Asks the background flusher to run now, or flushes inline when it isn't running."""
+        if self._task is None:
+            await self.flush()
+        else:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Starts the background write-behind task on the running event loop."""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        self.clock.start()
+
+    async def stop(self) -> None:
+        """Stops the background task and writes any remaining changes."""
+        await self.clock.stop()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.snapshot()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+                if self.log is not None and self.log.appended_since_rotate >= SNAPSHOT_EVERY:
+                    await self.snapshot()
+            except Exception:
+                logger.exception("Error flushing tables")
+
+
+tables = TableEngine()  # The app gives it its action log at startup (see `backend.app`)
+
+
+def get_tables() -> TableEngine:
+    return tables
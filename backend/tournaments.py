@@ -0,0 +1,66 @@
+"""Seating for multi-table events: the initial draw and table balancing.
+
+Everything here is plain computation over player lists; `TableEngine.rebalance()` applies
+the resulting plan to the live tables and the database in one go.
+"""
+from math import ceil
+from typing import Dict, List, Sequence, Tuple
+
+
+def table_sizes(num_players: int, table_size: int) -> List[int]:
+    """Splits a field over as few tables as fit it, with sizes differing by at most one."""
+    tables = max(1, ceil(num_players / table_size))
+    base, extra = divmod(num_players, tables)
+    return [base + 1 if i < extra else base for i in range(tables)]
+
+
+def seat_draw(players: Sequence, table_size: int) -> List[list]:
+    """Deals `players` (already in draw order) round the tables, one seat at a time, so every table fills evenly."""
+    tables: List[list] = [[] for _ in table_sizes(len(players), table_size)]
+    for i, player in enumerate(players):
+        tables[i % len(tables)].append(player)
+    return tables
+
+
+def plan_rebalance(tables: Dict[str, List[Tuple[int, int, int]]], table_size: int) -> dict:
+    """Works out which players to remove and move so the remaining field is spread evenly.
+
+    Busted players (no chips) leave. The field then needs `ceil(players / table_size)` tables:
+    the fullest tables stay and the rest close, and players move from closed or over-full tables
+    (highest seat first) into the lowest free seats of tables that are short.
+
+    Args:
+        tables (dict): `{game_id: [(player_id, seat, stack), ...]}` for every table of the event.
+        table_size (int): Seats per table.
+
+    Returns:
+        dict: `eliminated` player ids, `closed` game ids, and `moves` as
+        `{"player_id", "from", "to", "seat"}`, in the order they should be applied.
+    """
+    eliminated = [player_id for players in tables.values() for player_id, _, stack in players if stack <= 0]
+    remaining = {game_id: sorted((seat, player_id) for player_id, seat, stack in players if stack > 0)
+                 for game_id, players in tables.items()}
+
+    total = sum(len(players) for players in remaining.values())
+    by_size = sorted(remaining, key=lambda g: (-len(remaining[g]), g))
+    sizes = table_sizes(total, table_size)
+    keep = by_size[:len(sizes)] if total else []
+    targets = dict(zip(keep, sizes))
+    closed = [game_id for game_id in by_size if game_id not in targets]
+
+    # Players who have to move, taken from the highest seats of tables over their target
+    movers = []
+    for game_id in by_size:
+        seated = remaining[game_id]
+        surplus = len(seated) - targets.get(game_id, 0)
+        for seat, player_id in seated[len(seated) - surplus:] if surplus > 0 else []:
+            movers.append((player_id, game_id))
+
+    moves = []
+    for game_id in keep:
+        taken = {seat for seat, _ in remaining[game_id]}
+        free = (seat for seat in range(table_size) if seat not in taken)
+        for _ in range(targets[game_id] - len(remaining[game_id])):
+            player_id, source = movers.pop(0)
+            moves.append({"player_id": player_id, "from": source, "to": game_id, "seat": next(free)})
+    return {"eliminated": eliminated, "closed": closed, "moves": moves}
@@ -0,0 +1,219 @@
+"""Benchmark harness for the game API.
+
+Plays scripted hands at N concurrent games through the HTTP routes and reports latency
+percentiles and throughput per endpoint, plus microbenchmarks of the hot game-logic helpers.
+Results are written as JSON so runs can be compared between commits:
+
+    python -m backend.utils.bench --games 50 --hands 10 --out bench.json
+    python -m backend.utils.bench --baseline bench.json --threshold 0.25
+
+With `--baseline` the run fails (exit code 1) when any metric is worse than the baseline by
+more than the threshold. Without `--url` the app is served in-process, so results measure the
+application rather than the network.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import httpx # type: ignore
+
+THRESHOLD = 0.2  # Allowed slowdown before a metric counts as a regression
+PLAYERS = {"Alice": 1000, "Bob": 1000, "Carol": 1000}
+HOLE_CARDS = ("AsKs", "QdQc", "7h2d")
+BOARD = "2c7dTh9sJc"
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of `samples` (q in 0-100)."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """Collects request latencies per endpoint."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, method: str, endpoint: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies.setdefault(f"{method} {endpoint}", []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[f"{method} {endpoint}"] = self.errors.get(f"{method} {endpoint}", 0) + 1
+        return response
+
+
+async def play_game(recorder: Recorder, hands: int) -> None:
+    """Creates a game, plays `hands` scripted hands through the betting routes, and deletes it."""
+    response = await recorder.request("POST", "/create-game/", "/create-game/", json={"players": PLAYERS})
+    game_id = response.json()["game_id"]
+    game = (await recorder.request("GET", "/get-game/{game_id}", f"/get-game/{game_id}")).json()
+    first, second, third = [p["id"] for p in game["players"]]
+
+    for _ in range(hands):
+        for player_id, cards in zip((first, second, third), HOLE_CARDS):
+            await recorder.request("PUT", "/cards/", "/cards/", json={"game_id": game_id, "player_id": player_id, "cards": cards})
+        await recorder.request("PUT", "/cards/", "/cards/", json={"game_id": game_id, "cards": BOARD})
+        await recorder.request("PUT", "/bet/", "/bet/", json={"game_id": game_id, "player_id": first, "amount": 20})
+        await recorder.request("PUT", "/call/", "/call/", params={"game_id": game_id, "player_id": second})
+        await recorder.request("PUT", "/raise/", "/raise/", params={"game_id": game_id, "player_id": third, "raise_amount": 60})
+        await recorder.request("PUT", "/call/", "/call/", params={"game_id": game_id, "player_id": first})
+        await recorder.request("PUT", "/fold/", "/fold/", params={"game_id": game_id, "player_id": second})
+        for _ in range(3):
+            await recorder.request("PUT", "/next-round/", "/next-round/", params={"game_id": game_id})
+            await recorder.request("PUT", "/check/", "/check/", json={"game_id": game_id, "player_id": first})
+            await recorder.request("PUT", "/check/", "/check/", json={"game_id": game_id, "player_id": third})
+            await recorder.request("PUT", "/next_stage/", "/next_stage/", json={"game_id": game_id})
+        await recorder.request("PUT", "/next_stage/", "/next_stage/", json={"game_id": game_id})
+        await recorder.request("GET", "/get-game/{game_id}", f"/get-game/{game_id}")
+        await recorder.request("PUT", "/next_hand/", "/next_hand/", json={"game_id": game_id})
+
+    await recorder.request("DELETE", "/end-session/{game_id}", f"/end-session/{game_id}")
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+async def run_load(games: int = 20, hands: int = 5, url: Optional[str] = None, lifespan: bool = True) -> dict:
+    """Plays `games` concurrent games of `hands` hands each.
+
+    Args:
+        games (int): Number of games played at the same time.
+        hands (int): Hands played per game.
+        url (str): Base URL of a running server. Omit to serve the app in-process.
+        lifespan (bool): Run the app's startup and shutdown around an in-process run.
+
+    Returns:
+        dict: Per-endpoint `requests`, `p50_ms`, `p99_ms`, `mean_ms` and `throughput_rps`, an
+        `overall` entry, and `errors` (responses with status >= 400 per endpoint).
+    """
+    if url is None:
+        from backend.app import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        context = app.router.lifespan_context(app) if lifespan else None
+    else:
+        client = httpx.AsyncClient(base_url=url, timeout=30)
+        context = None
+
+    async with client:
+        if context is not None:
+            await context.__aenter__()
+        try:
+            recorder = Recorder(client)
+            start = time.perf_counter()
+            await asyncio.gather(*(play_game(recorder, hands) for _ in range(games)))
+            elapsed = time.perf_counter() - start
+        finally:
+            if context is not None:
+                await context.__aexit__(None, None, None)
+
+    endpoints = {name: summarize(samples, elapsed) for name, samples in sorted(recorder.latencies.items())}
+    endpoints["overall"] = summarize([s for samples in recorder.latencies.values() for s in samples], elapsed)
+    return {"endpoints": endpoints, "errors": recorder.errors, "elapsed_s": round(elapsed, 3)}
+
+
+def run_micro(number: int = 20000, repeat: int = 5) -> dict:
+    """Times the game-logic helpers. Returns the best of `repeat` runs in nanoseconds per call."""
+    from backend.logic import get_next_state, positions, seat_positions, update_positions
+
+    eight = dict(enumerate(positions[8]))
+    cases = {
+        "update_positions[8]": lambda: update_positions(eight),
+        "get_next_state": lambda: get_next_state("turn"),
+        "seat_positions[8]": lambda: seat_positions(8, 5),
+    }
+    return {name: {"ns_per_call": round(min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9, 1)}
+            for name, fn in cases.items()}
+
+
+# Which direction is better for each metric
+LOWER_IS_BETTER = ("p50_ms", "p99_ms", "mean_ms", "ns_per_call")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> List[str]:
+    """Lists every metric in `current` that is worse than in `baseline` by more than `threshold` (a fraction)."""
+    regressions = []
+    for section in ("endpoints", "micro"):
+        for name, metrics in current.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            for metric, value in metrics.items():
+                before = old.get(metric)
+                if not before:
+                    continue
+                if metric in LOWER_IS_BETTER and value > before * (1 + threshold):
+                    regressions.append(f"{section} {name} {metric}: {before} -> {value}")
+                elif metric in HIGHER_IS_BETTER and value < before / (1 + threshold):
+                    regressions.append(f"{section} {name} {metric}: {before} -> {value}")
+    return regressions
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=20, help="concurrent games")
+    parser.add_argument("--hands", type=int, default=5, help="hands per game")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown as a fraction (default 0.2)")
+    parser.add_argument("--skip-load", action="store_true", help="only run the microbenchmarks")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "config": {"games": args.games, "hands": args.hands, "url": args.url},
+        "micro": run_micro(),
+    }
+    if not args.skip_load:
+        results.update(asyncio.run(run_load(args.games, args.hands, args.url)))
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
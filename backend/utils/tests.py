@@ -6,7 +6,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..",
 
 from fastapi.testclient import TestClient #type:ignore
 from backend.app import app  # Correct absolute import
+from backend.create_tables import migrate
+from backend import metrics
 
+migrate()  # The client below doesn't run the app's startup, which does this
+metrics.SAMPLE_RATE = 1.0  # Measure every request's database work, so tests can assert on it
 client = TestClient(app)
 
 # Global variable to store game_id for testing
@@ -87,6 +91,21 @@ def test_all_in():
     assert "Player 1 went all-in" in response.json()["message"]
 
 
+# ✅ Test All-In After a Bet (the bet to match is the shover's total for the round)
+def test_all_in_after_bet():
+    new_game = client.post("/create-game/", json={"players": {"Ned": 1000, "Oz": 2000}}).json()["game_id"]
+    ned, oz = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    client.put("/bet/", json={"game_id": new_game, "player_id": ned, "amount": 300})
+    assert client.put(f"/all-in/?game_id={new_game}&player_id={ned}").status_code == 200
+    # Ned put in 1000 in all, so calling the 700 of the shove alone is not enough
+    assert client.put(f"/call/?game_id={new_game}&player_id={oz}").status_code == 200
+    game = client.get(f"/get-game/{new_game}").json()
+    assert game["pot"] == 2000
+    assert {p["id"]: p["stack"] for p in game["players"]} == {ned: 0, oz: 1000}
+    client.delete(f"/end-session/{new_game}")
+
+
 # ✅ Test Next Round (Resets Betting)
 def test_next_round():
     response = client.put(f"/next-round/?game_id={game_id}")
@@ -113,8 +132,1417 @@ def test_next_hand():
     assert data["message"] == "Positions updated for next hand"
     assert isinstance(data["new_positions"], dict)  # Ensure it's a dictionary
 
+# ✅ Test Next Hand Deals Folded Players Back In
+def test_next_hand_reactivates_folded():
+    new_game = client.post("/create-game/", json={"players": {"Pia": 500, "Quin": 500, "Rex": 500}}).json()["game_id"]
+    pia = client.get(f"/get-game/{new_game}").json()["players"][0]["id"]
+
+    assert client.put(f"/fold/?game_id={new_game}&player_id={pia}").status_code == 200
+    assert client.put("/next_hand/", json={"game_id": new_game}).status_code == 200
+    assert all(p["active"] for p in client.get(f"/get-game/{new_game}").json()["players"])
+    client.delete(f"/end-session/{new_game}")
+
 # ✅ Test End Game Session
 def test_end_game():
     response = client.delete(f"/end-session/{game_id}")
     assert response.status_code == 200
-    assert response.json()["message"] == f"Game {game_id} and all associated players have been deleted"
\ No newline at end of file
+    assert response.json()["message"] == f"Game {game_id} and all associated players have been deleted"
+
+# ✅ Test In-Memory Tables (reads are served live, writes reach the DB on flush)
+def test_tables_write_behind():
+    import asyncio
+    from backend.database import SessionLocal
+    from backend.models import GameDB, PlayerDB
+    from backend.tables import TableEngine, tables
+
+    new_game = client.post("/create-game/", json={"players": {"Dana": 500, "Eve": 500}}).json()["game_id"]
+    dana, eve = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    client.put("/bet/", json={"game_id": new_game, "player_id": dana, "amount": 50})
+    assert client.get(f"/get-game/{new_game}").json()["pot"] == 50
+
+    asyncio.run(tables.flush())
+    db = SessionLocal()
+    try:
+        assert db.query(GameDB).filter(GameDB.id == new_game).first().pot == 50
+        assert db.query(PlayerDB).filter(PlayerDB.id == dana).first().stack == 450
+    finally:
+        db.close()
+
+    # A fresh engine rebuilds the same state from the database
+    rebuilt = TableEngine()
+    assert asyncio.run(rebuilt.load_all()) >= 1
+    assert asyncio.run(rebuilt.get(new_game)).players[dana].bet_amount == 50
+
+    client.delete(f"/end-session/{new_game}")
+    assert asyncio.run(tables.get(new_game)) is None
+
+
+def test_tables_rejected_action_leaves_state():
+    new_game = client.post("/create-game/", json={"players": {"Finn": 100, "Gus": 100}}).json()["game_id"]
+    finn = client.get(f"/get-game/{new_game}").json()["players"][0]["id"]
+
+    response = client.put("/bet/", json={"game_id": new_game, "player_id": finn, "amount": 500})
+    assert response.status_code == 400
+    assert client.get(f"/get-game/{new_game}").json()["pot"] == 0
+
+    response = client.put(f"/fold/?game_id=missing&player_id={finn}")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Player not found"
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Action Log (binary records survive a torn tail)
+def test_action_log_roundtrip():
+    import tempfile
+    from backend.action_log import ActionLog
+
+    with tempfile.TemporaryDirectory() as path:
+        log = ActionLog(path)
+        seqs = [log.append("g1", "bet", 1, 100), log.append("g1", "fold", 2), log.append("g1", "next-stage")]
+        log.wait(seqs[-1])
+        log.close()
+
+        with open(log._segment_path(1), "ab") as f:
+            f.write(b"\x00garbage")  # Simulate a crash mid-write
+
+        reopened = ActionLog(path)
+        records = list(reopened.read())
+        assert [r.seq for r in records] == seqs
+        assert (records[0].action, records[0].player_id, records[0].amount) == ("bet", 1, 100)
+        assert (records[2].player_id, records[2].amount) == (None, None)
+        assert reopened.append("g1", "call", 1) == 4
+        reopened.close()
+
+
+# ✅ Test Importing the App Touches No Files (the action log is opened at startup)
+def test_action_log_opened_at_startup(tmp_path):
+    import subprocess
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    env = {**os.environ, "ACTION_LOG_DIR": str(tmp_path / "log")}
+    code = "from backend.app import app; from backend.tables import tables; assert tables.log is None"
+    subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True)
+    assert not (tmp_path / "log").exists()
+
+
+# ✅ Test Group Commit (a finished group that is still set doesn't stall the next commit)
+def test_action_log_commit_after_finished_group():
+    import asyncio
+    import tempfile
+    import threading
+    from backend.action_log import ActionLog
+
+    with tempfile.TemporaryDirectory() as path:
+        log = ActionLog(path)
+
+        async def commit():
+            log._group = asyncio.get_running_loop().create_future()
+            log._group.set_result(None)  # Done, but nothing has cleared it yet
+            await log.commit(log.append("g1", "bet", 1, 100))
+
+        # Awaiting a finished future never yields, so a commit that re-awaits it spins forever
+        worker = threading.Thread(target=asyncio.run, args=(commit(),), daemon=True)
+        worker.start()
+        worker.join(5)
+        assert not worker.is_alive()
+        assert [r.seq for r in log.read()] == [1]
+        log.close()
+
+
+# ✅ Test Crash Recovery (snapshot + log tail rebuild unflushed state)
+def test_action_log_recovery():
+    import asyncio
+    import tempfile
+    from backend.action_log import ActionLog
+    from backend.tables import TableEngine
+
+    new_game = client.post("/create-game/", json={"players": {"Hal": 300, "Ivy": 300}}).json()["game_id"]
+    hal, ivy = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    async def play(engine):
+        await engine.apply(new_game, "bet", hal, 40)
+        await engine.snapshot()
+        await engine.apply(new_game, "call", ivy)
+        await engine.apply(new_game, "next-stage")
+
+    with tempfile.TemporaryDirectory() as path:
+        asyncio.run(play(TableEngine(log=ActionLog(path))))
+        # No flush: the database still holds the freshly created game
+
+        recovered = TableEngine(log=ActionLog(path))
+        assert asyncio.run(recovered.recover()) == 2
+        table = asyncio.run(recovered.get(new_game))
+        assert table.pot == 80
+        assert table.game_state == "flop"
+        assert table.players[ivy].stack == 260
+
+        # Recovery flushed the replayed state, so a second recovery has nothing to replay
+        assert asyncio.run(TableEngine(log=ActionLog(path)).recover()) == 0
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Crash Recovery Skips Rows Another Worker Wrote (log_seq counts in that worker's log)
+def test_action_log_recovery_foreign_rows():
+    import asyncio
+    import tempfile
+    from backend.action_log import ActionLog
+    from backend.database import SessionLocal
+    from backend.models import GameDB
+    from backend.tables import TableEngine
+
+    new_game = client.post("/create-game/", json={"players": {"Hal": 300, "Ivy": 300}}).json()["game_id"]
+    hal, ivy = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    async def play(engine):
+        await engine.apply(new_game, "bet", hal, 40)
+        await engine.flush()
+        await engine.snapshot()
+        await engine.apply(new_game, "call", ivy)
+
+    with tempfile.TemporaryDirectory() as path:
+        log = ActionLog(path)
+        asyncio.run(play(TableEngine(log=log)))
+        log.close()
+        with SessionLocal() as db:
+            game = db.get(GameDB, new_game)
+            assert (game.log_id, game.log_seq) == (log.id, 1)
+            # The game moved to another worker, which wrote it from its own log (with its own numbering)
+            game.log_id, game.log_seq, game.game_state, game.version = "elsewhere", 0, "turn", game.version + 1
+            db.commit()
+
+        recovered = TableEngine(log=ActionLog(path))
+        assert recovered.log.id == log.id  # Kept in the log directory across restarts
+        assert asyncio.run(recovered.recover()) == 0
+        table = asyncio.run(recovered.get(new_game))
+        assert (table.game_state, table.pot) == ("turn", 40)
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Batch Actions (a whole hand in one request)
+def test_batch_actions():
+    new_game = client.post("/create-game/", json={"players": {"Jo": 500, "Kim": 500}}).json()["game_id"]
+    jo, kim = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    response = client.post(f"/games/{new_game}/actions:batch", json={"actions": [
+        {"action": "bet", "player_id": jo, "amount": 50},
+        {"action": "check", "player_id": kim},  # Rejected, the rest still apply
+        {"action": "call", "player_id": kim},
+        {"action": "next-round"},
+        {"action": "next-stage"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["applied"] == 4
+    assert [r["status_code"] for r in data["results"]] == [200, 400, 200, 200, 200]
+    assert data["results"][1]["detail"] == "Cannot check. You must call or raise."
+    game = client.get(f"/get-game/{new_game}").json()
+    assert (game["pot"], game["state"]) == (100, "flop")
+
+    # Atomic batches are all-or-nothing
+    response = client.post(f"/games/{new_game}/actions:batch", json={"atomic": True, "actions": [
+        {"action": "bet", "player_id": jo, "amount": 20},
+        {"action": "bet", "player_id": kim, "amount": 10000},
+    ]})
+    assert response.json()["applied"] == 0
+    assert client.get(f"/get-game/{new_game}").json()["pot"] == 100
+
+    # Cross-game batches report per game
+    response = client.post("/games/actions:batch", json={"games": [
+        {"game_id": new_game, "actions": [{"action": "fold", "player_id": kim}]},
+        {"game_id": "missing", "actions": [{"action": "next-stage"}]},
+    ]})
+    games = response.json()["games"]
+    assert games[0]["applied"] == 1
+    assert games[1]["results"][0] == {"status_code": 404, "detail": "Game not found"}
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Push Updates (initial state, then only the changed fields)
+def test_websocket_deltas():
+    new_game = client.post("/create-game/", json={"players": {"Lou": 400, "Max": 400}}).json()["game_id"]
+    lou = client.get(f"/get-game/{new_game}").json()["players"][0]["id"]
+
+    with client.websocket_connect(f"/ws/games/{new_game}") as ws:
+        first = ws.receive_json()
+        assert first["pot"] == 0 and len(first["players"]) == 2
+
+        client.put("/bet/", json={"game_id": new_game, "player_id": lou, "amount": 30})
+        delta = ws.receive_json()
+        assert delta["pot"] == 30 and delta["current_bet"] == 30
+        assert delta["players"] == {str(lou): {"stack": 370}}
+        assert "game_state" not in delta
+
+        client.delete(f"/end-session/{new_game}")
+        assert ws.receive_json()["ended"] is True
+
+
+def test_slow_subscriber_coalesces():
+    import asyncio
+    from backend.push import Broadcaster
+
+    async def scenario():
+        hub = Broadcaster()
+        subscription = hub.subscribe("g")
+        for pot in (10, 20, 30):
+            hub.publish("g", {"pot": pot, "players": {1: {"stack": 100 - pot}}})
+        hub.publish("g", {"game_state": "flop", "players": {2: {"active": False}}})
+        delta = await subscription.next(1)
+        assert delta == {"pot": 30, "game_state": "flop", "version": 4,
+                         "players": {1: {"stack": 70}, 2: {"active": False}}}
+        assert await subscription.next(0.01) is None  # Nothing more was queued
+        hub.unsubscribe(subscription)
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+# ✅ Test Unwatched Games (no views are built or diffed for a game nobody subscribes to)
+def test_deltas_only_for_subscribed_games(monkeypatch):
+    import asyncio
+    from backend.push import Broadcaster
+    from backend.tables import TableEngine, TableState
+
+    new_game = client.post("/create-game/", json={"players": {"Lou": 500, "Mo": 500}}).json()["game_id"]
+    lou, mo = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+    views = []
+    view = TableState.view
+    monkeypatch.setattr(TableState, "view", lambda table: views.append(table.id) or view(table))
+
+    async def scenario():
+        engine, hub = TableEngine(), Broadcaster()
+        engine.listeners.append(hub)
+        await engine.apply(new_game, "bet", lou, 20)
+        assert views == [] and hub.version(new_game) == 0
+
+        subscription = hub.subscribe(new_game)
+        await engine.apply(new_game, "call", mo)
+        assert views == [new_game, new_game]
+        assert (await subscription.next(1))["pot"] == 40
+        hub.unsubscribe(subscription)
+        assert hub._versions == {}  # No bookkeeping is kept for games nobody watches
+        await engine.apply(new_game, "fold", lou)
+        assert hub._versions == {}
+        await engine.flush()
+
+    asyncio.run(scenario())
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Async Database Configuration
+def test_async_database_url_and_pool_stats():
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from backend.database import POOL_SIZE, async_url, pool_options
+
+    assert async_url("sqlite:///games.db") == "sqlite+aiosqlite:///games.db"
+    assert pool_options("sqlite+aiosqlite:///games.db")["pool_size"] == POOL_SIZE
+    assert pool_options("sqlite+aiosqlite:///:memory:") == {}  # StaticPool: sizing would be a TypeError
+    asyncio.run(create_async_engine("sqlite+aiosqlite:///:memory:", **pool_options("sqlite+aiosqlite:///:memory:")).dispose())
+    assert async_url("postgresql://u:p@db/poker") == "postgresql+asyncpg://u:p@db/poker"
+    assert async_url("postgresql+asyncpg://u:p@db/poker") == "postgresql+asyncpg://u:p@db/poker"
+
+    response = client.get("/db-pool/")
+    assert response.status_code == 200
+    assert {"pool_size", "max_overflow", "checkedout"} <= set(response.json())
+
+
+# ✅ Test Hand Evaluator (lookup tables agree with brute force over 5-card subsets)
+def test_evaluator_rankings():
+    import itertools
+    import random
+    from backend.evaluator import evaluate, evaluate_batch, hand_name, parse_cards
+
+    def name(cards):
+        return hand_name(evaluate(parse_cards(cards)))
+
+    assert name("AsKsQsJsTs2c3d") == "Straight Flush"
+    assert name("As2s3s4s5d9h9c") == "Straight"  # Wheel beats the pair
+    assert name("AhAdAcKsKd2c3c") == "Full House"
+    assert name("2h3h4h5h7h9cTc") == "Flush"
+    assert name("AhAdAcAsKd2c3c") == "Four of a Kind"
+    assert evaluate(parse_cards("AsAd2c3d4hKs7c")) > evaluate(parse_cards("AhAcQd3s4c5d9h"))  # Kicker
+    assert evaluate(parse_cards("5s4d3c2hAs9h9c")) < evaluate(parse_cards("6s5d4c3h2s9h9c"))  # Wheel is lowest
+
+    rng = random.Random(7)
+    hands = [rng.sample(range(52), 7) for _ in range(500)]
+    for hand in hands:
+        assert evaluate(hand) == max(evaluate(list(c)) for c in itertools.combinations(hand, 5))
+    assert list(evaluate_batch(hands)) == [evaluate(h) for h in hands]
+
+
+# ✅ Test Showdown (best hand takes the pot when the river is done)
+def test_showdown_awards_pot():
+    new_game = client.post("/create-game/", json={"players": {"Ned": 500, "Oli": 500}}).json()["game_id"]
+    ned, oli = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    assert client.put("/cards/", json={"game_id": new_game, "player_id": ned, "cards": "AsAd"}).status_code == 200
+    assert client.put("/cards/", json={"game_id": new_game, "player_id": oli, "cards": "KsKd"}).status_code == 200
+    response = client.put("/cards/", json={"game_id": new_game, "cards": "As2c7h"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Card already in play"
+    client.put("/cards/", json={"game_id": new_game, "cards": "2c7h9dJc3s"})
+
+    client.put("/bet/", json={"game_id": new_game, "player_id": ned, "amount": 100})
+    client.put(f"/call/?game_id={new_game}&player_id={oli}")
+    for _ in range(3):
+        client.put("/next_stage/", json={"game_id": new_game})
+    response = client.put("/next_stage/", json={"game_id": new_game})
+    assert response.json()["winners"] == [{"player_id": ned, "amount": 200, "hand": "Pair"}]
+
+    game = client.get(f"/get-game/{new_game}").json()
+    assert game["pot"] == 0
+    assert [p["stack"] for p in game["players"]] == [600, 400]
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Equity (exact on later streets, Monte Carlo preflop)
+def test_equity_calculator():
+    from backend.equity import BATCH_SIZE, MAX_EVALUATIONS, calculate_equity
+    from backend.evaluator import parse_cards
+
+    aces, kings = parse_cards("AsAd"), parse_cards("KsKd")
+    river = calculate_equity([aces, kings], parse_cards("2c7h9dJc"))
+    assert river["method"] == "exact" and river["samples"] == 44
+    assert abs(river["players"][0]["equity"] - 42 / 44) < 1e-9
+
+    preflop = calculate_equity([aces, kings], precision=0.01, seed=3)
+    assert preflop["method"] == "monte-carlo"
+    assert abs(preflop["players"][0]["equity"] - 0.82) < 0.02
+    assert preflop["players"][0]["margin"] <= 0.01
+    assert abs(sum(p["equity"] for p in preflop["players"]) - 1) < 1e-9
+
+    # The default sample cap shrinks with the players, so eight hands cost about what three do
+    eight = calculate_equity([parse_cards(h) for h in ("AsAd", "KsKd", "QsQd", "JsJd", "Tc9c", "8h7h", "5d5c", "Ah2c")],
+                             seed=3)
+    assert eight["samples"] < MAX_EVALUATIONS // 8 + BATCH_SIZE and all(p["margin"] < 0.01 for p in eight["players"])
+
+
+def test_equity_endpoint():
+    new_game = client.post("/create-game/", json={"players": {"Pia": 500, "Quin": 500}}).json()["game_id"]
+    pia, quin = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    client.put("/cards/", json={"game_id": new_game, "player_id": pia, "cards": "AsAd"})
+    response = client.get(f"/equity/{new_game}")
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Hole cards missing for player {quin}"
+
+    client.put("/cards/", json={"game_id": new_game, "player_id": quin, "cards": "KsKd"})
+    client.put("/cards/", json={"game_id": new_game, "cards": "2c7h9d"})
+    data = client.get(f"/equity/{new_game}").json()
+    assert data["method"] == "exact"
+    assert [p["player_id"] for p in data["players"]] == [pia, quin]
+    assert data["players"][0]["equity"] > 0.9
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Side Pots (property tests: the incremental ledger against a brute-force reference)
+def _reference_pots(totals, all_in, contenders):
+    levels = sorted(set(all_in.values())) + [None]
+    pots, floor = [], 0
+    for ceiling in levels:
+        amount = sum((min(t, ceiling) if ceiling is not None else t) - min(t, floor) for t in totals.values())
+        eligible = [p for p in contenders if p not in all_in or (ceiling is not None and all_in[p] >= ceiling)]
+        if not eligible:
+            eligible = [p for p in contenders if totals.get(p, 0) > floor] or list(contenders)
+        if amount:
+            pots.append({"amount": amount, "eligible": eligible})
+        floor = ceiling
+    return pots
+
+
+def _reference_settle(pots, scores):
+    winnings = {}
+    for pot in pots:
+        best = max(scores.get(p, 0) for p in pot["eligible"])
+        winners = [p for p in pot["eligible"] if scores.get(p, 0) == best]
+        for i, p in enumerate(winners):
+            winnings[p] = winnings.get(p, 0) + pot["amount"] // len(winners) + (i < pot["amount"] % len(winners))
+    return winnings
+
+
+def _random_hand(rng):
+    from backend.pots import PotLedger
+
+    players = list(range(1, rng.randint(2, 7)))
+    stacks = {p: rng.choice([rng.randint(1, 300), 100]) for p in players}
+    totals, all_in, contenders = {}, {}, list(players)
+    ledger = PotLedger()
+    for _ in range(rng.randint(1, 25)):
+        live = [p for p in contenders if stacks[p]]
+        if not live:
+            break
+        player = rng.choice(live)
+        if len(contenders) > 1 and rng.random() < 0.1:
+            contenders.remove(player)
+            continue
+        chips = stacks[player] if rng.random() < 0.3 else rng.randint(0, stacks[player])
+        stacks[player] -= chips
+        totals[player] = totals.get(player, 0) + chips
+        if stacks[player] == 0 and totals[player]:
+            all_in[player] = totals[player]
+        ledger.add(player, chips, all_in=stacks[player] == 0)
+    scores = {p: rng.randint(0, 3) for p in contenders}
+    return ledger, totals, all_in, contenders, scores
+
+
+def test_side_pots_match_reference():
+    import random
+    rng = random.Random(8)
+    for _ in range(2000):
+        ledger, totals, all_in, contenders, scores = _random_hand(rng)
+        expected = _reference_pots(totals, all_in, contenders)
+        assert ledger.summary(contenders) == expected
+        assert ledger.settle(contenders, scores) == {p: w for p, w in _reference_settle(expected, scores).items() if w}
+
+
+def test_side_pots_conserve_chips():
+    import random
+    from backend.pots import PotLedger
+    rng = random.Random(9)
+    for _ in range(2000):
+        ledger, totals, all_in, contenders, scores = _random_hand(rng)
+        assert ledger.total == sum(totals.values())
+        assert sum(ledger.settle(contenders, scores).values()) == ledger.total
+        assert set(ledger.settle(contenders, scores)) <= set(contenders)
+        # The pots only depend on what went in, not on the order it arrived in
+        rebuilt = PotLedger.rebuild(totals, all_in)
+        assert rebuilt.summary(contenders) == ledger.summary(contenders)
+
+
+def test_side_pot_showdown():
+    new_game = client.post("/create-game/", json={"players": {"Rae": 100, "Sam": 300, "Tia": 500}}).json()["game_id"]
+    rae, sam, tia = [p["id"] for p in client.get(f"/get-game/{new_game}").json()["players"]]
+
+    for player, cards in ((rae, "AsAd"), (sam, "KsKd"), (tia, "QsQd")):
+        client.put("/cards/", json={"game_id": new_game, "player_id": player, "cards": cards})
+    client.put("/cards/", json={"game_id": new_game, "cards": "2c7h9dJc3s"})
+
+    client.put(f"/all-in/?game_id={new_game}&player_id={rae}")
+    client.put(f"/all-in/?game_id={new_game}&player_id={sam}")
+    client.put(f"/call/?game_id={new_game}&player_id={tia}")
+    game = client.get(f"/get-game/{new_game}").json()
+    assert game["pot"] == 700
+    assert game["pots"] == [{"amount": 300, "eligible": [rae, sam, tia]}, {"amount": 400, "eligible": [sam, tia]}]
+
+    for _ in range(4):
+        response = client.put("/next_stage/", json={"game_id": new_game})
+    assert response.json()["winners"] == [{"player_id": rae, "amount": 300, "hand": "Pair"},
+                                          {"player_id": sam, "amount": 400, "hand": "Pair"}]
+    assert [p["stack"] for p in client.get(f"/get-game/{new_game}").json()["players"]] == [300, 400, 200]
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Position Rotation (precomputed tables agree with the label-by-label rotation)
+def test_rotation_tables():
+    from backend.logic import positions, seat_positions, update_positions
+
+    for n, labels in positions.items():
+        current = dict(enumerate(labels))
+        for button in range(2 * n):
+            assert seat_positions(n, button) == tuple(current[seat] for seat in range(n))
+            current = update_positions(current)
+    assert seat_positions(9, 0) is None
+
+
+def test_join_and_leave_between_hands():
+    import asyncio
+    from backend.tables import tables
+
+    new_game = client.post("/create-game/", json={"players": {"Uma": 500, "Vic": 500, "Wes": 500}}).json()["game_id"]
+    game = client.get(f"/get-game/{new_game}").json()
+    uma, vic, wes = [p["id"] for p in game["players"]]
+    assert [(p["seat"], p["position"]) for p in game["players"]] == [(0, "SB"), (1, "BB"), (2, "D")]
+
+    response = client.put("/next_hand/", json={"game_id": new_game})
+    assert response.json()["new_positions"] == {str(uma): "BB", str(vic): "D", str(wes): "SB"}
+
+    client.put("/bet/", json={"game_id": new_game, "player_id": uma, "amount": 50})
+    response = client.post(f"/games/{new_game}/players", json={"name": "Xan", "stack": 400})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Players can only join or leave between hands"
+    client.put(f"/fold/?game_id={new_game}&player_id={vic}")
+    client.put(f"/fold/?game_id={new_game}&player_id={wes}")
+    for _ in range(4):
+        client.put("/next_stage/", json={"game_id": new_game})
+    client.put("/next_hand/", json={"game_id": new_game})
+
+    assert client.delete(f"/games/{new_game}/players/{vic}").status_code == 200
+    response = client.post(f"/games/{new_game}/players", json={"name": "Xan", "stack": 400})
+    assert response.status_code == 200
+    xan = response.json()["player_id"]
+    game = client.get(f"/get-game/{new_game}").json()
+    assert game["button"] == 2
+    assert [(p["id"], p["seat"]) for p in game["players"]] == [(uma, 0), (xan, 1), (wes, 2)]
+    assert [p["position"] for p in game["players"]] == ["D", "SB", "BB"]
+
+    # The seating survives a reload from the database
+    asyncio.run(tables.flush())
+    tables.discard(new_game)
+    game = client.get(f"/get-game/{new_game}").json()
+    assert [(p["name"], p["position"]) for p in game["players"]] == [("Uma", "D"), ("Xan", "SB"), ("Wes", "BB")]
+    assert game["dealer_seat"] == 0
+
+    client.delete(f"/games/{new_game}/players/{xan}")
+    response = client.delete(f"/games/{new_game}/players/{wes}")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "A game needs at least 2 players"
+
+    client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Button Stays on Its Seat (players joining and leaving don't move the dealer)
+def test_button_keeps_its_seat():
+    from backend.tables import PlayerState, TableState, join, leave, next_hand
+
+    def table(seats, **kwargs):
+        return TableState("t", players={s: PlayerState(s, f"P{s}", 100, True, 0, s) for s in seats}, **kwargs)
+
+    def labels(t):
+        return {t.players[p].seat: label for p, label in t.positions().items()}
+
+    start = {0: "BB", 1: "UTG", 2: "D", 3: "SB"}
+    assert labels(table(range(4), button=1)) == start  # Placed from the hand count when no seat was kept
+
+    # Leaving: the button stays on seat 2, or passes to seat 1 (next in line) when the dealer leaves
+    for seat, after in [(3, {0: "SB", 1: "BB", 2: "D"}), (0, {1: "BB", 2: "D", 3: "SB"}),
+                        (1, {0: "BB", 2: "D", 3: "SB"}), (2, {0: "BB", 1: "D", 3: "SB"})]:
+        t = table(range(4), button=1)
+        leave(t, seat)
+        assert labels(t) == after, seat
+        assert TableState.from_dict(t.to_dict()).positions() == t.positions()  # The seat is saved with the table
+
+    # The next hand moves the button on from where it is now
+    t = table(range(4), button=1)
+    leave(t, 2)
+    next_hand(t)
+    assert labels(t) == {0: "D", 1: "SB", 3: "BB"}
+
+    # Joining: the newcomer takes the lowest free seat, wherever that is relative to the button
+    for seats, dealer, after in [([0, 2, 3], 2, {0: "BB", 1: "UTG", 2: "D", 3: "SB"}),  # Behind the button
+                                 ([0, 2, 3], 0, {0: "D", 1: "SB", 2: "BB", 3: "UTG"}),  # Into the small blind
+                                 ([1, 2], 2, {0: "SB", 1: "BB", 2: "D"})]:  # Heads-up to three-handed
+        t = table(seats, dealer=dealer)
+        join(t, PlayerState(9, "New", 100, True, 0, 0 if 0 not in seats else 1))
+        assert labels(t) == after
+
+
+# ✅ Test Benchmark Harness (concurrent scripted games, regression check)
+def test_benchmark_harness():
+    import asyncio
+    from backend.utils.bench import compare, percentile, run_load
+
+    results = asyncio.run(run_load(games=4, hands=2, lifespan=False))
+    assert results["errors"] == {}
+    assert results["endpoints"]["PUT /bet/"]["requests"] == 8
+    assert results["endpoints"]["overall"]["p99_ms"] >= results["endpoints"]["overall"]["p50_ms"]
+
+    assert percentile([5, 1, 4, 2, 3], 50) == 3 and percentile(list(range(1, 101)), 99) == 99
+    baseline = {"endpoints": {"PUT /bet/": {"p50_ms": 10.0, "throughput_rps": 100.0}}, "micro": {"f": {"ns_per_call": 100.0}}}
+    current = {"endpoints": {"PUT /bet/": {"p50_ms": 11.0, "throughput_rps": 70.0}}, "micro": {"f": {"ns_per_call": 150.0}}}
+    assert compare(baseline, current, 0.2) == ["endpoints PUT /bet/ throughput_rps: 100.0 -> 70.0",
+                                               "micro f ns_per_call: 100.0 -> 150.0"]
+    assert compare(baseline, baseline, 0.0) == []
+
+
+# ✅ Test Metrics (per-endpoint counters, sampling, slow-request log)
+def test_metrics(caplog):
+    from backend import metrics
+
+    metrics.registry.reset()
+    new_game = client.post("/create-game/", json={"players": {"Yul": 500, "Zed": 500}}).json()["game_id"]
+    client.get(f"/get-game/{new_game}")
+
+    text = client.get("/metrics").text
+    assert 'http_requests_total{method="POST",endpoint="/create-game/",status="200"} 1' in text
+    assert 'db_commits_total{method="POST",endpoint="/create-game/"} 1' in text
+    assert 'db_rows_loaded_total{method="GET",endpoint="/get-game/{game_id}"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/get-game/{game_id}"} 1' in text
+    assert 'db_locked_errors_total{method="POST",endpoint="/create-game/"} 0' in text
+
+    # Unsampled requests are counted but their database work is not measured
+    metrics.registry.reset()
+    metrics.SAMPLE_RATE, metrics.SLOW_REQUEST_MS = 0.0, 0.0
+    try:
+        client.get(f"/get-game/{new_game}")
+        assert 'endpoint="/get-game/{game_id}",status="200"} 1' in client.get("/metrics").text
+        assert "db_queries_total{" not in client.get("/metrics").text
+        assert not caplog.records
+
+        metrics.SAMPLE_RATE = 1.0
+        with caplog.at_level("WARNING", logger="backend.metrics"):
+            client.delete(f"/end-session/{new_game}")
+        assert "Slow request DELETE /end-session/" in caplog.text
+    finally:
+        metrics.SAMPLE_RATE, metrics.SLOW_REQUEST_MS = 1.0, None
+
+
+# ✅ Test Game Listing (keyset pages, filters, one aggregated query per page)
+def test_show_active_games_pages():
+    from datetime import datetime, timedelta
+    from backend import metrics
+
+    since = (datetime.utcnow() - timedelta(seconds=1)).isoformat()
+    created = [client.post("/create-game/", json={"players": players}).json()["game_id"]
+               for players in ({"A": 100, "B": 200}, {"C": 100, "D": 100, "E": 100}, {"F": 50, "G": 50})]
+
+    metrics.registry.reset()
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "created_after": since, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/show-active-games/", params=params).json()
+        seen += page["games"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(g["game_id"] for g in seen) == sorted(created)
+    assert [g["created_at"] for g in seen] == sorted((g["created_at"] for g in seen), reverse=True)
+    assert {g["game_id"]: (g["players"], g["stacks"]) for g in seen}[created[0]] == (2, 300)
+    assert 'db_queries_total{method="GET",endpoint="/show-active-games/"} 2' in client.get("/metrics").text  # Two pages
+
+    three = client.get("/show-active-games/", params={"created_after": since, "min_players": 3}).json()["games"]
+    assert [g["game_id"] for g in three] == [created[1]]
+    assert client.get("/show-active-games/", params={"created_after": since, "state": "flop"}).json()["games"] == []
+    assert client.get("/show-active-games/", params={"cursor": "nonsense"}).status_code == 400
+
+    for new_game in created:
+        client.delete(f"/end-session/{new_game}")
+
+
+# ✅ Test Game Fetch Cache (one query on a cold load, ETag / 304 until the game changes)
+def test_get_game_etag():
+    from backend import metrics
+    from backend.tables import tables
+
+    new_game = client.post("/create-game/", json={"players": {"Ada": 500, "Bo": 500}}).json()["game_id"]
+    tables.discard(new_game)
+    metrics.registry.reset()
+    first = client.get(f"/get-game/{new_game}")
+    assert 'db_queries_total{method="GET",endpoint="/get-game/{game_id}"} 1' in client.get("/metrics").text
+    ada = first.json()["players"][0]["id"]
+    etag = first.headers["etag"]
+
+    again = client.get(f"/get-game/{new_game}", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag and again.content == b""
+
+    client.put("/bet/", json={"game_id": new_game, "player_id": ada, "amount": 40})
+    changed = client.get(f"/get-game/{new_game}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["pot"] == 40
+
+    # A rejected action changes nothing, so the cached response stays valid
+    client.put("/bet/", json={"game_id": new_game, "player_id": ada, "amount": 5000})
+    assert client.get(f"/get-game/{new_game}", headers={"If-None-Match": changed.headers["etag"]}).status_code == 304
+
+    client.delete(f"/end-session/{new_game}")
+    assert client.get(f"/get-game/{new_game}").json() == {"error": "Game not found"}
+
+
+# ✅ Test Tournaments (seat draw, balancing plan, rebalance applied to live tables and the DB)
+def test_rebalance_plan_properties():
+    import random
+    from backend.tournaments import plan_rebalance, table_sizes
+
+    rng = random.Random(14)
+    for _ in range(500):
+        size = rng.randint(2, 8)
+        tables = {}
+        for t in range(rng.randint(1, 6)):
+            seats = rng.sample(range(size), rng.randint(0, size))
+            tables[f"g{t}"] = [(t * 10 + seat, seat, rng.choice([0, 100, 200])) for seat in seats]
+        plan = plan_rebalance(tables, size)
+
+        seated = {g: {seat: pid for pid, seat, stack in players if stack > 0} for g, players in tables.items()}
+        for move in plan["moves"]:
+            assert move["to"] not in plan["closed"] and move["seat"] not in seated[move["to"]]
+            del seated[move["from"]][next(s for s, p in seated[move["from"]].items() if p == move["player_id"])]
+            seated[move["to"]][move["seat"]] = move["player_id"]
+        survivors = sum(1 for players in tables.values() for _, _, stack in players if stack > 0)
+        counts = sorted(len(seated[g]) for g in tables if g not in plan["closed"])
+        assert all(not seated[g] for g in plan["closed"])
+        assert counts == sorted(table_sizes(survivors, size)) if survivors else counts == []
+        assert sorted(plan["eliminated"]) == sorted(p for players in tables.values() for p, _, stack in players if stack == 0)
+
+
+def test_tournament_rebalance():
+    import asyncio
+    from backend.database import SessionLocal
+    from backend.models import GameDB, PlayerDB
+    from backend.tables import tables
+
+    players = {f"P{i}": 1000 for i in range(10)}
+    response = client.post("/tournaments/", json={"name": "Sunday", "players": players, "table_size": 4, "seed": 1})
+    event = response.json()
+    assert sorted(t["players"] for t in event["tables"]) == [3, 3, 4]
+    game_ids = [t["game_id"] for t in event["tables"]]
+    game = client.get(f"/get-game/{game_ids[0]}").json()
+    assert [p["position"] for p in game["players"]] == ["SB", "BB", "UTG", "D"]
+
+    # Four players bust, so six remain: two tables of three
+    busted = [p["id"] for g in game_ids[:2] for p in client.get(f"/get-game/{g}").json()["players"][:2]]
+    for game_id in game_ids[:2]:
+        table = asyncio.run(tables.get(game_id))
+        for player_id in busted:
+            if player_id in table.players:
+                table.players[player_id].stack = 0
+
+    # The table that would close has cards out, so nothing moves until the hand is over
+    client.put("/cards/", json={"game_id": game_ids[1], "cards": "2c7dTh"})
+    response = client.post(f"/tournaments/{event['tournament_id']}/rebalance")
+    assert response.status_code == 409 and not asyncio.run(tables.get(game_ids[1])).frozen
+    client.put("/next_hand/", json={"game_id": game_ids[1]})
+
+    plan = client.post(f"/tournaments/{event['tournament_id']}/rebalance").json()
+    assert sorted(plan["eliminated"]) == sorted(busted) and len(plan["closed"]) == 1
+    remaining = [g for g in game_ids if g not in plan["closed"]]
+    assert sorted(len(client.get(f"/get-game/{g}").json()["players"]) for g in remaining) == [3, 3]
+    assert client.get(f"/get-game/{plan['closed'][0]}").json() == {"error": "Game not found"}
+
+    asyncio.run(tables.flush())
+    with SessionLocal() as db:
+        assert db.query(GameDB).filter(GameDB.tournament_id == event["tournament_id"]).count() == 2
+        assert sorted(db.query(PlayerDB.game_id).filter(PlayerDB.game_id.in_(game_ids)).all()) == sorted((g,) for g in remaining for _ in range(3))
+        assert [g.player_count for g in db.query(GameDB).filter(GameDB.id.in_(remaining))] == [3, 3]
+
+    for game_id in remaining:
+        client.delete(f"/end-session/{game_id}")
+
+
+# ✅ Test Headless Simulation (deterministic across worker counts, chips conserved, rules enforced)
+def _always_fold(decision, rng):
+    return ("fold", 0) if decision.to_call else ("check", 0)
+
+
+def _always_raise(decision, rng):
+    return ("raise", decision.min_raise) if decision.stack >= decision.min_raise else ("call", 0)
+
+
+def test_simulation_is_deterministic():
+    from backend.simulation import aggressive, check_call, random_play, simulate
+
+    strategies = [check_call, aggressive, random_play, random_play]
+    single = simulate(600, strategies, seed=7, workers=1, chunk_hands=200)
+    pooled = simulate(600, strategies, seed=7, workers=2, chunk_hands=200)
+    assert single["seats"] == pooled["seats"]
+    for name, values in single["columns"].items():
+        assert list(values) == list(pooled["columns"][name])
+
+    columns = single["columns"]
+    assert len(columns["hand"]) == 600 * 4
+    totals = {}
+    for hand, delta in zip(columns["hand"], columns["delta"]):
+        totals[hand] = totals.get(hand, 0) + int(delta)
+    assert set(totals.values()) == {0}  # Every chip lost is won by someone
+    assert sum(s["net"] for s in single["seats"]) == 0
+
+
+def test_simulation_blinds_and_folds():
+    from backend.simulation import simulate
+
+    # Heads-up, a player who never puts in a chip voluntarily against one who always raises loses exactly the blinds
+    result = simulate(100, [_always_fold, _always_raise], seed=1)
+    assert result["seats"][0]["net"] == -(50 * 5 + 50 * 10)
+    assert result["rejected"] == 0
+    assert set(result["columns"]["street"]) <= {0, 1, 2, 3}
+
+
+# ✅ Test Hand History (recorded by the engine, exported in chunks, imported into a fresh database)
+def test_hand_history_export_import(tmp_path):
+    import asyncio
+    import io
+    from sqlalchemy import create_engine # type: ignore
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine # type: ignore
+    from backend.database import Base
+    from backend.history import chunk_hands, export_chunks, import_chunks, read_chunks, unpack_actions
+    from backend.models import GameDB, PlayerDB
+
+    game = client.post("/create-game/", json={"players": {"Ann": 500, "Ben": 500, "Cy": 500}}).json()["game_id"]
+    first, second, third = [p["id"] for p in client.get(f"/get-game/{game}").json()["players"]]
+    showdown_hand = [
+        {"action": "hole-cards", "player_id": first, "cards": "AsAd"},
+        {"action": "hole-cards", "player_id": second, "cards": "KsKd"},
+        {"action": "board", "cards": "2c7hTd3s9c"},
+        {"action": "bet", "player_id": first, "amount": 50},
+        {"action": "call", "player_id": second},
+        {"action": "fold", "player_id": third},
+    ] + [{"action": "next-stage"}] * 4 + [{"action": "next-hand"}]
+    folded_hand = [{"action": "bet", "player_id": second, "amount": 20}, {"action": "fold", "player_id": first},
+                   {"action": "fold", "player_id": third}] + [{"action": "next-stage"}] * 4 + [{"action": "next-hand"}]
+    assert client.post(f"/games/{game}/actions:batch", json={"actions": showdown_hand}).json()["applied"] == 11
+    # A rolled-back batch leaves no history behind
+    rejected = folded_hand + [{"action": "bet", "player_id": first, "amount": 10 ** 6}]
+    assert client.post(f"/games/{game}/actions:batch", json={"actions": rejected, "atomic": True}).json()["applied"] == 0
+    assert client.post(f"/games/{game}/actions:batch", json={"actions": folded_hand}).json()["applied"] == 8
+    client.delete(f"/end-session/{game}")  # History outlives the game
+
+    export = client.get(f"/hands/export?game_id={game}").content
+    hands = [hand for chunk in read_chunks(io.BytesIO(export)) for hand in chunk_hands(chunk)]
+    assert [h["hand_no"] for h in hands] == [0, 1] and [h["pot"] for h in hands] == [100, 20]
+    first_hand = {p["player_id"]: p for p in hands[0]["players"]}
+    assert first_hand[first]["stack_end"] - first_hand[first]["stack_start"] == 50
+    assert first_hand[first]["hole_cards"] == "AdAs" and hands[0]["board"] == "2c3s7h9cTd"
+    assert [p["put_in"] for p in hands[0]["players"]] == [50, 50, 0]
+    assert unpack_actions(hands[0]["actions"])[3:5] == [["bet", first, 50], ["call", second, None]]
+
+    path = tmp_path / "fresh.db"
+    Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    fresh = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(fresh, expire_on_commit=False)
+
+    async def load():
+        first_run = await import_chunks(io.BytesIO(export), factory)
+        second_run = await import_chunks(io.BytesIO(export), factory)
+        pages = [chunk async for chunk in export_chunks(factory, chunk=1)]
+        await fresh.dispose()
+        return first_run, second_run, pages
+
+    first_run, second_run, pages = asyncio.run(load())
+    assert first_run == {"hands": 2, "skipped": 0, "games": 1}
+    assert second_run == {"hands": 0, "skipped": 2, "games": 0}
+    reexported = [h for page in pages[1:] for chunk in read_chunks(io.BytesIO(pages[0] + page)) for h in chunk_hands(chunk)]
+    assert [h["id"] for h in reexported] == [h["id"] for h in hands]
+
+    db = create_engine(f"sqlite:///{path}")
+    with db.connect() as conn:
+        assert conn.execute(GameDB.__table__.select()).first().button == 2
+        stacks = {row.id: row.stack for row in conn.execute(PlayerDB.__table__.select())}
+    assert stacks == {p["player_id"]: p["stack_end"] for p in hands[1]["players"]}
+
+
+# ✅ Test Player Stats (maintained per position as hands are flushed, across games)
+def test_player_stats():
+    import asyncio
+    from backend.stats import rebuild
+
+    def play(actions):
+        game = client.post("/create-game/", json={"players": {"StatAnn": 500, "StatBen": 500, "StatCy": 500}}).json()["game_id"]
+        ids = {p["name"]: p["id"] for p in client.get(f"/get-game/{game}").json()["players"]}
+        batch = [{**a, "player_id": ids[a["player_id"]]} if "player_id" in a else a for a in actions]
+        assert client.post(f"/games/{game}/actions:batch", json={"actions": batch}).json()["applied"] == len(batch)
+        client.delete(f"/end-session/{game}")
+
+    # StatAnn sits in the small blind both times, StatBen in the big blind
+    play([{"action": "hole-cards", "player_id": "StatAnn", "cards": "AsAd"},
+          {"action": "hole-cards", "player_id": "StatBen", "cards": "KsKd"},
+          {"action": "board", "cards": "2c7hTd3s9c"},
+          {"action": "bet", "player_id": "StatAnn", "amount": 50}, {"action": "call", "player_id": "StatBen"},
+          {"action": "fold", "player_id": "StatCy"}] + [{"action": "next-stage"}] * 4 + [{"action": "next-hand"}])
+    play([{"action": "bet", "player_id": "StatBen", "amount": 20}, {"action": "fold", "player_id": "StatAnn"},
+          {"action": "fold", "player_id": "StatCy"}] + [{"action": "next-stage"}] * 4 + [{"action": "next-hand"}])
+
+    ann = client.get("/players/StatAnn/stats").json()
+    assert ann["positions"]["SB"] == {"hands": 2, "vpip": 0.5, "pfr": 0.5, "aggression_factor": None,
+                                      "win_rate": 25.0, "hands_won": 1, "net": 50}
+    ben = client.get("/players/StatBen/stats").json()["overall"]
+    assert (ben["vpip"], ben["pfr"], ben["aggression_factor"], ben["net"]) == (1.0, 0.5, 1.0, -50)
+    assert client.get("/players/Nobody/stats").status_code == 404
+
+    # Recomputing from the stored history gives the same numbers
+    asyncio.run(rebuild())
+    assert client.get("/players/StatAnn/stats").json() == ann
+
+
+# ✅ Test Optimistic Concurrency (two engines writing one game lose no chips)
+def test_concurrent_writers_lose_no_updates():
+    import asyncio
+    import random
+    from backend.database import SessionLocal
+    from backend.models import GameDB, PlayerDB
+    from backend.tables import TableEngine
+
+    players = {f"Racer{i}": 1000 for i in range(8)}
+    game = client.post("/create-game/", json={"players": players}).json()["game_id"]
+    with SessionLocal() as db:
+        ids = [p.id for p in db.query(PlayerDB).filter(PlayerDB.game_id == game).order_by(PlayerDB.id)]
+
+    async def race():
+        # Two engines stand in for two server processes that both loaded the game
+        engines = [TableEngine(), TableEngine()]
+        rng = random.Random(18)
+
+        async def worker(engine, seats):
+            for i in range(60):
+                await engine.apply(game, "bet", seats[i % len(seats)], 10)
+                if rng.random() < 0.3:
+                    await engine.flush()
+                await asyncio.sleep(0)
+
+        await asyncio.gather(worker(engines[0], ids[:4]), worker(engines[1], ids[4:]))
+        for engine in engines + engines:
+            await engine.flush()
+        return engines
+
+    engines = asyncio.run(race())
+    assert sum(e.cas_conflicts for e in engines) > 0 and sum(e.dropped_actions for e in engines) == 0
+    with SessionLocal() as db:
+        row = db.query(GameDB).filter(GameDB.id == game).one()
+        stacks = [p.stack for p in db.query(PlayerDB).filter(PlayerDB.game_id == game)]
+    assert row.pot == 120 * 10
+    assert sum(stacks) + row.pot == 8000 and sorted(stacks) == [850] * 8
+    client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Game Placement (rendezvous hashing moves only the games of a worker that leaves)
+def test_rendezvous_ownership():
+    from collections import Counter
+    from backend.cluster import owner_of, shard_key
+
+    keys = [f"game-{i}" for i in range(3000)]
+    three = {k: owner_of(k, ["w1", "w2", "w3"]) for k in keys}
+    assert three == {k: owner_of(k, ["w3", "w1", "w2"]) for k in keys}
+    assert all(800 < n < 1200 for n in Counter(three.values()).values())
+
+    two = {k: owner_of(k, ["w1", "w3"]) for k in keys}
+    assert all(two[k] == three[k] for k in keys if three[k] != "w2")
+    assert owner_of("game-1", []) is None
+    assert shard_key("t1.3") == shard_key("t1.0") == "t1" and shard_key("abc") == "abc"
+
+
+# ✅ Test Cluster Membership (heartbeats, delta relay, handover and takeover after a worker dies)
+def test_cluster_membership_and_deltas():
+    import asyncio
+    from backend.cluster import Cluster, serve_broker
+    from backend.push import Broadcaster
+    from backend.tables import TableEngine
+
+    games = [client.post("/create-game/", json={"players": {"Ann": 500, "Ben": 500}}).json()["game_id"]
+             for _ in range(8)]
+
+    async def run():
+        server = await serve_broker("127.0.0.1", 0)
+        url = f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        workers = {name: Cluster(url, name, f"http://{name}", TableEngine(), Broadcaster(),
+                                 heartbeat_interval=0.05, timeout=0.4, secret="s") for name in ("a", "b")}
+        for worker in workers.values():
+            await worker.engine.load_all()  # Like recover() at startup: every worker loads every game
+        await asyncio.gather(*(w.start() for w in workers.values()))
+        a, b = workers["a"], workers["b"]
+        assert set(a.members) == set(b.members) == {"a", "b"}
+        assert all(a.owner(g) == b.owner(g) for g in games)
+        assert {a.owner(g) for g in games} == {"a", "b"}
+
+        # Each worker keeps only its own tables
+        await asyncio.sleep(0.2)
+        for worker in workers.values():
+            assert all(worker.owns(g) for g in games if g in worker.engine.game_ids())
+        assert a.handovers and b.handovers
+
+        # A change on the owner reaches subscribers on the other worker through the broker
+        game = next(g for g in games if b.owns(g))
+        subscription = a.broadcaster.subscribe(game)
+        player = min((await b.engine.get(game)).players)
+        await b.engine.apply(game, "bet", player, 40)
+        delta = await subscription.next(2.0)
+        assert delta["pot"] == 40 and delta["players"][str(player)]["stack"] == 460
+
+        # b dies without saying goodbye: a takes its games over once the heartbeats stop
+        await b.engine.flush()
+        b._task.cancel()
+        await b.broker.stop()
+        for _ in range(40):
+            if set(a.members) == {"a"}:
+                break
+            await asyncio.sleep(0.05)
+        assert set(a.members) == {"a"} and all(a.owns(g) for g in games)
+        table = await a.engine.get(game)
+        assert table.pot == 40
+
+        await a.stop()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+    for game in games:
+        client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Handover (a worker that gains a game serves the old owner's latest state, not its own stale copy)
+def test_cluster_handover_reloads():
+    import asyncio
+    from backend.cluster import Cluster, serve_broker
+    from backend.push import Broadcaster
+    from backend.tables import TableEngine
+
+    games = [client.post("/create-game/", json={"players": {"Cy": 500, "Di": 500}}).json()["game_id"]
+             for _ in range(8)]
+
+    async def run():
+        server = await serve_broker("127.0.0.1", 0)
+        url = f"tcp://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        a = Cluster(url, "a", "http://a", TableEngine(), Broadcaster(), heartbeat_interval=0.05, timeout=0.4, secret="s")
+        b = Cluster(url, "b", "http://b", TableEngine(), Broadcaster(), heartbeat_interval=0.05, timeout=0.4, secret="s")
+        await a.engine.load_all()
+        await a.start()
+        await b.engine.load_all()  # b's copies are taken before a's bets
+        for game in games:
+            table = await a.engine.get(game)
+            await a.engine.apply(game, "bet", min(table.players), 40)  # Not yet written back
+
+        await b.start()
+        await asyncio.sleep(0.3)
+        gained = [g for g in games if b.owns(g)]
+        assert gained and all(g not in a.engine.game_ids() for g in gained)
+        assert [(await b.engine.get(g)).pot for g in gained] == [40] * len(gained)
+
+        await b.stop()
+        await a.stop()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+    for game in games:
+        client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Affinity Routing (requests for another worker's games are forwarded to it)
+def test_affinity_forwarding(monkeypatch):
+    import json
+    import httpx #type:ignore
+    from backend.cluster import cluster, owner_of
+
+    seen = []
+
+    async def other_worker(scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        seen.append((scope["method"], scope["path"], scope["query_string"], dict(scope["headers"]), body))
+        reply = {"message": "handled by b"}
+        if scope["path"] == "/games/actions:batch":
+            reply = {"games": [{"game_id": g["game_id"], "applied": 0, "results": []} for g in json.loads(body)["games"]]}
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), (b"x-worker", b"b")]})
+        await send({"type": "http.response.body", "body": json.dumps(reply).encode()})
+
+    monkeypatch.setattr(cluster, "broker_url", "tcp://127.0.0.1:1")
+    monkeypatch.setattr(cluster, "worker_id", "a")
+    monkeypatch.setattr(cluster, "secret", "s")
+    monkeypatch.setattr(cluster, "_resolved", {"b": {"testclient"}})  # Where the test client's requests come from
+    monkeypatch.setattr(cluster, "members", {"a": "http://a", "b": "http://b"})
+    monkeypatch.setattr(cluster, "client", httpx.AsyncClient(transport=httpx.ASGITransport(app=other_worker)))
+
+    ids = [f"affinity-{i}" for i in range(20)]
+    remote = next(g for g in ids if owner_of(g, ["a", "b"]) == "b")
+    local = next(g for g in ids if owner_of(g, ["a", "b"]) == "a")
+
+    response = client.put("/bet/", json={"game_id": remote, "player_id": 1, "amount": 10})
+    assert response.status_code == 200 and response.json() == {"message": "handled by b"}
+    assert response.headers["x-worker"] == "b"
+    method, path, _, headers, body = seen[-1]
+    assert (method, path, headers[b"x-forwarded-worker"]) == ("PUT", "/bet/", f"a {cluster._signature('a')}".encode())
+    assert b'"game_id"' in body and remote.encode() in body
+
+    client.put(f"/call/?game_id={remote}&player_id=2")
+    assert seen[-1][1:3] == ("/call/", f"game_id={remote}&player_id=2".encode())
+    client.get(f"/get-game/{remote}")
+    assert seen[-1][1] == f"/get-game/{remote}"
+
+    # Games this worker owns, requests already forwarded once and requests about no game stay here
+    count = len(seen)
+    response = client.put("/bet/", json={"game_id": local, "player_id": 1, "amount": 10})
+    assert response.status_code == 404 and response.headers["x-worker"] == "a"
+    response = client.put("/bet/", json={"game_id": remote, "player_id": 1, "amount": 10},
+                          headers={"X-Forwarded-Worker": f"b {cluster._signature('b')}"})
+    assert response.status_code == 404 and response.headers["x-worker"] == "a"
+    assert client.get("/").status_code == 200
+    assert len(seen) == count
+
+    # A forwarding header that is unsigned, names an unknown worker or comes from elsewhere is dropped
+    for value in ("b", "b nonsense", f"c {cluster._signature('c')}"):
+        response = client.put("/bet/", json={"game_id": remote, "player_id": 1, "amount": 10},
+                              headers={"X-Forwarded-Worker": value})
+        assert response.headers["x-worker"] == "b" and seen[-1][3][b"x-forwarded-worker"].startswith(b"a ")
+    monkeypatch.setattr(cluster, "_resolved", {"b": {"10.0.0.2"}})
+    client.put("/bet/", json={"game_id": remote, "player_id": 1, "amount": 10},
+               headers={"X-Forwarded-Worker": f"b {cluster._signature('b')}"})
+    assert len(seen) == count + 4
+
+    # Multi-game batches are split by owner
+    response = client.post("/games/actions:batch", json={"games": [
+        {"game_id": local, "actions": [{"action": "check", "player_id": 1}]},
+        {"game_id": remote, "actions": [{"action": "check", "player_id": 1}]}]})
+    assert response.status_code == 200
+    assert [g["game_id"] for g in response.json()["games"]] == [local, remote]
+    assert response.json()["games"][0]["results"][0]["status_code"] == 404
+    assert seen[-1][1] == "/games/actions:batch" and local.encode() not in seen[-1][4]
+
+
+# ✅ Test Preflop Tables (built offline, memory-mapped, ranges per position and stack depth)
+def test_preflop_tables(tmp_path):
+    from backend import ranges
+    from backend.evaluator import parse_cards
+
+    assert len(ranges.CLASSES) == 169 and sum(ranges.COMBOS) == 1326
+    assert ranges.hand_class(parse_cards("AsKs")) == "AKs" and ranges.hand_class(parse_cards("2d7c")) == "72o"
+    assert ranges.parse_hand("tt") == "TT" and ranges.parse_hand("KdAh") == "AKo"
+    assert [ranges.left_to_act(6, p) for p in ("UTG", "D", "SB", "BB")] == [5, 2, 1, 0]
+    assert ranges.left_to_act(2, "D/SB") == 1
+
+    path = str(tmp_path / "preflop.npy")
+    built = ranges.build(trials=3000, path=path)
+    table = ranges.PreflopTable(ranges.np.load(path, mmap_mode="r"))
+    assert (table.equity == built).all()
+    assert abs(table.hand("AA", 1) - 0.852) < 0.02 and abs(table.hand("72o", 1) - 0.346) < 0.03
+    assert table.hand("AA", 1) > table.hand("AA", 4) > table.hand("AA", 7)
+    assert table.hand("AA", 1) > table.hand("KK", 1) > table.hand("AKs", 1) > table.hand("AKo", 1)
+
+    deep = ranges.opening_range(table, 6, "SB", 100)
+    short = ranges.opening_range(table, 6, "SB", 2)
+    assert set(deep["range"]) < set(short["range"]) and deep["range"][0] == "AA"
+    assert all(e >= deep["break_even"] for e in deep["equity"].values())
+    utg = ranges.opening_range(table, 6, "UTG", 100)
+    assert "AA" in utg["range"] and "72o" not in utg["range"] and 0 < utg["percent"] < 100
+
+    # The endpoints serve the shipped table
+    response = client.get("/preflop/ranges?players=6&position=CO&stack=20")
+    assert response.status_code == 200 and response.json()["opponents"] == 3 and response.json()["range"][0] == "AA"
+    assert client.get("/preflop/ranges?players=6&position=LJ").status_code == 400
+    response = client.get("/preflop/hands/AsKs")
+    assert response.json()["hand"] == "AKs" and len(response.json()["equity"]) == 7
+    assert client.get("/preflop/hands/QQ?opponents=3").json()["equity"].keys() == {"3"}
+    assert client.get("/preflop/hands/ZZ").status_code == 400
+
+
+# ✅ Test Turn Order (action goes round by position; clocked games reject out-of-turn actions)
+def test_turn_order():
+    from backend.turns import POSTFLOP_ORDER, PREFLOP_ORDER
+
+    assert PREFLOP_ORDER[6] == ("UTG", "+1", "CO", "D", "SB", "BB")
+    assert PREFLOP_ORDER[2] == ("D/SB", "BB") and POSTFLOP_ORDER[2] == ("BB", "D/SB")
+
+    game = client.post("/create-game/", json={"players": {"Sb": 1000, "Bb": 1000, "Utg": 1000, "Btn": 1000},
+                                              "shot_clock": 0}).json()["game_id"]
+    state = client.get(f"/get-game/{game}").json()
+    ids = {p["position"]: p["id"] for p in state["players"]}
+    assert state["to_act"] == ids["UTG"] and state["shot_clock"] == 0 and state["turn_deadline"] is None
+
+    def act(action, position, amount=None):
+        body = {"game_id": game, "player_id": ids[position]}
+        if action == "bet":
+            return client.put("/bet/", json={**body, "amount": amount})
+        if action == "raise":
+            return client.put(f"/raise/?game_id={game}&player_id={ids[position]}&raise_amount={amount}")
+        if action == "check":
+            return client.put("/check/", json=body)
+        return client.put(f"/{action}/?game_id={game}&player_id={ids[position]}")
+
+    response = act("bet", "BB", 20)
+    assert response.status_code == 409 and response.json()["detail"] == f"Not your turn: player {ids['UTG']} is to act"
+    assert act("bet", "UTG", 20).status_code == 200
+    assert act("call", "D").status_code == 200
+    assert act("fold", "SB").status_code == 200
+    assert act("raise", "BB", 60).status_code == 200
+    assert client.get(f"/get-game/{game}").json()["to_act"] == ids["UTG"]  # The raise reopens the betting
+    assert act("call", "UTG").status_code == 200
+    assert act("fold", "D").status_code == 200
+    assert client.get(f"/get-game/{game}").json()["to_act"] is None
+    assert act("check", "UTG").json()["detail"] == "No betting action is due"
+
+    # After the flop the first player left of the button still in the hand starts
+    client.put(f"/next-round/?game_id={game}")
+    client.put("/next_stage/", json={"game_id": game})
+    assert client.get(f"/get-game/{game}").json()["to_act"] == ids["BB"]
+    assert act("check", "BB").status_code == 200
+    assert act("check", "UTG").status_code == 200
+    assert client.get(f"/get-game/{game}").json()["to_act"] is None
+    client.delete(f"/end-session/{game}")
+
+    # Without a shot clock the turn is tracked but not enforced
+    game = client.post("/create-game/", json={"players": {"Ann": 500, "Ben": 500, "Cy": 500}}).json()["game_id"]
+    state = client.get(f"/get-game/{game}").json()
+    ids = {p["position"]: p["id"] for p in state["players"]}
+    assert state["to_act"] == ids["D"]
+    assert client.put("/bet/", json={"game_id": game, "player_id": ids["BB"], "amount": 10}).status_code == 200
+    assert client.get(f"/get-game/{game}").json()["to_act"] == ids["D"]
+    client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Shot Clock (one timer loop checks or folds for players who run out of time)
+def test_shot_clock():
+    import asyncio
+    import time
+    from backend.tables import TableEngine
+    from backend.turns import ShotClock
+
+    async def heap_order():
+        fired = []
+
+        async def on_expire(expired):
+            fired.extend(game_id for game_id, _ in expired)
+
+        clock = ShotClock(on_expire)
+        clock.start()
+        now = time.time()
+        for i in range(200):
+            clock.set(f"g{i}", now + 0.05 + (i % 10) * 0.005)
+        clock.set("g3", now + 0.01)  # Replaced: fires at the new time only
+        clock.set("g5", None)  # Cleared
+        assert len(clock) == 199
+        await asyncio.sleep(0.3)
+        await clock.stop()
+        return fired
+
+    fired = asyncio.run(heap_order())
+    assert fired[0] == "g3" and len(fired) == len(set(fired)) == 199 and "g5" not in fired
+
+    players = {"Sb": 1000, "Bb": 1000, "Utg": 1000, "Btn": 1000}
+    game = client.post("/create-game/", json={"players": players, "shot_clock": 0.05}).json()["game_id"]
+
+    async def play():
+        engine = TableEngine()
+        engine.start()
+        table = await engine.get(game)
+        ids = {label: player_id for player_id, label in table.positions().items()}
+        assert table.to_act == ids["UTG"] and table.turn_deadline > time.time()
+        await engine.apply(game, "bet", ids["UTG"], 50)
+        for _ in range(50):
+            if table.to_act is None:
+                break
+            await asyncio.sleep(0.02)
+        await engine.stop()
+        return engine, table, ids
+
+    engine, table, ids = asyncio.run(play())
+    assert engine.timeouts == 3 and table.to_act is None
+    assert [table.players[ids[p]].active for p in ("UTG", "D", "SB", "BB")] == [True, False, False, False]
+    client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Idempotency Keys (a retried action is answered with the first response, not applied again)
+def test_idempotent_actions():
+    import asyncio
+    import uuid
+    from backend.idempotency import IdempotencyCache, KeyReused
+    from backend.tables import TableEngine
+
+    game = client.post("/create-game/", json={"players": {"Retry": 1000, "Steady": 1000}}).json()["game_id"]
+    ids = [p["id"] for p in client.get(f"/get-game/{game}").json()["players"]]
+    key = {"Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.put("/bet/", json={"game_id": game, "player_id": ids[0], "amount": 100}, headers=key)
+    retry = client.put("/bet/", json={"game_id": game, "player_id": ids[0], "amount": 100}, headers=key)
+    assert first.status_code == retry.status_code == 200 and retry.json() == first.json()
+    assert "idempotent-replayed" not in first.headers and retry.headers["idempotent-replayed"] == "true"
+    assert client.get(f"/get-game/{game}").json()["pot"] == 100
+    reused = client.put("/bet/", json={"game_id": game, "player_id": ids[0], "amount": 200}, headers=key)
+    assert reused.status_code == 422
+
+    # Rejections are kept too: the retry of a refused check stays refused after the player folds
+    key = {"Idempotency-Key": str(uuid.uuid4())}
+    assert client.put("/check/", json={"game_id": game, "player_id": ids[1]}, headers=key).status_code == 400
+    client.put(f"/fold/?game_id={game}&player_id={ids[1]}")
+    assert client.put("/check/", json={"game_id": game, "player_id": ids[1]}, headers=key).status_code == 400
+    assert client.put("/bet/", json={"game_id": game, "player_id": ids[0], "amount": 1},
+                      headers={"Idempotency-Key": ""}).status_code == 400
+
+    batch = {"actions": [{"action": "bet", "player_id": ids[0], "amount": 200}]}
+    key = {"Idempotency-Key": str(uuid.uuid4())}
+    for _ in range(3):
+        assert client.post(f"/games/{game}/actions:batch", json=batch, headers=key).status_code == 200
+    assert client.get(f"/get-game/{game}").json()["pot"] == 300
+
+    async def cache():
+        calls = []
+
+        async def handler():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 200, b'{"ok": true}'
+
+        keys = IdempotencyCache(size=2)
+        # Concurrent retries wait for the request already running
+        results = await asyncio.gather(*[keys.run("k1", "bet", handler) for _ in range(3)])
+        assert len(calls) == 1 and [replayed for _, replayed in results] == [False, True, True]
+        try:
+            await keys.run("k1", "fold", handler)
+            assert False, "a reused key must be refused"
+        except KeyReused:
+            pass
+        await keys.run("k2", "bet", handler)
+        await keys.run("k3", "bet", handler)  # Pushes k1 out of memory
+        assert len(keys) == 2 and keys.db_reads == 0
+        assert await keys.flush() == 3
+
+        # The table answers for keys the LRU dropped, and for every key after a restart
+        assert (await keys.run("k1", "bet", handler))[1] and keys.db_reads == 1
+        restarted = IdempotencyCache(size=2)
+        assert await restarted.load() == 2
+        assert (await restarted.run("k1", "bet", handler))[1] and restarted.db_reads == 1
+        assert len(calls) == 3
+
+        # In a cluster a miss is always checked: the key may have been kept by the game's old owner
+        other = IdempotencyCache(size=2)
+        await other.run("k4", "bet", handler)
+        engine = TableEngine()
+        engine.before_flush.append(other.flush)
+        await engine.get(game)
+        engine.mark_dirty(game)
+        assert await engine.flush() == 1  # Writes the keys kept so far first
+        shared = IdempotencyCache(size=2, shared=True)
+        assert (await shared.run("k4", "bet", handler))[1] and shared.db_reads == 1
+        assert not (await shared.run("k5", "bet", handler))[1] and shared.db_reads == 2
+        assert len(calls) == 5
+
+    asyncio.run(cache())
+    client.delete(f"/end-session/{game}")
+
+
+# ✅ Test Archival (finished and idle games leave the live tables but can still be fetched)
+def test_archive_games():
+    import asyncio
+    import uuid
+    from datetime import datetime, timedelta
+    from backend.archive import Archiver
+    from backend.database import SessionLocal
+    from backend.models import ArchivedGameDB, GameDB, PlayerDB
+    from backend.push import Broadcaster
+    from backend.tables import TableEngine
+
+    now = datetime.utcnow()
+    long_ago = datetime(2000, 1, 1)
+    games = {"idle": (long_ago, [1000, 1000]), "busted": (now - timedelta(hours=1), [2000, 0]),
+             "just-busted": (now, [2000, 0]), "busy": (long_ago, [1000, 1000])}
+    ids = {name: f"archive-{name}-{uuid.uuid4()}" for name in games}
+    with SessionLocal() as db:
+        for name, (updated_at, stacks) in games.items():
+            db.add(GameDB(id=ids[name], player_count=len(stacks), created_at=updated_at, updated_at=updated_at,
+                          players=[PlayerDB(name=f"{name}{i}", stack=s, seat=i) for i, s in enumerate(stacks)]))
+        db.commit()
+        busy_player = db.query(PlayerDB).filter(PlayerDB.game_id == ids["busy"]).first().id
+
+    async def archive():
+        engine, hub = TableEngine(), Broadcaster()
+        engine.listeners.append(hub)
+        await engine.apply(ids["busy"], "bet", busy_player, 20)  # Not yet written: archiving writes it back first
+        await engine.get(ids["busted"])
+        watcher = hub.subscribe(ids["busted"])
+        archiver = Archiver(engine, idle_after=10 * 365 * 86400, finished_after=600, batch_size=1)
+        archived = await archiver.run_once()
+        assert (await watcher.next(1)) == {"ended": True, "version": 1}  # Even though the table was written back first
+        return archived, archiver, engine
+
+    archived, archiver, engine = asyncio.run(archive())
+    assert archived == 2 and archiver.conflicts == 0 and engine.game_ids() == [ids["busy"]]
+    with SessionLocal() as db:
+        live = {g.id for g in db.query(GameDB).filter(GameDB.id.in_(ids.values()))}
+        reasons = dict(db.query(ArchivedGameDB.id, ArchivedGameDB.reason).filter(ArchivedGameDB.id.in_(ids.values())))
+        assert db.query(PlayerDB).filter(PlayerDB.game_id.in_([ids["idle"], ids["busted"]])).count() == 0
+    assert live == {ids["just-busted"], ids["busy"]}
+    assert reasons == {ids["idle"]: "idle", ids["busted"]: "finished"}
+
+    data = client.get(f"/get-game/{ids['busted']}").json()
+    assert data["archived"] is True and [p["stack"] for p in data["players"]] == [2000, 0]
+    assert client.get(f"/get-game/{ids['busy']}").json()["pot"] == 20
+    assert client.get("/get-game/no-such-game").json() == {"error": "Game not found"}
+    for name in ("just-busted", "busy"):
+        client.delete(f"/end-session/{ids[name]}")